@@ -0,0 +1,231 @@
+"""Offline benchmark of the SBIO API calls a job makes.
+
+Runs ``templates/app_runner.main()`` against ``benchmarks.fake_sbio_api``
+with inputs and results on a local storage backend.  ``_process_stage`` is
+replaced by a stand-in that downloads every input with
+``AppRunnerUtils.download_file`` (as stage scripts do), waits
+``--stage-seconds`` and writes the artifacts and the custom payload, whose
+paths point into a temporary directory.  Reports the API round trips, TCP
+connections, logins and the time spent waiting on the API.  Results can be
+saved as a JSON baseline and later runs compared against it.
+
+Usage::
+
+    python -m benchmarks.bench_control_plane                    # default job
+    python -m benchmarks.bench_control_plane --save-baseline    # refresh the baseline
+    python -m benchmarks.bench_control_plane --check            # exit 1 on regression
+    python -m benchmarks.bench_control_plane --error-rate 0.1   # flaky API
+
+Round trips and connections are deterministic for a given job and
+fail-free API, so any increase is reported; times may vary by
+``--tolerance``.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from sbioapputils.app_runner.api_session import get_api_session
+from sbioapputils.app_runner.api_token import get_token_cache
+from sbioapputils.app_runner.app_runner_utils import AppRunnerUtils
+from templates import app_runner
+from benchmarks.fake_sbio_api import DEFAULT_CONFIG, FakeSbioApi
+
+JOB_ID = "bench-1"
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "control_plane.json")
+WORKFLOW = """stages:
+    analysis: {file: 'analysis.py'}
+parameters:
+    n_neighbors: {type: 'int', default: 15}
+"""
+
+
+class _ApiTimer:
+    """Sums the time until response headers of every SBIO API response."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        get_api_session().hooks["response"].append(self)
+
+    def __call__(self, response, *args, **kwargs):
+        self.seconds += response.elapsed.total_seconds()
+
+
+def _reset_caches():
+    # every run starts like a fresh job: no token, no open connections
+    get_api_session().close()
+    get_token_cache().invalidate()
+    AppRunnerUtils._job_contexts = {}
+    AppRunnerUtils._job_configs = {}
+    AppRunnerUtils._job_config_dicts = {}
+
+
+def _stage(workdir, artifacts, stage_seconds):
+    """Return a stand-in for ``app_runner._process_stage``."""
+
+    def process_stage(stage_name, stage_value, config, config_file=None):
+        for items in config["input_files"].values():
+            for item in items:
+                AppRunnerUtils.download_file(item["path"], os.path.join(workdir, "inputs", item["path"]))
+        time.sleep(stage_seconds)
+        files = []
+        for i in range(artifacts):
+            name = f"artifact_{i}.csv"
+            with open(os.path.join(workdir, name), "w") as f:
+                f.write(f"cell,value\n{i},1\n")
+            files.append(name)
+        with open(app_runner.RESULTS_FOR_PAYLOAD, "w") as f:
+            json.dump({"download": [{"file": name} for name in files]}, f)
+        with open(app_runner.RESULTS_FOR_UPLOAD, "w") as f:
+            json.dump([], f)
+
+    return process_stage
+
+
+def run_job(api, timer, workdir, artifacts, stage_seconds):
+    """Run ``app_runner.main()`` for one job and return its metrics."""
+    _reset_caches()
+    api.reset_counters()
+    timer.seconds = 0.0
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    argv, process_stage = sys.argv, app_runner._process_stage
+    sys.argv, app_runner._process_stage = ["app_runner.py", JOB_ID], _stage(workdir, artifacts, stage_seconds)
+    start = time.perf_counter()
+    try:
+        app_runner.main()
+    finally:
+        wall = time.perf_counter() - start
+        sys.argv, app_runner._process_stage = argv, process_stage
+        for handler in root.handlers[len(handlers):]:
+            root.removeHandler(handler)
+            handler.close()
+        root.setLevel(logging.ERROR)
+
+    statuses = api.statuses.get(JOB_ID, [])
+    assert statuses[-2:] == ["running", "completed"], f"job ended {statuses}, see {workdir}/job.log"
+    api.statuses.clear()
+    return {
+        "round_trips": api.requests,
+        "connections": api.connections,
+        "logins": api.logins,
+        "routes": dict(sorted(api.counts.items())),
+        "seconds": round(wall, 4),
+        "api_seconds": round(timer.seconds, 4),
+    }
+
+
+def compare(result, baseline, tolerance):
+    """Return a list of human-readable regressions against ``baseline``."""
+    before = baseline.get("result")
+    if not before:
+        return []
+    regressions = []
+    for field in ("round_trips", "connections", "logins"):
+        if result[field] > before[field]:
+            regressions.append(f"{field}: {result[field]} > baseline {before[field]}")
+    for field in ("seconds", "api_seconds"):
+        if result[field] > max(before[field] * (1 + tolerance), before[field] + 0.05):
+            regressions.append(f"{field}: {result[field]}s > baseline {before[field]}s")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--artifacts", type=int, default=200, help="result files uploaded one by one")
+    parser.add_argument("--inputs", type=int, default=100, help="input files the stage downloads")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per API request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 503")
+    parser.add_argument("--stage-seconds", type=float, default=0.0, help="simulated compute between status updates")
+    parser.add_argument("--repeat", type=int, default=3, help="runs, the median is reported")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="overwrite the baseline with this run")
+    parser.add_argument("--check", action="store_true", help="exit 1 if the job regressed against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed relative slowdown")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stderr = logging.StreamHandler()
+    stderr.setLevel(logging.ERROR)
+    logging.getLogger().addHandler(stderr)
+    inputs = [f"data/sample_{i}.fastq" for i in range(args.inputs)]
+    config = dict(DEFAULT_CONFIG, input_files={"reads": [{"path": path, "additional_info": {}} for path in inputs]})
+    workdir = tempfile.mkdtemp(prefix="cpbench-")
+    store = os.path.join(workdir, "store")
+    for path in inputs:
+        os.makedirs(os.path.dirname(os.path.join(store, "results", path)), exist_ok=True)
+        with open(os.path.join(store, "results", path), "w") as f:
+            f.write("@read\nACGT\n+\nIIII\n")
+    os.makedirs(os.path.join(workdir, "app"))
+    with open(os.path.join(workdir, "app", "workflow.yml"), "w") as f:
+        f.write(WORKFLOW)
+    payload_paths = app_runner.RESULTS_FOR_PAYLOAD, app_runner.RESULTS_FOR_UPLOAD
+    app_runner.RESULTS_FOR_PAYLOAD = os.path.join(workdir, "app", "results_for_payload.json")
+    app_runner.RESULTS_FOR_UPLOAD = os.path.join(workdir, "app", "results_for_upload.json")
+    cwd = os.getcwd()
+    api = FakeSbioApi(latency=args.latency, error_rate=args.error_rate, config=config).start()
+    os.environ.update({
+        "SBIO_API_URL": api.url, "APP_USER": "bench@example.com", "APP_USER_PASSWORD": "bench",
+        "SBIO_STORAGE_BACKEND": "local", "SBIO_LOCAL_STORAGE_ROOT": store, "AWS_DATASET_BUCKET": "results",
+        "EXTERNAL_BUCKET": "user-data", "SBIO_PREFETCH_DIR": workdir, "SBIO_LOG_SHIP_INTERVAL": "0",
+        "SBIO_HEARTBEAT_INTERVAL": "0", "SBIO_TRANSFER_TUNING": "0",
+    })
+    for name in ("JOB_CONFIG", "SBIO_JOB_CONFIG_FILE", "SBIO_INPUT_CACHE_DIR"):
+        os.environ.pop(name, None)
+    timer = _ApiTimer()
+    runs = []
+    try:
+        os.chdir(workdir)
+        for _ in range(args.repeat):
+            runs.append(run_job(api, timer, workdir, args.artifacts, args.stage_seconds))
+    finally:
+        os.chdir(cwd)
+        api.stop()
+        app_runner.RESULTS_FOR_PAYLOAD, app_runner.RESULTS_FOR_UPLOAD = payload_paths
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = dict(runs[-1])
+    result["seconds"] = round(statistics.median(r["seconds"] for r in runs), 4)
+    result["api_seconds"] = round(statistics.median(r["api_seconds"] for r in runs), 4)
+    print(f"{result['round_trips']} API round trips over {result['connections']} connections, "
+          f"{result['logins']} login(s)")
+    print(f"job {result['seconds']:.3f}s, waiting on the API {result['api_seconds']:.3f}s")
+    for route, count in result["routes"].items():
+        print(f"  {route:<36} {count:>5}")
+
+    report = {
+        "settings": {"artifacts": args.artifacts, "inputs": args.inputs, "latency": args.latency,
+                     "error_rate": args.error_rate, "stage_seconds": args.stage_seconds},
+        "result": result,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != report["settings"]:
+            print("Baseline was recorded with different settings, not comparing")
+            return 0
+        regressions = compare(result, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions and args.check:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
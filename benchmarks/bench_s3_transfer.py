@@ -0,0 +1,214 @@
+"""Offline benchmark of ``s3_transfer`` uploads and downloads.
+
+Sweeps file sizes, chunk sizes and concurrency levels against a local S3
+stand-in and reports throughput, CPU time and peak Python memory for each
+combination.  Results can be saved as a JSON baseline and later runs
+compared against it to catch regressions.
+
+Usage::
+
+    python -m benchmarks.bench_s3_transfer                      # fake S3, default sweep
+    python -m benchmarks.bench_s3_transfer --save-baseline      # refresh the baseline
+    python -m benchmarks.bench_s3_transfer --check              # exit 1 on regression
+    python -m benchmarks.bench_s3_transfer --backend moto       # moto server mode
+
+The default ``fake`` backend (``benchmarks.fake_s3``) injects per-request
+latency and per-connection/shared bandwidth limits, so results are stable
+across machines.  The ``moto`` backend runs a real boto3 client against
+moto's threaded server and has no network shaping; its numbers mostly
+reflect local CPU cost.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from boto3.s3.transfer import TransferConfig
+
+import sbioapputils.app_runner.s3_transfer as s3_transfer
+from benchmarks.fake_s3 import FakeS3Client
+
+MB = 1024 * 1024
+BUCKET = "bench-bucket"
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "s3_transfer.json")
+
+
+@contextmanager
+def fixed_transfer_config(chunk, concurrency):
+    """Force ``s3_transfer`` to use the given chunk size and thread count."""
+    original = s3_transfer.get_transfer_config
+
+    def _fixed(file_size, max_concurrency=None, max_pool_connections=None):
+        threads = min(concurrency, max_concurrency) if max_concurrency else concurrency
+        config = TransferConfig(multipart_threshold=16 * MB, multipart_chunksize=chunk,
+                                max_concurrency=threads, use_threads=True)
+        return config, chunk, threads
+
+    s3_transfer.get_transfer_config = _fixed
+    try:
+        yield
+    finally:
+        s3_transfer.get_transfer_config = original
+
+
+def make_client(args):
+    if args.backend == "fake":
+        return FakeS3Client(
+            latency=args.latency,
+            connection_bandwidth=args.connection_mbps * MB if args.connection_mbps else None,
+            total_bandwidth=args.total_mbps * MB if args.total_mbps else None,
+        ), None
+
+    import boto3
+    import botocore.config
+    from moto.server import ThreadedMotoServer
+
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=args.moto_port, verbose=False)
+    server.start()
+    client = boto3.client(
+        "s3", endpoint_url=f"http://127.0.0.1:{args.moto_port}", region_name="us-east-1",
+        aws_access_key_id="bench", aws_secret_access_key="bench",
+        config=botocore.config.Config(max_pool_connections=25),
+    )
+    client.create_bucket(Bucket=BUCKET)
+    return client, server
+
+
+def measure(func):
+    """Run ``func`` and return (wall seconds, CPU seconds, peak traced bytes)."""
+    tracemalloc.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        func()
+        return time.perf_counter() - wall, time.process_time() - cpu, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(client, workdir, direction, size, chunk, concurrency, engine=None):
+    src = os.path.join(workdir, f"src-{size}")
+    if not os.path.exists(src):
+        with open(src, "wb") as f:
+            for _ in range(size // MB):
+                f.write(os.urandom(MB))
+            f.write(os.urandom(size % MB))
+    key = f"bench/{size}"
+    dest = os.path.join(workdir, "dest")
+
+    with fixed_transfer_config(chunk, concurrency):
+        if direction == "upload":
+            wall, cpu, peak = measure(lambda: s3_transfer.multipart_upload(client, BUCKET, src, key, progress=False))
+        else:
+            s3_transfer.multipart_upload(client, BUCKET, src, key, progress=False)
+            wall, cpu, peak = measure(lambda: s3_transfer.multipart_download(
+                client, BUCKET, key, dest, progress=False, engine=engine))
+            os.remove(dest)
+    return {
+        "direction": direction,
+        "size_mb": size // MB,
+        "chunk_mb": chunk // MB,
+        "concurrency": concurrency,
+        "seconds": round(wall, 4),
+        "mbps": round(size / MB / wall, 2) if wall > 0 else None,
+        "cpu_seconds": round(cpu, 4),
+        "peak_mb": round(peak / MB, 2),
+    }
+
+
+def case_id(result):
+    return "{direction}:{size_mb}MB:{chunk_mb}MB:x{concurrency}".format(**result)
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of human-readable regressions against ``baseline``."""
+    previous = {case_id(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get(case_id(result))
+        if not before:
+            continue
+        if before["mbps"] and result["mbps"] < before["mbps"] * (1 - tolerance):
+            regressions.append(f"{case_id(result)}: {result['mbps']} MB/s < baseline {before['mbps']} MB/s")
+        if result["peak_mb"] > max(before["peak_mb"] * (1 + tolerance), before["peak_mb"] + 1):
+            regressions.append(f"{case_id(result)}: peak {result['peak_mb']} MB > baseline {before['peak_mb']} MB")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--backend", choices=["fake", "moto"], default="fake")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8, 64, 128], help="file sizes in MB")
+    parser.add_argument("--chunks", type=int, nargs="+", default=[8, 16, 64], help="chunk sizes in MB")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--directions", nargs="+", default=["upload", "download"], choices=["upload", "download"])
+    parser.add_argument("--latency", type=float, default=0.02, help="fake backend: seconds per request")
+    parser.add_argument("--connection-mbps", type=float, default=50, help="fake backend: MB/s per connection")
+    parser.add_argument("--total-mbps", type=float, default=400, help="fake backend: shared MB/s")
+    parser.add_argument("--engine", choices=["boto3", "ranged"], default="boto3", help="download engine")
+    parser.add_argument("--moto-port", type=int, default=5123)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="overwrite the baseline with this run")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any case regressed against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    # keep benchmark runs out of the host's persisted tuning statistics
+    os.environ["SBIO_TRANSFER_TUNING"] = "0"
+    client, server = make_client(args)
+    workdir = tempfile.mkdtemp(prefix="s3bench-")
+    results = []
+    try:
+        for direction, size, chunk, concurrency in itertools.product(
+                args.directions, args.sizes, args.chunks, args.concurrency):
+            result = run_case(client, workdir, direction, size * MB, chunk * MB, concurrency, args.engine)
+            results.append(result)
+            print("{:<32} {:>9.1f} MB/s  cpu {:>7.3f}s  peak {:>8.2f} MB".format(
+                case_id(result), result["mbps"] or 0, result["cpu_seconds"], result["peak_mb"]))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        if server:
+            server.stop()
+        else:
+            client.close()
+
+    report = {
+        "backend": args.backend,
+        "settings": {"latency": args.latency, "connection_mbps": args.connection_mbps,
+                     "total_mbps": args.total_mbps, "engine": args.engine},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if (baseline.get("backend"), baseline.get("settings")) != (report["backend"], report["settings"]):
+            print("Baseline was recorded with a different backend or network settings, not comparing")
+            return 0
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions and args.check:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
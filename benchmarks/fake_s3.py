@@ -0,0 +1,268 @@
+"""In-process S3 stand-in with injectable latency and bandwidth.
+
+``FakeS3Client`` implements the subset of the boto3 S3 client used by
+``sbioapputils.app_runner.s3_transfer`` (object and multipart calls plus the
+managed ``upload_file``/``download_file``).  Objects are kept as files in a
+temporary directory and bodies are read lazily, so the stand-in's storage
+does not show up in memory measurements of the client code.  Every
+request waits ``latency`` seconds, each connection moves at most
+``connection_bandwidth`` bytes/s and all connections together share
+``total_bandwidth`` bytes/s, so transfer settings can be compared
+reproducibly on a laptop.  Waiting is done with ``time.sleep`` and does not
+burn CPU, which keeps CPU-time measurements meaningful.
+"""
+import hashlib
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+
+MB = 1024 * 1024
+
+
+def _error(code, message, status):
+    return ClientError({"Error": {"Code": code, "Message": message},
+                        "ResponseMetadata": {"HTTPStatusCode": status}}, "FakeS3")
+
+
+class _Network:
+    """Models per-request latency, per-connection and shared bandwidth limits."""
+
+    def __init__(self, latency, connection_bandwidth, total_bandwidth, max_connections):
+        self.latency = latency
+        self.connection_bandwidth = connection_bandwidth
+        self.total_bandwidth = total_bandwidth
+        self._connections = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self._link_free_at = 0.0
+        self.requests = 0
+
+    def request(self):
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def move(self, nbytes):
+        now = time.monotonic()
+        done_at = now
+        if self.connection_bandwidth:
+            done_at = now + nbytes / self.connection_bandwidth
+        if self.total_bandwidth:
+            with self._lock:
+                start = max(now, self._link_free_at)
+                self._link_free_at = start + nbytes / self.total_bandwidth
+                done_at = max(done_at, self._link_free_at)
+        delay = done_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def connection(self):
+        return self._connections
+
+
+class _Body:
+    def __init__(self, path, start, length, network):
+        self._path = path
+        self._pos = start
+        self._remaining = length
+        self._network = network
+
+    def read(self, n=None):
+        if n is None or n < 0 or n > self._remaining:
+            n = self._remaining
+        with open(self._path, "rb") as f:
+            f.seek(self._pos)
+            chunk = f.read(n)
+        self._pos += len(chunk)
+        self._remaining -= len(chunk)
+        self._network.move(len(chunk))
+        return chunk
+
+    def close(self):
+        pass
+
+
+class FakeS3Client:
+
+    def __init__(self, latency=0.0, connection_bandwidth=None, total_bandwidth=None, max_pool_connections=25,
+                 root=None):
+        self.meta = SimpleNamespace(config=SimpleNamespace(max_pool_connections=max_pool_connections))
+        self.network = _Network(latency, connection_bandwidth, total_bandwidth, max_pool_connections)
+        self.root = root or tempfile.mkdtemp(prefix="fake-s3-")
+        self._files = itertools.count(1)
+        self._objects = {}
+        self._uploads = {}
+        self._upload_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    # -- object calls -------------------------------------------------------
+
+    def _get(self, bucket, key):
+        try:
+            return self._objects[(bucket, key)]
+        except KeyError:
+            raise _error("404", "Not Found", 404) from None
+
+    def _new_file(self):
+        return os.path.join(self.root, str(next(self._files)))
+
+    def _write(self, data):
+        path = self._new_file()
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def _store(self, bucket, key, path, etag, extra):
+        size = os.path.getsize(path)
+        with self._lock:
+            previous = self._objects.get((bucket, key))
+            self._objects[(bucket, key)] = dict(extra, Path=path, Size=size, ETag=etag)
+        if previous:
+            os.remove(previous["Path"])
+
+    def close(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def head_object(self, Bucket, Key, PartNumber=None, **kwargs):
+        with self.network.connection():
+            self.network.request()
+            obj = self._get(Bucket, Key)
+        head = {k: v for k, v in obj.items() if k not in ("Path", "Size", "Parts")}
+        head["ContentLength"] = obj["Size"]
+        if PartNumber and obj.get("Parts"):
+            head["ContentLength"] = obj["Parts"][PartNumber - 1]
+            head["PartsCount"] = len(obj["Parts"])
+        return head
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None, **kwargs):
+        with self.network.connection():
+            self.network.request()
+            obj = self._get(Bucket, Key)
+            if IfMatch and IfMatch != obj["ETag"]:
+                raise _error("PreconditionFailed", "At least one of the pre-conditions you specified did not hold", 412)
+            start, end = 0, obj["Size"] - 1
+            if Range:
+                start, end = (int(v) for v in Range.split("=", 1)[1].split("-"))
+                end = min(end, obj["Size"] - 1)
+            body = _Body(obj["Path"], start, end - start + 1, self.network)
+        result = {k: v for k, v in obj.items() if k not in ("Path", "Size", "Parts")}
+        result.update(Body=body, ContentLength=end - start + 1)
+        return result
+
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        data = Body.read() if hasattr(Body, "read") else bytes(Body)
+        with self.network.connection():
+            self.network.request()
+            self.network.move(len(data))
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        self._store(Bucket, Key, self._write(data), etag, kwargs)
+        return {"ETag": etag}
+
+    # -- multipart ----------------------------------------------------------
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.network.request()
+        upload_id = str(next(self._upload_ids))
+        with self._lock:
+            self._uploads[upload_id] = {"parts": {}, "extra": kwargs}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        data = Body.read() if hasattr(Body, "read") else bytes(Body)
+        with self.network.connection():
+            self.network.request()
+            self.network.move(len(data))
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        path = self._write(data)
+        with self._lock:
+            self._uploads[UploadId]["parts"][PartNumber] = (path, hashlib.md5(data).digest(), len(data))
+        return {"ETag": etag}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self.network.request()
+        with self._lock:
+            upload = self._uploads.pop(UploadId)
+        parts = [upload["parts"][p["PartNumber"]] for p in MultipartUpload["Parts"]]
+        digest = hashlib.md5(b"".join(part_md5 for _, part_md5, _ in parts)).hexdigest()
+        etag = f'"{digest}-{len(parts)}"'
+        path = self._new_file()
+        with open(path, "wb") as out:
+            for part_path, _, _ in parts:
+                with open(part_path, "rb") as f:
+                    shutil.copyfileobj(f, out, MB)
+        self._discard_parts(upload)
+        self._store(Bucket, Key, path, etag, dict(upload["extra"], Parts=[size for _, _, size in parts]))
+        return {"ETag": etag}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        with self._lock:
+            upload = self._uploads.pop(UploadId, None)
+        if upload:
+            self._discard_parts(upload)
+        return {}
+
+    @staticmethod
+    def _discard_parts(upload):
+        for part_path, _, _ in upload["parts"].values():
+            os.remove(part_path)
+
+    # -- managed transfers (simplified boto3 TransferManager) ---------------
+
+    def upload_file(self, Filename, Bucket, Key, Config=None, Callback=None, ExtraArgs=None):
+        size = os.path.getsize(Filename)
+        extra = ExtraArgs or {}
+        if Config is None or size < Config.multipart_threshold:
+            with open(Filename, "rb") as f:
+                self.put_object(Bucket=Bucket, Key=Key, Body=f.read(), **extra)
+            if Callback:
+                Callback(size)
+            return
+
+        chunk = Config.multipart_chunksize
+        upload_id = self.create_multipart_upload(Bucket=Bucket, Key=Key, **extra)["UploadId"]
+
+        def _part(number):
+            with open(Filename, "rb") as f:
+                f.seek((number - 1) * chunk)
+                data = f.read(chunk)
+            etag = self.upload_part(Bucket=Bucket, Key=Key, UploadId=upload_id, PartNumber=number, Body=data)["ETag"]
+            if Callback:
+                Callback(len(data))
+            return {"PartNumber": number, "ETag": etag}
+
+        numbers = range(1, (size + chunk - 1) // chunk + 1)
+        with ThreadPoolExecutor(max_workers=Config.max_concurrency) as executor:
+            parts = list(executor.map(_part, numbers))
+        self.complete_multipart_upload(Bucket=Bucket, Key=Key, UploadId=upload_id, MultipartUpload={"Parts": parts})
+
+    def download_file(self, Bucket, Key, Filename, Config=None, Callback=None, ExtraArgs=None):
+        size = self.head_object(Bucket=Bucket, Key=Key)["ContentLength"]
+        chunk = Config.multipart_chunksize if Config and size >= Config.multipart_threshold else max(size, 1)
+        workers = Config.max_concurrency if Config else 1
+        tmp_path = f"{Filename}.fake{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            f.truncate(size)
+
+        def _range(start):
+            end = min(start + chunk, size) - 1
+            body = self.get_object(Bucket=Bucket, Key=Key, Range=f"bytes={start}-{end}")["Body"]
+            with open(tmp_path, "r+b") as f:
+                f.seek(start)
+                while True:
+                    data = body.read(MB)
+                    if not data:
+                        break
+                    f.write(data)
+                    if Callback:
+                        Callback(len(data))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(_range, range(0, size, chunk)))
+        os.replace(tmp_path, Filename)
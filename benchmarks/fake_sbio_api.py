@@ -0,0 +1,187 @@
+"""Local stand-in for the SBIO platform API with injectable latency and errors.
+
+``FakeSbioApi`` serves the endpoints ``AppRunnerUtils`` calls (``/login``,
+``/api/jobs/<id>/config|folder|running|completed|failed|heartbeat`` and
+``/api/verify_enough_credits``) from a ``ThreadingHTTPServer`` on
+localhost, with keep-alive.  Every request waits ``latency`` seconds, a
+fraction ``error_rate`` of them is answered with ``error_status``, and
+``fail_next`` queues specific failures.  Tokens are JWTs that expire after
+``token_ttl`` seconds and are rejected with 401 afterwards.  The server
+counts requests per route, logins and TCP connections, so
+``benchmarks.bench_control_plane`` and the API session tests can check how
+many round trips a job costs.
+"""
+import base64
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+DEFAULT_CONFIG = {
+    "input_files": {
+        "reads": [{"path": f"data/sample_{i}.fastq", "additional_info": {}} for i in range(100)],
+    },
+    "n_neighbors": 15,
+}
+
+_JOB_ROUTE = re.compile(r"^/api/jobs/([^/]+)/(config|folder|running|completed|failed|heartbeat)$")
+
+
+def make_token(ttl, serial):
+    header = base64.urlsafe_b64encode(b'{"alg":"none"}').rstrip(b"=").decode()
+    claims = {"sub": "app", "exp": int(time.time() + ttl), "jti": serial}
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b"=").decode()
+    return f"{header}.{payload}.fake"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.api.record_connection()
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, payload=None):
+        body = json.dumps(payload if payload is not None else {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        url = urlsplit(self.path)
+        status, payload = self.server.api.handle(self.command, url.path, url.query, body,
+                                                 self.headers.get("Authorization"))
+        self._reply(status, payload)
+
+    do_GET = do_PUT = do_POST = do_DELETE = _handle
+
+
+class FakeSbioApi:
+    """A local SBIO API server, see the module docstring.
+
+    Args:
+        latency: Seconds every request waits before it is answered.
+        error_rate: Fraction of requests answered with ``error_status``.
+        error_status: Status of injected random errors.
+        token_ttl: Lifetime of issued tokens in seconds.
+        config: Job config returned by ``/config`` (default ``DEFAULT_CONFIG``).
+        seed: Seed of the random error injection.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, error_status=503, token_ttl=3600, config=None, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.token_ttl = token_ttl
+        self.config = config if config is not None else DEFAULT_CONFIG
+        self.counts = Counter()
+        self.connections = 0
+        self.logins = 0
+        self.statuses = {}
+        self.heartbeats = []
+        self._tokens = {}
+        self._failures = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.api = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-sbio-api", daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @property
+    def requests(self):
+        return sum(self.counts.values())
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def fail_next(self, method, route, *statuses):
+        """Answer the next requests to ``route`` (e.g. ``/api/jobs/{id}/running``) with ``statuses``."""
+        with self._lock:
+            self._failures.setdefault((method, route), []).extend(statuses)
+
+    def expire_tokens(self):
+        """Make every issued token invalid, as if they had all expired."""
+        with self._lock:
+            self._tokens.clear()
+
+    def reset_counters(self):
+        with self._lock:
+            self.counts.clear()
+            self.connections = 0
+            self.logins = 0
+
+    def record_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def handle(self, method, path, query, body, authorization):
+        match = _JOB_ROUTE.match(path)
+        route = f"/api/jobs/{{id}}/{match.group(2)}" if match else path
+        with self._lock:
+            self.counts[f"{method} {route}"] += 1
+            queued = self._failures.get((method, route))
+            injected = queued.pop(0) if queued else None
+            if injected is None and self.error_rate and self._rng.random() < self.error_rate:
+                injected = self.error_status
+        if self.latency:
+            time.sleep(self.latency)
+        if injected:
+            return injected, {"error": "injected"}
+
+        if method == "POST" and path == "/login":
+            with self._lock:
+                self.logins += 1
+                token = make_token(self.token_ttl, self.logins)
+                self._tokens[token] = time.time() + self.token_ttl
+            return 200, {"access_token": token}
+        token = (authorization or "").replace("Bearer ", "", 1)
+        with self._lock:
+            expiry = self._tokens.get(token)
+        if not expiry or expiry < time.time():
+            return 401, {"error": "invalid token"}
+
+        if method == "GET" and path == "/api/verify_enough_credits":
+            return 200, {"has_enough_credits": True}
+        if not match:
+            return 404, {"error": f"no route {method} {path}"}
+        job_id, action = match.groups()
+        if method == "GET" and action == "config":
+            return 200, {"config": self.config}
+        if method == "GET" and action == "folder":
+            return 200, {"folder": f"jobs/{job_id}/"}
+        if method == "PUT" and action in ("running", "completed", "failed"):
+            with self._lock:
+                self.statuses.setdefault(job_id, []).append(action)
+            return 200, {}
+        if method == "PUT" and action == "heartbeat":
+            with self._lock:
+                self.heartbeats.append((job_id, body))
+            return 200, {}
+        return 405, {"error": f"{method} not allowed on {path}"}
@@ -0,0 +1,80 @@
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeouts in seconds of an SBIO API call, overridden by
+# ``SBIO_API_TIMEOUT`` (one number for both, or "connect,read").
+DEFAULT_TIMEOUT = (5, 60)
+# Retries of a failed call, overridden by ``SBIO_API_RETRIES``.
+DEFAULT_RETRIES = 4
+# Waits 0.5s, 1s, 2s, ... between retries, or what Retry-After asks for.
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Methods that may be repeated after the server received them.  Others
+# (POST) are only retried when the connection could not be made.
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+POOL_SIZE = 16
+
+
+def api_timeout():
+    """Return the (connect, read) timeout of SBIO API calls."""
+    value = os.environ.get("SBIO_API_TIMEOUT")
+    if not value:
+        return DEFAULT_TIMEOUT
+    parts = [float(v) for v in value.split(",")]
+    return (parts[0], parts[-1])
+
+
+def _retry(total):
+    kwargs = dict(total=total, connect=total, read=total, status=total, backoff_factor=RETRY_BACKOFF,
+                  status_forcelist=RETRY_STATUSES, respect_retry_after_header=True, raise_on_status=False)
+    try:
+        return Retry(allowed_methods=IDEMPOTENT_METHODS, **kwargs)
+    except TypeError:  # urllib3 < 1.26
+        return Retry(method_whitelist=IDEMPOTENT_METHODS, **kwargs)
+
+
+def new_api_session(retries=None):
+    """Return a ``requests.Session`` with pooled keep-alive connections and retries.
+
+    Connection errors are retried for every method; read errors and 429
+    or 5xx responses only for idempotent ones, with exponential backoff.
+    After the last retry the failed response is returned as is.
+    """
+    if retries is None:
+        retries = int(os.environ.get("SBIO_API_RETRIES") or DEFAULT_RETRIES)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=_retry(retries))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_api_session():
+    """Return the process-wide session ``AppRunnerUtils`` makes SBIO API calls with."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = new_api_session()
+        return _session
+
+
+def _reset_session():
+    # a forked child must not reuse the parent's sockets
+    global _session, _session_lock
+    _session = None
+    _session_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_session)
@@ -0,0 +1,91 @@
+import base64
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Tokens are refreshed this many seconds before they expire, so a request
+# never goes out with a token that lapses in flight.
+DEFAULT_REFRESH_MARGIN = 60
+# Lifetime assumed for a token that carries no expiry (not a JWT with an
+# ``exp`` claim and no ``expires_in`` in the login response).
+DEFAULT_TOKEN_TTL = 300
+
+
+def token_expiry(token, response=None, now=None):
+    """Return the epoch time at which ``token`` expires, or None if unknown.
+
+    Reads the ``exp`` claim of a JWT (the signature is not checked, the
+    server does that), else ``expires_in`` from the login ``response``.
+    """
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        pass
+    if response and response.get("expires_in"):
+        return (now or time.time()) + float(response["expires_in"])
+    return None
+
+
+class TokenCache:
+    """Thread-safe cache of API access tokens, refreshed shortly before they expire.
+
+    Tokens are kept per key (e.g. API URL and user).  ``get`` returns the
+    cached token while it is valid for more than ``refresh_margin``
+    seconds and otherwise calls ``login`` once, even when several threads
+    ask at the same time.
+    """
+
+    def __init__(self, refresh_margin=DEFAULT_REFRESH_MARGIN, default_ttl=DEFAULT_TOKEN_TTL, clock=time.time):
+        self.refresh_margin = refresh_margin
+        self.default_ttl = default_ttl
+        self.clock = clock
+        self.logins = 0
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, login, refresh=False):
+        """Return a valid token for ``key``, calling ``login`` when none is cached.
+
+        Args:
+            key: Cache key, tokens of different keys are independent.
+            login: Callable returning the login response, a dict with the
+                ``access_token`` and optionally ``expires_in``.
+            refresh: Log in again even if the cached token is still valid.
+
+        Returns:
+            str: The access token.
+        """
+        with self._lock:
+            cached = self._tokens.get(key)
+            if cached and not refresh and cached[1] - self.refresh_margin > self.clock():
+                return cached[0]
+            response = login()
+            self.logins += 1
+            token = response["access_token"]
+            now = self.clock()
+            expiry = token_expiry(token, response, now) or now + self.default_ttl
+            if expiry - self.refresh_margin <= now:
+                logger.warning("API token expires within %ds, it will be renewed on every call", self.refresh_margin)
+            self._tokens[key] = (token, expiry)
+            return token
+
+    def invalidate(self, key=None):
+        """Drop the cached token of ``key``, or all tokens."""
+        with self._lock:
+            if key is None:
+                self._tokens.clear()
+            else:
+                self._tokens.pop(key, None)
+
+
+_token_cache = TokenCache()
+
+
+def get_token_cache():
+    """Return the process-wide token cache used by ``AppRunnerUtils``."""
+    return _token_cache
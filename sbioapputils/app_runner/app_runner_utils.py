@@ -2,14 +2,35 @@ import boto3
 import botocore.config
 import logging
 import os
-import requests
+import tempfile
+import threading
 from logging.handlers import WatchedFileHandler
 
-from sbioapputils.app_runner.s3_transfer import multipart_download, multipart_upload
+from sbioapputils.app_runner.api_session import api_timeout, get_api_session
+from sbioapputils.app_runner.api_token import get_token_cache
+from sbioapputils.app_runner.input_cache import InputCache
+from sbioapputils.app_runner.job_config import JobConfig, decode_config
+from sbioapputils.app_runner.job_context import JobContext
+from sbioapputils.app_runner.log_shipper import LogShipper, SEGMENTS_SUFFIX
+from sbioapputils.app_runner.prefetch import (
+    DEFAULT_PREFETCH_MAX_GB, DEFAULT_PREFETCH_WORKERS, InputPrefetcher, input_file_paths,
+)
+from sbioapputils.app_runner.transfer_monitor import get_monitor
+from sbioapputils.app_runner.s3_clients import (
+    ROLE_SESSION_NAME, assumed_role_credentials, get_client_registry, refreshable_session,
+)
+from sbioapputils.app_runner.s3_reader import S3RangeReader, DEFAULT_BLOCK_SIZE, DEFAULT_CACHE_BLOCKS
+from sbioapputils.app_runner.storage import LocalStorageClient, StorageBucket, get_storage_backend, LOCAL_BACKEND
+from sbioapputils.app_runner.tar_pack import archive_suffix, pack_upload
+from sbioapputils.app_runner.s3_transfer import (
+    DEFAULT_UPLOAD_WORKERS, download_and_extract, multipart_download, multipart_upload, summarize_uploads,
+    sync_upload_files, upload_files,
+)
 
 # boto3's default urllib3 pool is 10 connections, but TransferConfig
 # scales up to 20 concurrent threads for large files.  Align the pool
-# so connections aren't discarded under load.
+# so connections aren't discarded under load; the transfer tuner never
+# picks more threads than the pool holds.
 _S3_CLIENT_CONFIG = botocore.config.Config(
     max_pool_connections=25,
     retries={"max_attempts": 3, "mode": "adaptive"},
@@ -17,27 +38,42 @@ _S3_CLIENT_CONFIG = botocore.config.Config(
 
 
 class AppRunnerUtils:
+    _job_configs = {}
+    _job_config_dicts = {}
+    _job_config_lock = threading.Lock()
+    _input_file_index = None
+    _job_contexts = {}
+    _job_context_lock = threading.Lock()
 
     @classmethod
     def get_s3_bucket(cls, external_bucket=None):
+        """Return a boto3 resource ``Bucket``, cached per thread, see ``get_s3_client``.
+
+        With ``SBIO_STORAGE_BACKEND=local`` it is a ``StorageBucket`` over the
+        client and bucket ``get_s3_client`` resolves instead.
+        """
+        if get_storage_backend() == LOCAL_BACKEND:
+            return StorageBucket(*cls.get_s3_client(external_bucket))
+        registry = get_client_registry()
         if external_bucket:
             role_arn = os.environ.get("ROLE_ARN")
-            credentials = cls.assume_role(role_arn)
-            session = boto3.session.Session(aws_access_key_id=credentials['AccessKeyId'],
-                                            aws_secret_access_key=credentials['SecretAccessKey'],
-                                            aws_session_token=credentials['SessionToken'])
-            s3 = session.resource('s3')
-            return s3.Bucket(external_bucket)
+            return registry.resource(
+                ("bucket", "role", role_arn, external_bucket),
+                lambda: cls._get_role_session(role_arn).resource('s3').Bucket(external_bucket),
+            )
         else:
             key_id = os.environ.get("AWS_ACCESS_KEY_ID")
             secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
             region = os.environ.get("AWS_REGION")
             bucket = os.environ.get("AWS_DATASET_BUCKET")
-            session = boto3.session.Session(aws_access_key_id=key_id,
-                                            aws_secret_access_key=secret_key,
-                                            region_name=region)
-            s3 = session.resource('s3')
-            return s3.Bucket(bucket)
+
+            def _bucket():
+                session = boto3.session.Session(aws_access_key_id=key_id,
+                                                aws_secret_access_key=secret_key,
+                                                region_name=region)
+                return session.resource('s3').Bucket(bucket)
+
+            return registry.resource(("bucket", "env", key_id, secret_key, region, bucket), _bucket)
 
     @classmethod
     def get_s3_client(cls, external_bucket=None):
@@ -47,45 +83,121 @@ class AppRunnerUtils:
         this method returns a low-level client suitable for
         ``download_file`` / ``upload_file`` with ``TransferConfig``.
 
+        Clients are built once per credential source and region and shared
+        process-wide (see ``s3_clients.ClientRegistry``), so every transfer
+        of a job reuses the same connection pool.  External buckets use
+        ``ROLE_ARN`` credentials that are assumed once and renewed before
+        they expire.
+
+        With ``SBIO_STORAGE_BACKEND=local`` the client is a
+        ``LocalStorageClient`` on ``SBIO_LOCAL_STORAGE_ROOT`` instead, and
+        buckets are directories under it.
+
         Returns:
             tuple: (s3_client, bucket_name)
         """
+        registry = get_client_registry()
+        if get_storage_backend() == LOCAL_BACKEND:
+            s3_client = registry.get(
+                ("local", os.environ.get("SBIO_LOCAL_STORAGE_ROOT"), os.environ.get("SBIO_LOCAL_STORAGE_HARDLINK")),
+                LocalStorageClient.from_env,
+            )
+            return s3_client, external_bucket or os.environ.get("AWS_DATASET_BUCKET", "default")
+        region = os.environ.get("AWS_REGION")
         if external_bucket:
             role_arn = os.environ.get("ROLE_ARN")
-            credentials = cls.assume_role(role_arn)
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=credentials['AccessKeyId'],
-                aws_secret_access_key=credentials['SecretAccessKey'],
-                aws_session_token=credentials['SessionToken'],
-                region_name=os.environ.get("AWS_REGION"),
-                config=_S3_CLIENT_CONFIG,
+            s3_client = registry.get(
+                ("client", "role", role_arn, region),
+                lambda: cls._get_role_session(role_arn).client('s3', region_name=region, config=_S3_CLIENT_CONFIG),
             )
             return s3_client, external_bucket
         else:
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
-                aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
-                region_name=os.environ.get("AWS_REGION"),
-                config=_S3_CLIENT_CONFIG,
+            key_id = os.environ.get("AWS_ACCESS_KEY_ID")
+            secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
+            s3_client = registry.get(
+                ("client", "env", key_id, secret_key, region),
+                lambda: boto3.client(
+                    's3',
+                    aws_access_key_id=key_id,
+                    aws_secret_access_key=secret_key,
+                    region_name=region,
+                    config=_S3_CLIENT_CONFIG,
+                ),
             )
             return s3_client, os.environ.get("AWS_DATASET_BUCKET")
 
+    @classmethod
+    def _get_role_session(cls, role_arn: str):
+        return get_client_registry().get(
+            ("session", "role", role_arn),
+            lambda: refreshable_session(assumed_role_credentials(role_arn, cls.assume_role)),
+        )
+
     @classmethod
     def assume_role(cls, role_arn):
         sts_client = boto3.client('sts')
         assumed_role = sts_client.assume_role(
             RoleArn=role_arn,
-            RoleSessionName="YourSessionName"
+            RoleSessionName=ROLE_SESSION_NAME
         )
         credentials = assumed_role['Credentials']
         return credentials
 
     @classmethod
-    def upload_results(cls, job_id: str, results: dict):
+    def upload_results(cls, job_id: str, results: dict, additional_files: list = None):
+        """Upload the files referenced by ``results`` plus ``additional_files``.
+
+        With ``SBIO_PACK_MIN_FILES`` set, additional files are grouped by
+        directory and every directory holding at least that many of them
+        is sent as one tar archive (``<dir>.tar``, with an index), see
+        ``upload_packed_files``.  Files referenced by ``results`` are
+        always uploaded individually.
+        """
         src_files = cls._build_result_file_list(results)
-        cls.upload_result_files(job_id, src_files)
+        packed = {}
+        if additional_files:
+            additional_files, packed = cls._group_files_to_pack(additional_files)
+            src_files.extend(additional_files)
+        summary = cls.upload_result_files(job_id, src_files)
+        summary['archives'] = [cls.upload_packed_files(job_id, files, directory)
+                               for directory, files in packed.items()]
+        return summary
+
+    @classmethod
+    def _group_files_to_pack(cls, files: list):
+        min_files = int(os.environ.get("SBIO_PACK_MIN_FILES") or 0)
+        if min_files <= 0:
+            return files, {}
+        by_dir = {}
+        for file in dict.fromkeys(files):
+            by_dir.setdefault(os.path.dirname(file.rstrip('/')), []).append(file)
+        packed = {d: fs for d, fs in by_dir.items() if d and len(fs) >= min_files}
+        remaining = [f for f in files if os.path.dirname(f.rstrip('/')) not in packed]
+        return remaining, packed
+
+    @classmethod
+    def upload_packed_files(cls, job_id: str, src_files: list, archive_path: str, compress: str = None):
+        """Stream ``src_files`` into one tar object in the job folder instead of one object each.
+
+        The archive is stored at ``<job folder><archive_path>.tar`` (or
+        ``.tar.gz``/``.tar.zst`` with ``compress``, default: the
+        ``SBIO_COMPRESS_RESULTS`` environment variable), with member names
+        relative to the parent of ``archive_path``, and an index next to it
+        so single files can be read back with ranged GETs, see
+        ``tar_pack.pack_upload`` and ``tar_pack.read_member``.
+
+        Returns:
+            dict: ``key`` of the archive and number of ``files`` in it.
+        """
+        if compress is None:
+            compress = os.environ.get("SBIO_COMPRESS_RESULTS") or None
+        archive_path = archive_path.rstrip('/')
+        context = cls.get_job_context(job_id)
+        key = context.key(f'{archive_path}{archive_suffix(compress)}')
+        index = pack_upload(context.s3_client, context.bucket, src_files, key,
+                            root=os.path.dirname(archive_path) or '.', compress=compress)
+        logging.info(f"Uploaded {len(index['members'])} files as {key}")
+        return {'key': key, 'files': len(index['members'])}
 
     @classmethod
     def _build_result_file_list(cls, results: dict):
@@ -112,23 +224,81 @@ class AppRunnerUtils:
         return files
 
     @classmethod
-    def upload_result_files(cls, job_id: str, src_files: list):
-        dest = cls.get_job_folder(job_id)
-        external_bucket = None
-        if "EXTERNAL_BUCKET" in os.environ and os.environ.get("SAVE_RESULTS_TO_USER_DATA", "").lower() in ("true", "1", "yes"):
-            external_bucket = os.environ.get("EXTERNAL_BUCKET")
-        s3_client, bucket_name = cls.get_s3_client(external_bucket)
-        for src_file in src_files:
-            cls._upload(s3_client, bucket_name, src_file, dest)
+    def upload_result_files(cls, job_id: str, src_files: list, max_workers: int = DEFAULT_UPLOAD_WORKERS,
+                            sync: bool = None, compress: str = None):
+        """Upload result files concurrently into the job folder.
+
+        All files share one S3 client; ``max_workers`` of them are in flight
+        at once. With ``sync`` (default: the ``SBIO_SYNC_UPLOADS`` environment
+        variable) files whose size and ETag already match the object at the
+        destination are skipped, so a retried job only sends what changed.
+        With ``compress`` (``"gzip"`` or ``"zstd"``, default: the
+        ``SBIO_COMPRESS_RESULTS`` environment variable) large text results such
+        as CSV tables and HTML figures are compressed while they upload and
+        stored with a matching ``Content-Encoding``.
+        With ``SBIO_TRANSFER_CHECKSUM`` set (e.g. ``sha256``), every part is
+        sent with its checksum for S3 to verify.
+        Every file is attempted, then an exception is raised if any of them
+        failed.
+
+        Returns:
+            dict: Counts of files and bytes sent and skipped, plus the per-file
+            ``results``, see ``s3_transfer.summarize_uploads``.
+        """
+        if sync is None:
+            sync = os.environ.get("SBIO_SYNC_UPLOADS", "").lower() in ("true", "1", "yes")
+        if compress is None:
+            compress = os.environ.get("SBIO_COMPRESS_RESULTS") or None
+        context = cls.get_job_context(job_id)
+        s3_client, bucket_name = context.s3_client, context.bucket
+        uploads = [(src_file, context.key(src_file)) for src_file in dict.fromkeys(src_files)]
+        if sync:
+            results = sync_upload_files(s3_client, bucket_name, uploads, max_workers=max_workers, compress=compress)
+        else:
+            results = upload_files(s3_client, bucket_name, uploads, max_workers=max_workers, compress=compress)
+        summary = summarize_uploads(results)
+        for result in results:
+            if result['skipped']:
+                logging.info(f"Skipped unchanged file {result['key']}")
+            elif result['ok']:
+                logging.info(f"Uploaded a file {result['key']}")
+        logging.info(
+            f"Result upload: {summary['files_sent']} files ({summary['bytes_sent']} bytes) sent, "
+            f"{summary['files_skipped']} files ({summary['bytes_skipped']} bytes) skipped")
+        failed = [r for r in results if not r['ok']]
+        if failed:
+            details = '; '.join(f"{r['file']}: {r['error']}" for r in failed)
+            raise RuntimeError(f"Failed to upload {len(failed)} of {len(results)} result files: {details}")
+        return summary
 
     @classmethod
     def upload_file(cls, job_id: str, src_file: str):
-        dest = cls.get_job_folder(job_id)
-        external_bucket = None
+        context = cls.get_job_context(job_id)
+        cls._upload(context.s3_client, context.bucket, src_file, context.folder)
+
+    @classmethod
+    def get_job_context(cls, job_id: str, refresh: bool = False):
+        """Return the ``JobContext`` (result folder, S3 client and bucket) of ``job_id``.
+
+        The folder is looked up with ``get_job_folder`` once per job and
+        output bucket, then shared by every upload of the job.
+        ``refresh`` looks it up again.
+        """
+        external_bucket = cls._get_output_external_bucket()
+        key = (job_id, external_bucket)
+        with cls._job_context_lock:
+            context = cls._job_contexts.get(key)
+            if context is None or refresh:
+                s3_client, bucket_name = cls.get_s3_client(external_bucket)
+                context = JobContext(job_id, cls.get_job_folder(job_id), s3_client, bucket_name)
+                cls._job_contexts[key] = context
+            return context
+
+    @classmethod
+    def _get_output_external_bucket(cls):
         if "EXTERNAL_BUCKET" in os.environ and os.environ.get("SAVE_RESULTS_TO_USER_DATA", "").lower() in ("true", "1", "yes"):
-            external_bucket = os.environ.get("EXTERNAL_BUCKET")
-        s3_client, bucket_name = cls.get_s3_client(external_bucket)
-        cls._upload(s3_client, bucket_name, src_file, dest)
+            return os.environ.get("EXTERNAL_BUCKET")
+        return None
 
     @classmethod
     def _upload(cls, s3_client, bucket_name: str, src: str, dest_folder: str):
@@ -137,27 +307,120 @@ class AppRunnerUtils:
         logging.info(f'Uploaded a file {dest_file}')
 
     @classmethod
-    def download_file(cls, source_file_path: str, dest_file_path: str):
-        config_v2 = cls.get_job_config_v2(os.environ.get("JOB_ID"))
-        external_bucket = None
-        if "EXTERNAL_BUCKET" in os.environ and cls.get_file_is_remote(source_file_path, config_v2):
-            external_bucket = os.environ.get("EXTERNAL_BUCKET")
+    def _get_input_external_bucket(cls, source_file_path: str):
+        if "EXTERNAL_BUCKET" not in os.environ:
+            return None
+        config_v2 = cls.get_job_config_object(os.environ.get("JOB_ID"))
+        if cls.get_file_is_remote(source_file_path, config_v2):
+            return os.environ.get("EXTERNAL_BUCKET")
+        return None
+
+    @classmethod
+    def get_input_s3_client(cls, source_file_path: str):
+        """Return the S3 client and bucket name an input file of the current job is read from."""
+        return cls.get_s3_client(cls._get_input_external_bucket(source_file_path))
+
+    @classmethod
+    def prefetch_inputs(cls, input_files, max_workers: int = DEFAULT_PREFETCH_WORKERS, enabled: bool = None):
+        """Start downloading every file in a job config's ``input_files`` in the background.
 
-        s3_client, bucket_name = cls.get_s3_client(external_bucket)
-        multipart_download(s3_client, bucket_name, source_file_path, dest_file_path)
+        Prefetching is opt-in: ``enabled`` defaults to the
+        ``SBIO_PREFETCH_INPUTS`` environment variable, and nothing is
+        downloaded without it.
+
+        Files go into the input cache (``SBIO_INPUT_CACHE_DIR``); without one,
+        a cache private to this job is created with ``tempfile.mkdtemp`` under
+        ``SBIO_PREFETCH_DIR`` (default: the system temp dir), limited to
+        ``SBIO_PREFETCH_MAX_GB`` (default 20), and exported through the
+        environment so that ``download_file`` calls in stage subprocesses pick
+        the prefetched files up, blocking only until the file they need is
+        complete.  Files are moved out of that cache as they are used, and
+        ``shutdown()`` deletes it.
+
+        Returns:
+            InputPrefetcher: Call ``shutdown()`` on it when the job ends, or
+            None when prefetching is disabled.
+        """
+        if enabled is None:
+            enabled = os.environ.get("SBIO_PREFETCH_INPUTS", "").lower() in ("true", "1", "yes")
+        if not enabled:
+            return None
+        if os.environ.get("SBIO_INPUT_CACHE_DIR"):
+            prefetcher = InputPrefetcher(InputCache.from_env(), cls.get_input_s3_client, max_workers)
+        else:
+            max_gb = float(os.environ.get("SBIO_PREFETCH_MAX_GB") or DEFAULT_PREFETCH_MAX_GB)
+            root = tempfile.mkdtemp(prefix="sbio_prefetch_", dir=os.environ.get("SBIO_PREFETCH_DIR") or None)
+            os.environ["SBIO_INPUT_CACHE_DIR"] = root
+            os.environ["SBIO_INPUT_CACHE_MAX_GB"] = str(max_gb)
+            os.environ["SBIO_INPUT_CACHE_CONSUME"] = "true"
+            prefetcher = InputPrefetcher(InputCache.from_env(), cls.get_input_s3_client, max_workers, temporary=True)
+        return prefetcher.start(input_file_paths(input_files))
+
+    @classmethod
+    def download_file(cls, source_file_path: str, dest_file_path: str, resume: bool = None):
+        """Download an input file of the current job to ``dest_file_path``.
+
+        With ``resume`` (default: the ``SBIO_RESUME_DOWNLOADS`` environment
+        variable) an interrupted download, e.g. on a preempted spot instance,
+        continues from the byte ranges already on disk.
+
+        If ``SBIO_INPUT_CACHE_DIR`` is set, files are served from a host-wide
+        cache keyed by bucket, key and ETag, see ``InputCache``.
+        If ``SBIO_TRANSFER_CHECKSUM`` is set, the bytes are checked against
+        the object's checksum as they arrive, see ``multipart_download``.
+        """
+        if resume is None:
+            resume = os.environ.get("SBIO_RESUME_DOWNLOADS", "").lower() in ("true", "1", "yes")
+        s3_client, bucket_name = cls.get_input_s3_client(source_file_path)
+        cache = InputCache.from_env()
+        if cache:
+            cache.fetch(s3_client, bucket_name, source_file_path, dest_file_path, resume=resume)
+        else:
+            multipart_download(s3_client, bucket_name, source_file_path, dest_file_path, resume=resume)
+
+    @classmethod
+    def download_and_extract(cls, source_file_path: str, dest_dir: str):
+        """Download a compressed input (tar, tar.gz, gz or zip) and extract it into ``dest_dir``.
+
+        tar and gz inputs are extracted while they download, without writing
+        the compressed copy to disk, see ``s3_transfer.download_and_extract``.
+        """
+        s3_client, bucket_name = cls.get_input_s3_client(source_file_path)
+        download_and_extract(s3_client, bucket_name, source_file_path, dest_dir)
 
     @classmethod
     def load_file(cls, source_file_path: str):
-        config_v2 = cls.get_job_config_v2(os.environ.get("JOB_ID"))
-        external_bucket = None
-        if "EXTERNAL_BUCKET" in os.environ and cls.get_file_is_remote(source_file_path, config_v2):
-            external_bucket = os.environ.get("EXTERNAL_BUCKET")
-
-        bucket = cls.get_s3_bucket(external_bucket)
-        obj = bucket.Object(source_file_path)
-        body = obj.get()['Body'].read()
+        s3_client, bucket_name = cls.get_input_s3_client(source_file_path)
+        body = s3_client.get_object(Bucket=bucket_name, Key=source_file_path)['Body'].read()
         return body
 
+    @classmethod
+    def open_file(cls, source_file_path: str, block_size: int = DEFAULT_BLOCK_SIZE,
+                  cache_blocks: int = DEFAULT_CACHE_BLOCKS):
+        """Open an input file as a seekable, read-only file object without downloading it.
+
+        Reads are served by ranged GETs through a bounded block cache, so
+        h5py, pandas and the like only fetch the bytes they touch, and memory
+        stays at ``block_size * cache_blocks`` regardless of the file size.
+        Prefer this over ``load_file`` for large files.
+
+        Returns:
+            S3RangeReader: A file-like object; close it when done.
+        """
+        s3_client, bucket_name = cls.get_input_s3_client(source_file_path)
+        return S3RangeReader(s3_client, bucket_name, source_file_path,
+                             block_size=block_size, cache_blocks=cache_blocks)
+
+    @classmethod
+    def export_transfer_metrics(cls, job_id: str, path: str = 'transfer_metrics.json'):
+        """Write a JSON summary of every S3 transfer made by this process to ``path``.
+
+        The summary holds per-transfer bytes, timings, part and retry counts
+        and throughput percentiles, plus per-direction totals, see
+        ``TransferMonitor.summary``.
+        """
+        return get_monitor().export_json(path, job_id=job_id)
+
     @classmethod
     def set_logging(cls, log_file: str):
         handler = WatchedFileHandler(log_file)
@@ -170,20 +433,71 @@ class AppRunnerUtils:
         root.addHandler(handler)
 
     @classmethod
-    def get_api_token(cls):
+    def ship_logs(cls, job_id: str, log_file: str):
+        """Start uploading ``log_file`` in gzip segments while the job runs.
+
+        Segments go to ``<job folder><log_file>.segments/`` every
+        ``SBIO_LOG_SHIP_INTERVAL`` seconds (default 300, 0 disables) or
+        once ``SBIO_LOG_SHIP_BYTES`` are pending, see
+        ``log_shipper.LogShipper``.  Call ``close`` on the returned shipper
+        at the end of the job, before uploading the complete log.
+
+        Returns:
+            LogShipper: The started shipper, or None when disabled.
+        """
+        def destination():
+            context = cls.get_job_context(job_id)
+            return context.s3_client, context.bucket, context.key(f'{log_file}{SEGMENTS_SUFFIX}')
+
+        shipper = LogShipper.from_env(log_file, destination)
+        return shipper.start() if shipper else None
+
+    @classmethod
+    def get_api_token(cls, refresh: bool = False):
+        """Return an access token for the SBIO API.
+
+        The token is cached per API URL and user and reused until shortly
+        before it expires (see ``api_token.TokenCache``), so the calls of
+        a job share a single login.  ``refresh`` forces a new login.
+        """
         user = os.environ.get("APP_USER")
-        password = os.environ.get("APP_USER_PASSWORD")
         api_url = os.environ.get("SBIO_API_URL")
-        payload = {"email": user, "password": password}
-        r = requests.post(f'{api_url}/login', json=payload)
-        return r.json()['access_token']
+        return get_token_cache().get((api_url, user), lambda: cls._login(api_url, user), refresh=refresh)
 
     @classmethod
-    def get_job_folder(cls, job_id: str):
-        token = cls.get_api_token()
+    def _login(cls, api_url: str, user: str):
+        payload = {"email": user, "password": os.environ.get("APP_USER_PASSWORD")}
+        r = get_api_session().post(f'{api_url}/login', json=payload, timeout=api_timeout())
+        if not r.ok:
+            logging.error("login failed: %s %s", r.status_code, r.text)
+            r.raise_for_status()
+        return r.json()
+
+    @classmethod
+    def _api_request(cls, method: str, path: str, **kwargs):
+        """Make an authenticated SBIO API call and return the response.
+
+        Calls share one pooled keep-alive session that retries connection
+        errors, and 429/5xx responses of idempotent methods, with backoff
+        (see ``api_session``).  A 401 renews the token and repeats the
+        call once.
+        """
         api_url = os.environ.get("SBIO_API_URL")
-        headers = {'Authorization': f'Bearer {token}'}
-        response = requests.get(f'{api_url}/api/jobs/{job_id}/folder', headers=headers)
+        session = get_api_session()
+        kwargs.setdefault('timeout', api_timeout())
+        token = cls.get_api_token()
+        response = session.request(method, f'{api_url}{path}', headers={'Authorization': f'Bearer {token}'},
+                                   **kwargs)
+        if response.status_code == 401:
+            logging.warning("%s %s: token rejected, logging in again", method, path)
+            token = cls.get_api_token(refresh=True)
+            response = session.request(method, f'{api_url}{path}', headers={'Authorization': f'Bearer {token}'},
+                                       **kwargs)
+        return response
+
+    @classmethod
+    def get_job_folder(cls, job_id: str):
+        response = cls._api_request('GET', f'/api/jobs/{job_id}/folder')
         if response.status_code == 200:
             return response.json()['folder']
         else:
@@ -193,12 +507,9 @@ class AppRunnerUtils:
     @classmethod
     def get_job_config(cls, job_id: str):
         if "JOB_CONFIG" in os.environ:
-            return eval(os.environ.get("JOB_CONFIG", "{}"))
+            return JobConfig.from_string(os.environ.get("JOB_CONFIG") or "{}").to_dict()
         else:
-            token = cls.get_api_token()
-            api_url = os.environ.get("SBIO_API_URL")
-            headers = {'Authorization': f'Bearer {token}'}
-            response = requests.get(f'{api_url}/api/jobs/{job_id}/config', headers=headers)
+            response = cls._api_request('GET', f'/api/jobs/{job_id}/config')
             if response.status_code == 200:
                 return response.json()['config']
             else:
@@ -207,75 +518,120 @@ class AppRunnerUtils:
 
     @classmethod
     def get_file_is_remote(cls, file_path: str, config):
-        for key, items in config['input_files'].items():
+        if isinstance(config, JobConfig):
+            item = config.input_file(file_path)
+        else:
+            item = cls._get_input_file_index(config).get(file_path)
+        if item is not None:
+            return item["additional_info"].get('user_data', False)
+
+    @classmethod
+    def _get_input_file_index(cls, config):
+        """Return ``{path: item}`` over ``config['input_files']``, built once per config object."""
+        cached = cls._input_file_index
+        if cached and cached[0] is config:
+            return cached[1]
+        index = {}
+        for items in config['input_files'].values():
             for item in items:
-                if item["path"] == file_path:
-                    return item["additional_info"].get('user_data', False)
+                index.setdefault(item["path"], item)
+        cls._input_file_index = (config, index)
+        return index
 
     @classmethod
     def get_job_run_by_admin(cls):
         if "RUN_BY_ADMIN" in os.environ:
-            return eval(os.environ.get("RUN_BY_ADMIN", "False"))
+            return bool(decode_config(os.environ.get("RUN_BY_ADMIN") or "False"))
         else:
             return False
 
     @classmethod
-    def get_job_config_v2(cls, job_id: str):
+    def get_job_config_v2(cls, job_id: str, refresh: bool = False):
+        """Return the v2 config of ``job_id`` as a dict.
+
+        The config is fetched once per job, see ``get_job_config_object``,
+        and thawed into a dict once per fetch: every call returns the same
+        dict until ``refresh``, so callers must copy it before modifying it.
+        """
+        config = cls.get_job_config_object(job_id, refresh)
+        key = (job_id, os.environ.get("JOB_CONFIG"))
+        with cls._job_config_lock:
+            cached = cls._job_config_dicts.get(key)
+            if refresh or cached is None or cached[0] is not config:
+                cached = cls._job_config_dicts[key] = (config, config.to_dict())
+            return cached[1]
+
+    @classmethod
+    def get_job_config_object(cls, job_id: str, refresh: bool = False):
+        """Return the v2 config of ``job_id``, fetched (or decoded from ``JOB_CONFIG``) once per job.
+
+        The returned ``JobConfig`` is read-only and shared between callers,
+        use ``to_dict`` for a mutable copy.  ``refresh`` fetches it again.
+        """
+        key = (job_id, os.environ.get("JOB_CONFIG"))
+        with cls._job_config_lock:
+            if refresh or key not in cls._job_configs:
+                cls._job_configs[key] = cls._fetch_job_config_v2(job_id)
+            return cls._job_configs[key]
+
+    @classmethod
+    def _fetch_job_config_v2(cls, job_id: str):
         if "JOB_CONFIG" in os.environ:
-            return eval(os.environ.get("JOB_CONFIG", "{}"))
+            return JobConfig.from_string(os.environ.get("JOB_CONFIG") or "{}")
         else:
-            token = cls.get_api_token()
-            api_url = os.environ.get("SBIO_API_URL")
-            headers = {'Authorization': f'Bearer {token}'}
-            response = requests.get(f'{api_url}/api/jobs/{job_id}/config?version=v2', headers=headers)
+            response = cls._api_request('GET', f'/api/jobs/{job_id}/config?version=v2')
             if response.status_code == 200:
-                return response.json()['config']
+                return JobConfig(response.json()['config'])
             else:
                 logging.error("get_job_config_v2 failed: %s %s", response.status_code, response.text)
                 response.raise_for_status()
 
     @classmethod
     def set_job_running(cls, job_id: str):
-        token = cls.get_api_token()
-        api_url = os.environ.get("SBIO_API_URL")
-        headers = {'Authorization': f'Bearer {token}'}
-        response = requests.put(f'{api_url}/api/jobs/{job_id}/running', headers=headers)
+        response = cls._api_request('PUT', f'/api/jobs/{job_id}/running')
         if response.status_code != 200:
             logging.error("set_job_running failed: %s %s", response.status_code, response.text)
         response.raise_for_status()
 
     @classmethod
     def set_job_completed(cls, job_id: str, result_files: dict, credit=0):
-        token = cls.get_api_token()
-        api_url = os.environ.get("SBIO_API_URL")
-        headers = {'Authorization': f'Bearer {token}'}
         payload = {'result_files': {'files': result_files}}
         if credit > 0:
             payload['credits'] = credit
-        response = requests.put(f'{api_url}/api/jobs/{job_id}/completed', headers=headers, json=payload)
+        response = cls._api_request('PUT', f'/api/jobs/{job_id}/completed', json=payload)
         if response.status_code != 200:
             logging.error("set_job_completed failed: %s %s", response.status_code, response.text)
         response.raise_for_status()
 
     @classmethod
     def set_job_failed(cls, job_id: str, err_msg: str, credit=0):
-        token = cls.get_api_token()
-        api_url = os.environ.get("SBIO_API_URL")
-        headers = {'Authorization': f'Bearer {token}'}
         payload = {'error_message': err_msg}
         if credit > 0:
             payload['credits'] = credit
-        response = requests.put(f'{api_url}/api/jobs/{job_id}/failed', headers=headers, json=payload)
+        response = cls._api_request('PUT', f'/api/jobs/{job_id}/failed', json=payload)
         if response.status_code != 200:
             logging.error("set_job_failed failed: %s %s", response.status_code, response.text)
 
+    @classmethod
+    def send_heartbeat(cls, job_id: str, payload: dict):
+        """Tell the platform the job is alive, with its current stage in ``payload``.
+
+        The endpoint is ``SBIO_HEARTBEAT_PATH`` (default
+        ``/api/jobs/{job_id}/heartbeat``, ``{job_id}`` is filled in).  A
+        platform without the endpoint (404 or 405) is only logged at debug.
+        """
+        path = os.environ.get("SBIO_HEARTBEAT_PATH") or '/api/jobs/{job_id}/heartbeat'
+        response = cls._api_request('PUT', path.format(job_id=job_id), json=payload)
+        if response.status_code in (404, 405):
+            logging.debug("send_heartbeat: no heartbeat endpoint: %s", response.status_code)
+        elif response.status_code != 200:
+            logging.error("send_heartbeat failed: %s %s", response.status_code, response.text)
+        response.raise_for_status()
+
     @classmethod
     def verify_user_has_enough_credits(cls, job_id: str, expected_credit_usage: int):
-        token = cls.get_api_token()
-        api_url = os.environ.get("SBIO_API_URL")
-        headers = {'Authorization': f'Bearer {token}'}
         payload = {'job_id': job_id, 'expected_credit_usage': expected_credit_usage}
-        response = requests.get(f'{api_url}/api/verify_enough_credits', headers=headers, params=payload)
+        response = cls._api_request('GET', '/api/verify_enough_credits', params=payload)
         if response.status_code == 200:
             return response.json()['has_enough_credits']
         else:
@@ -0,0 +1,132 @@
+import base64
+import hashlib
+import zlib
+from functools import lru_cache
+
+try:
+    import crc32c as _crc32c
+except ImportError:
+    _crc32c = None
+
+# Checksum algorithms S3 can store, by the suffix of their response field
+# (``ChecksumCRC32`` ...).  crc32c needs the optional ``crc32c`` package.
+S3_ALGORITHMS = ("crc32", "crc32c", "sha1", "sha256")
+# The ETag of an unencrypted or SSE-S3 object is the MD5 of its bytes, or
+# of its part MD5s for multipart uploads, so it doubles as a checksum.
+ETAG = "md5"
+
+_CRC_POLYNOMIALS = {"crc32": 0xEDB88320, "crc32c": 0x82F63B78}
+
+
+def s3_field(algorithm):
+    return "Checksum" + algorithm.upper()
+
+
+def is_available(algorithm):
+    return algorithm in ("crc32", "sha1", "sha256", ETAG) or (algorithm == "crc32c" and _crc32c is not None)
+
+
+class _Crc:
+    def __init__(self, algorithm):
+        self._update = zlib.crc32 if algorithm == "crc32" else _crc32c.crc32c
+        self.value = 0
+
+    def update(self, data):
+        self.value = self._update(data, self.value)
+
+    def digest(self):
+        return self.value.to_bytes(4, "big")
+
+
+def new(algorithm):
+    """Return an incremental hasher (``update``/``digest``) for ``algorithm``."""
+    if not is_available(algorithm):
+        raise ValueError(f"Checksum algorithm {algorithm!r} is not available")
+    if algorithm in _CRC_POLYNOMIALS:
+        return _Crc(algorithm)
+    return hashlib.new(algorithm)
+
+
+def encode(algorithm, digest):
+    """Encode a digest the way S3 reports it: hex for ETags, base64 otherwise."""
+    return digest.hex() if algorithm == ETAG else base64.b64encode(digest).decode()
+
+
+def normalize(value):
+    """Strip the quotes and ``-<parts>`` suffix S3 puts around checksums and ETags."""
+    return value.strip('"').split("-", 1)[0] if value else value
+
+
+def composite(algorithm, digests):
+    """Checksum of a multipart object: the hash of its concatenated part digests, with the part count."""
+    hasher = new(algorithm)
+    hasher.update(b"".join(digests))
+    return f"{encode(algorithm, hasher.digest())}-{len(digests)}"
+
+
+def _gf2_times(matrix, vector):
+    total = 0
+    for row in matrix:
+        if not vector:
+            break
+        if vector & 1:
+            total ^= row
+        vector >>= 1
+    return total
+
+
+@lru_cache(maxsize=64)
+def _crc_shift(algorithm, length):
+    """Matrix that advances a CRC over ``length`` zero bytes (as in zlib's crc32_combine)."""
+    operator = [_CRC_POLYNOMIALS[algorithm]] + [1 << n for n in range(31)]
+    result = [1 << n for n in range(32)]
+    bits = length * 8
+    while bits:
+        if bits & 1:
+            result = [_gf2_times(operator, row) for row in result]
+        operator = [_gf2_times(operator, row) for row in operator]
+        bits >>= 1
+    return result
+
+
+def full_object(algorithm, digests, sizes):
+    """Checksum of a whole object from the digests and sizes of its consecutive parts.
+
+    CRCs of parts combine into the CRC of the whole; hashes only can for a
+    single part, so None is returned for several parts of a hash.
+    """
+    if len(digests) == 1:
+        return encode(algorithm, digests[0])
+    if algorithm not in _CRC_POLYNOMIALS:
+        return None
+    crc = 0
+    for digest, size in zip(digests, sizes):
+        crc = _gf2_times(_crc_shift(algorithm, size), crc) ^ int.from_bytes(digest, "big")
+    return encode(algorithm, crc.to_bytes(4, "big"))
+
+
+def expected_checksum(head):
+    """Return the checksum to verify a download against, from a ``head_object`` response.
+
+    Uses the first S3 checksum field whose algorithm is available locally,
+    else the ETag when it is an MD5 (not SSE-KMS or SSE-C).  The
+    returned dict has the ``algorithm``, the ``value`` and whether it is
+    ``composite``, i.e. computed from part digests, which needs the
+    download parts to match the upload parts.  None if nothing usable.
+    """
+    multipart = "-" in head.get("ETag", "")
+    for algorithm in S3_ALGORITHMS:
+        value = head.get(s3_field(algorithm))
+        if value and is_available(algorithm):
+            checksum_type = head.get("ChecksumType")
+            is_composite = checksum_type == "COMPOSITE" if checksum_type else ("-" in value or multipart)
+            return {"algorithm": algorithm, "value": value, "composite": is_composite}
+    etag = head.get("ETag", "").strip('"')
+    if len(normalize(etag)) == 32 and not head.get("SSEKMSKeyId") and not head.get("SSECustomerAlgorithm") \
+            and head.get("ServerSideEncryption") != "aws:kms":
+        return {"algorithm": ETAG, "value": etag, "composite": multipart}
+    return None
+
+
+class ChecksumMismatchError(IOError):
+    """Raised when transferred bytes don't match the checksum S3 holds for them."""
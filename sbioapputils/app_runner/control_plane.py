@@ -0,0 +1,167 @@
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from sbioapputils.app_runner.app_runner_utils import AppRunnerUtils
+
+logger = logging.getLogger(__name__)
+
+# Seconds between heartbeats, overridden by ``SBIO_HEARTBEAT_INTERVAL``
+# (0 disables them).  Heartbeats are only sent by default where the
+# platform has an endpoint for them, configured by ``SBIO_HEARTBEAT_PATH``.
+DEFAULT_HEARTBEAT_INTERVAL = 60
+# Seconds ``close`` waits for pending calls.
+DEFAULT_FLUSH_TIMEOUT = 120
+
+
+class ControlPlaneClient:
+    """Makes a job's SBIO API calls on a background asyncio loop.
+
+    Status updates return a ``concurrent.futures.Future`` right away, so
+    the job does not wait on the control plane unless it asks for the
+    result.  Ordered calls (the job status updates) run one at a time in
+    submission order, so ``running`` always reaches the API before
+    ``completed`` or ``failed``; other calls run concurrently.  While the
+    job runs, heartbeats with the current stage are sent every
+    ``heartbeat_interval`` seconds.  A failed heartbeat is only logged,
+    not counted in ``failures``, and heartbeats stop if the endpoint
+    answers 404 or 405.  ``close`` flushes pending calls.
+
+    Calls go through ``AppRunnerUtils`` on a small thread pool, and so
+    share its pooled session, retries and token cache.
+
+    Args:
+        job_id: The job whose status is reported.
+        heartbeat_interval: Seconds between heartbeats, 0 for none
+            (default: ``SBIO_HEARTBEAT_INTERVAL`` or 60 if
+            ``SBIO_HEARTBEAT_PATH`` is set, else none).
+        max_workers: Threads making the HTTP calls.
+    """
+
+    def __init__(self, job_id: str, heartbeat_interval: float = None, max_workers: int = 4):
+        if heartbeat_interval is None and not os.environ.get("SBIO_HEARTBEAT_PATH"):
+            heartbeat_interval = 0
+        elif heartbeat_interval is None:
+            heartbeat_interval = float(os.environ.get("SBIO_HEARTBEAT_INTERVAL") or DEFAULT_HEARTBEAT_INTERVAL)
+        self.job_id = job_id
+        self.heartbeat_interval = heartbeat_interval
+        self.stage = None
+        self.progress = None
+        self.heartbeats = 0
+        self.failures = []
+        self._pending = set()
+        self._started = time.time()
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sbio-api")
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="sbio-control-plane", daemon=True)
+        self._thread.start()
+        self._queue = self._run(self._new_queue()).result()
+        self._worker = self._run(self._process_ordered())
+        self._heartbeat = self._run(self._send_heartbeats()) if heartbeat_interval > 0 else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def _new_queue(self):
+        return asyncio.Queue()
+
+    async def _call(self, func, *args, **kwargs):
+        try:
+            return await self._loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        except Exception as e:
+            self.failures.append((func.__name__, e))
+            logger.error("Control plane call %s failed: %s", func.__name__, e)
+            raise
+
+    async def _process_ordered(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            func, args, kwargs, future = item
+            try:
+                future.set_result(await self._call(func, *args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+
+    async def _send_heartbeats(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            payload = {"stage": self.stage, "progress": self.progress,
+                       "elapsed": round(time.time() - self._started, 1)}
+            try:
+                await self._loop.run_in_executor(
+                    self._executor, functools.partial(AppRunnerUtils.send_heartbeat, self.job_id, payload))
+                self.heartbeats += 1
+            except requests.HTTPError as e:
+                if e.response is not None and e.response.status_code in (404, 405):
+                    logger.debug("Heartbeat endpoint not available, heartbeats stopped")
+                    return
+                logger.warning("Heartbeat failed: %s", e)
+            except Exception as e:
+                logger.warning("Heartbeat failed: %s", e)
+
+    def submit(self, func, *args, ordered: bool = True, **kwargs):
+        """Call ``func(*args, **kwargs)`` in the background and return its future.
+
+        Ordered calls run one after the other in the order they were
+        submitted, unordered ones right away.
+        """
+        if self._closed:
+            raise RuntimeError("ControlPlaneClient is closed")
+        if not ordered:
+            future = self._run(self._call(func, *args, **kwargs))
+            self._pending.add(future)
+            future.add_done_callback(self._pending.discard)
+            return future
+        future = concurrent.futures.Future()
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (func, args, kwargs, future))
+        return future
+
+    def set_stage(self, stage: str, progress=None):
+        """Report ``stage`` (and optionally its ``progress``) in the next heartbeats."""
+        self.stage = stage
+        self.progress = progress
+
+    def set_job_running(self):
+        return self.submit(AppRunnerUtils.set_job_running, self.job_id)
+
+    def set_job_completed(self, result_files: dict, credit=0):
+        return self.submit(AppRunnerUtils.set_job_completed, self.job_id, result_files, credit)
+
+    def set_job_failed(self, err_msg: str, credit=0):
+        return self.submit(AppRunnerUtils.set_job_failed, self.job_id, err_msg, credit)
+
+    def close(self, timeout: float = DEFAULT_FLUSH_TIMEOUT):
+        """Stop heartbeats, wait up to ``timeout`` seconds for pending calls and stop the loop."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._heartbeat:
+            self._heartbeat.cancel()
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, None)
+        _, pending = concurrent.futures.wait(list(self._pending) + [self._worker], timeout)
+        if pending:
+            logger.error("Control plane calls still pending after %ss, giving up", timeout)
+            for future in pending:
+                future.cancel()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._executor.shutdown(wait=False)
+        if self.failures:
+            logger.warning("%d control plane call(s) failed", len(self.failures))
@@ -5,6 +5,7 @@ from pyflakes.reporter import _makeDefaultReporter
 import pycodestyle
 import sys
 from .yaml_utils import payload_from_yaml, get_yaml
+from .job_config import decode_config
 import json
 
 
@@ -127,7 +128,7 @@ def run_pre_demo_steps(workflow_filename: str):
     
     if "JOB_CONFIG" in os.environ:
         print("Generating configuration dictionary from JOB_CONFIG")
-        request =  eval(os.environ.get("JOB_CONFIG"))
+        request = decode_config(os.environ.get("JOB_CONFIG"))
         request['job_id'] = os.environ.get("JOB_ID")
     else:
         print("Generating configuration dictionary from defaults specified in yaml")
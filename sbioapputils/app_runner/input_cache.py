@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import os
+import stat
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; locking becomes a no-op
+    fcntl = None
+
+from sbioapputils.app_runner.s3_transfer import GB, multipart_download
+from sbioapputils.app_runner.storage import clone_file
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_MAX_GB = 50
+
+
+class InputCache:
+    """On-disk, content-addressed cache of S3 input files shared by jobs on a host.
+
+    Entries are keyed by bucket, key and ETag, so a changed object is never
+    served stale.  Hits are materialised at the destination as a private,
+    writable copy: a reflink where the filesystem supports it, else a
+    kernel copy.  With ``hardlink`` set they are hard links instead, which
+    costs nothing but shares the entry's inode; entries are read-only to
+    guard against that, but root can still write to them, so the size of
+    an entry is checked against the object on every hit and a damaged
+    entry is downloaded again.  With ``consume`` set, as for a job's own
+    prefetch cache, a hit is moved to the destination instead and leaves
+    the cache, so an input never takes up disk space twice.
+
+    The total size is kept under ``max_bytes`` (None for no limit) by
+    evicting the least recently used entries.  ``flock`` locks make the
+    cache safe to share between concurrent jobs: one lock per entry
+    serialises its download, and a cache-wide lock serialises eviction.
+    """
+
+    def __init__(self, root: str, max_bytes: int = DEFAULT_CACHE_MAX_GB * GB, hardlink: bool = False,
+                 consume: bool = False):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hardlink = hardlink
+        self.consume = consume
+        self.objects_dir = os.path.join(root, "objects")
+        self.locks_dir = os.path.join(root, "locks")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.locks_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """Return the cache configured by ``SBIO_INPUT_CACHE_DIR``, or None.
+
+        ``SBIO_INPUT_CACHE_MAX_GB`` sets the size budget, 0 meaning unlimited,
+        ``SBIO_INPUT_CACHE_HARDLINK`` turns on hardlinked hits and
+        ``SBIO_INPUT_CACHE_CONSUME`` moves hits out of the cache.
+        """
+        root = os.environ.get("SBIO_INPUT_CACHE_DIR")
+        if not root:
+            return None
+        max_gb = float(os.environ.get("SBIO_INPUT_CACHE_MAX_GB", DEFAULT_CACHE_MAX_GB))
+        hardlink = os.environ.get("SBIO_INPUT_CACHE_HARDLINK", "").lower() in ("true", "1", "yes")
+        consume = os.environ.get("SBIO_INPUT_CACHE_CONSUME", "").lower() in ("true", "1", "yes")
+        return cls(root, int(max_gb * GB) if max_gb > 0 else None, hardlink=hardlink, consume=consume)
+
+    @staticmethod
+    def entry_name(bucket: str, key: str, etag: str):
+        return hashlib.sha256(f"{bucket}\0{key}\0{etag}".encode()).hexdigest()
+
+    def fetch(self, s3_client, bucket: str, key: str, dest_path: str = None, **download_kwargs):
+        """Materialise ``s3://bucket/key`` at ``dest_path``, downloading only on a miss.
+
+        Without ``dest_path`` the object is only brought into the cache.
+        A caller that finds another job or thread downloading the same
+        object waits for it and then gets a hit.
+        Extra keyword arguments are passed to ``multipart_download``.
+
+        Returns:
+            bool: True on a cache hit.
+        """
+        head = s3_client.head_object(Bucket=bucket, Key=key)
+        name = self.entry_name(bucket, key, head["ETag"])
+        entry = os.path.join(self.objects_dir, name)
+
+        with self._lock(os.path.join(self.locks_dir, name)):
+            hit = self._intact(entry, head["ContentLength"])
+            if hit:
+                os.utime(entry)
+                logger.info("Input cache hit for %s", key)
+            else:
+                partial = entry + ".partial"
+                multipart_download(s3_client, bucket, key, partial, **download_kwargs)
+                os.chmod(partial, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                os.replace(partial, entry)
+            if dest_path:
+                self._materialise(entry, dest_path)
+
+        if not hit:
+            self.evict(keep=name)
+        return hit
+
+    def evict(self, keep: str = None):
+        """Delete least recently used entries until the cache fits its budget.
+
+        Entries that are currently locked by another job are skipped.
+        """
+        if self.max_bytes is None:
+            return
+        with self._lock(os.path.join(self.root, ".evict.lock")):
+            entries = []
+            for name in os.listdir(self.objects_dir):
+                if "." in name:
+                    continue
+                try:
+                    st = os.stat(os.path.join(self.objects_dir, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if name == keep:
+                    continue
+                with self._lock(os.path.join(self.locks_dir, name), blocking=False) as locked:
+                    if not locked:
+                        continue
+                    os.remove(os.path.join(self.objects_dir, name))
+                total -= size
+                logger.info("Evicted %s (%.2f GB) from input cache", name, size / GB)
+
+    @staticmethod
+    def _intact(entry: str, size: int):
+        try:
+            actual = os.path.getsize(entry)
+        except FileNotFoundError:
+            return False
+        if actual != size:
+            logger.warning("Input cache entry %s has %d bytes, expected %d, downloading it again", entry, actual, size)
+            return False
+        return True
+
+    def _materialise(self, entry: str, dest_path: str):
+        os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+        if os.path.lexists(dest_path):
+            os.remove(dest_path)
+        if self.consume:
+            try:
+                os.replace(entry, dest_path)
+            except OSError:
+                clone_file(entry, dest_path)
+                os.remove(entry)
+            os.chmod(dest_path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
+            return
+        clone_file(entry, dest_path, hardlink=self.hardlink)
+
+    @staticmethod
+    @contextmanager
+    def _lock(path: str, blocking: bool = True):
+        if fcntl is None:
+            yield True
+            return
+        with open(path, "a") as f:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(f, flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
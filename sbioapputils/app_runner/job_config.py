@@ -0,0 +1,121 @@
+import ast
+import json
+import logging
+import os
+from collections.abc import Mapping
+from functools import lru_cache
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+# Environment variable pointing stage subprocesses at the job config file
+# written by the runner, see ``JobConfig.dump``.
+CONFIG_FILE_ENV = "SBIO_JOB_CONFIG_FILE"
+
+
+def decode_config(text):
+    """Decode a config passed as a string: JSON, or a Python literal (``repr`` of a dict).
+
+    Unlike ``eval`` this never runs code, and JSON, the common case, is
+    parsed by the C decoder.
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        return ast.literal_eval(text)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, Mapping):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+class JobConfig(Mapping):
+    """Read-only job config, decoded once and shared by the runner.
+
+    Behaves like the config dict, except that nested dicts are read-only
+    mappings and lists are tuples; ``to_dict`` returns a mutable copy.
+    Input files can be looked up by path in constant time with
+    ``input_file``.
+    """
+
+    __slots__ = ("_data", "_input_index")
+
+    def __init__(self, data):
+        object.__setattr__(self, "_data", _freeze(dict(data)))
+        object.__setattr__(self, "_input_index", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("JobConfig is read-only")
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return f"JobConfig({len(self._data)} keys)"
+
+    @property
+    def input_files(self):
+        return self._data.get("input_files", MappingProxyType({}))
+
+    def input_file(self, path):
+        """Return the ``input_files`` item with ``path``, or None."""
+        if self._input_index is None:
+            index = {}
+            for items in self.input_files.values():
+                for item in items if isinstance(items, tuple) else ():
+                    index.setdefault(item["path"], item)
+            object.__setattr__(self, "_input_index", index)
+        return self._input_index.get(path)
+
+    def to_dict(self):
+        return _thaw(self._data)
+
+    def dump(self, path):
+        """Write the config to ``path`` as JSON, for ``JobConfig.load`` in stage subprocesses."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.to_dict(), f, default=str)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path=None):
+        """Read a config written by ``dump`` (default path: ``SBIO_JOB_CONFIG_FILE``)."""
+        path = path or os.environ[CONFIG_FILE_ENV]
+        with open(path) as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def from_string(cls, text):
+        """Decode ``text`` (see ``decode_config``), once per distinct string."""
+        return _from_string(text)
+
+    @classmethod
+    def from_env(cls):
+        """Return the config of the current job: ``SBIO_JOB_CONFIG_FILE`` if set, else ``JOB_CONFIG``."""
+        if os.environ.get(CONFIG_FILE_ENV):
+            return cls.load()
+        return cls.from_string(os.environ.get("JOB_CONFIG") or "{}")
+
+
+@lru_cache(maxsize=4)
+def _from_string(text):
+    return JobConfig(decode_config(text))
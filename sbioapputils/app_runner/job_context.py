@@ -0,0 +1,21 @@
+class JobContext:
+    """Where a job's results go: its folder, and the S3 client and bucket to write with.
+
+    ``AppRunnerUtils.get_job_context`` resolves these once per job, so
+    uploading many results costs a single folder lookup.
+    """
+
+    __slots__ = ("job_id", "folder", "s3_client", "bucket")
+
+    def __init__(self, job_id, folder, s3_client, bucket):
+        self.job_id = job_id
+        self.folder = folder
+        self.s3_client = s3_client
+        self.bucket = bucket
+
+    def key(self, src_file):
+        """S3 key a result file is uploaded to."""
+        return f"{self.folder}{src_file}"
+
+    def __repr__(self):
+        return f"JobContext(job_id={self.job_id!r}, bucket={self.bucket!r}, folder={self.folder!r})"
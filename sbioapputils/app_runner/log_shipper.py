@@ -0,0 +1,117 @@
+import gzip
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Seconds between shipped segments, overridden by ``SBIO_LOG_SHIP_INTERVAL``
+# (0 disables shipping).
+DEFAULT_SHIP_INTERVAL = 300
+# A segment is shipped early once this much log is pending, and no segment
+# holds more, overridden by ``SBIO_LOG_SHIP_BYTES``.
+DEFAULT_SEGMENT_BYTES = 8 * MB
+# Suffix of the prefix segments are stored under, next to the final log.
+SEGMENTS_SUFFIX = ".segments/"
+
+
+class LogShipper:
+    """Uploads a growing log file in numbered gzip segments from a background thread.
+
+    Every ``interval`` seconds, or as soon as ``segment_bytes`` are
+    pending, the bytes appended since the last segment are compressed and
+    stored as ``<prefix>00000.gz``, ``<prefix>00001.gz``, ...  Each
+    segment is a gzip member, so concatenating them in order and
+    decompressing gives back the log.  A truncated log is shipped again
+    from its start.  ``close`` ships whatever is left.
+
+    Args:
+        path: The log file.
+        destination: Callable returning ``(s3_client, bucket, prefix)``;
+            called on the shipper thread before the first segment, so
+            resolving it never blocks the job.
+        interval: Seconds between segments.
+        segment_bytes: Size that triggers a segment early, and the
+            largest segment.
+        poll: Seconds between checks of the log size.
+    """
+
+    def __init__(self, path, destination, interval=DEFAULT_SHIP_INTERVAL, segment_bytes=DEFAULT_SEGMENT_BYTES,
+                 poll=None):
+        self.path = path
+        self.interval = interval
+        self.segment_bytes = segment_bytes
+        self.poll = poll if poll is not None else min(interval, 5)
+        self.offset = 0
+        self.segments = 0
+        self.shipped_bytes = 0
+        self._destination = destination
+        self._resolved = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sbio-log-shipper", daemon=True)
+
+    @classmethod
+    def from_env(cls, path, destination):
+        """Return a shipper configured by ``SBIO_LOG_SHIP_INTERVAL``/``SBIO_LOG_SHIP_BYTES``, or None if disabled."""
+        interval = float(os.environ.get("SBIO_LOG_SHIP_INTERVAL") or DEFAULT_SHIP_INTERVAL)
+        if interval <= 0:
+            return None
+        segment_bytes = int(os.environ.get("SBIO_LOG_SHIP_BYTES") or DEFAULT_SEGMENT_BYTES)
+        return cls(path, destination, interval, segment_bytes)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _pending(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return 0
+        if size < self.offset:
+            logger.info("%s was truncated, shipping it again from the start", self.path)
+            self.offset = 0
+        return size - self.offset
+
+    def _run(self):
+        last = time.monotonic()
+        while not self._stop.wait(self.poll):
+            pending = self._pending()
+            if pending >= self.segment_bytes or (pending and time.monotonic() - last >= self.interval):
+                try:
+                    self.ship()
+                except Exception as e:
+                    logger.warning("Shipping %s failed, will retry: %s", self.path, e)
+                last = time.monotonic()
+
+    def ship(self):
+        """Upload everything appended since the last segment, in segments of at most ``segment_bytes``."""
+        with self._lock:
+            while self._pending():
+                with open(self.path, "rb") as f:
+                    f.seek(self.offset)
+                    data = f.read(self.segment_bytes)
+                if not data:
+                    return
+                if self._resolved is None:
+                    self._resolved = self._destination()
+                s3_client, bucket, prefix = self._resolved
+                s3_client.put_object(Bucket=bucket, Key=f"{prefix}{self.segments:05d}.gz",
+                                     Body=gzip.compress(data, compresslevel=6), ContentType="application/gzip")
+                self.offset += len(data)
+                self.shipped_bytes += len(data)
+                self.segments += 1
+
+    def close(self, timeout=30):
+        """Stop the thread and ship the rest of the log."""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        try:
+            self.ship()
+        except Exception as e:
+            logger.warning("Shipping the end of %s failed: %s", self.path, e)
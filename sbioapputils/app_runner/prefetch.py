@@ -0,0 +1,141 @@
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREFETCH_WORKERS = 4
+# Size budget of a job's own prefetch cache, overridden by
+# ``SBIO_PREFETCH_MAX_GB`` (0 for no limit).
+DEFAULT_PREFETCH_MAX_GB = 20
+
+
+def input_file_paths(input_files):
+    """Return the S3 paths referenced by a job config's ``input_files``.
+
+    Values may be a path, a dict with a ``path`` entry, or a list of either.
+    """
+    paths = []
+    values = input_files.values() if isinstance(input_files, dict) else input_files or []
+    for value in values:
+        items = value if isinstance(value, (list, tuple)) else [value]
+        for item in items:
+            path = item.get("path") if isinstance(item, dict) else item
+            if isinstance(path, str) and path and path not in paths:
+                paths.append(path)
+    return paths
+
+
+class InputPrefetcher:
+    """Download job inputs into an ``InputCache`` in background threads.
+
+    ``resolve`` maps an input path to ``(s3_client, bucket_name)`` and runs
+    in the worker threads too, so no control-plane or S3 call blocks the
+    caller of ``start``.  Consumers in this process can block on a single
+    file with ``wait``; stage subprocesses that call
+    ``AppRunnerUtils.download_file`` with the same cache directory block on
+    the cache entry's lock until the prefetch of that file completes, then
+    get a hit.  A failed prefetch is only logged: the consumer simply
+    downloads the file itself.
+
+    The workers are daemon threads, so a download still in flight when
+    the job ends never keeps the process alive.
+
+    Args:
+        cache: The ``InputCache`` files are downloaded into.
+        resolve: Callable mapping an input path to ``(s3_client, bucket_name)``.
+        max_workers: Number of concurrent downloads.
+        temporary: The cache belongs to this job: ``shutdown`` deletes its
+            directory and unsets the ``SBIO_INPUT_CACHE_*`` variables if
+            ``SBIO_INPUT_CACHE_DIR`` points there.
+    """
+
+    def __init__(self, cache, resolve, max_workers: int = DEFAULT_PREFETCH_WORKERS, temporary: bool = False):
+        self.cache = cache
+        self.temporary = temporary
+        self._resolve = resolve
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._futures = {}
+        self._threads = [threading.Thread(target=self._work, name=f"prefetch_{i}", daemon=True)
+                         for i in range(max_workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def start(self, paths):
+        for path in paths:
+            if path not in self._futures:
+                self._futures[path] = Future()
+                self._queue.put((path, self._futures[path]))
+        if self._futures:
+            logger.info("Prefetching %d input files", len(self._futures))
+        return self
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            path, future = item
+            if self._stopped.is_set() or not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self._prefetch(path))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _prefetch(self, path):
+        start = time.time()
+        try:
+            s3_client, bucket_name = self._resolve(path)
+            hit = self.cache.fetch(s3_client, bucket_name, path, progress=False)
+        except Exception as e:
+            if self._stopped.is_set():
+                logger.debug("Prefetch of %s stopped at shutdown: %s", path, e)
+            else:
+                logger.warning("Prefetch of %s failed, it will be downloaded on demand: %s", path, e)
+            raise
+        logger.info("Prefetched %s in %.1fs%s", path, time.time() - start, " (cached)" if hit else "")
+
+    def future(self, path):
+        return self._futures.get(path)
+
+    def wait(self, path, timeout=None):
+        """Block until ``path`` is prefetched.
+
+        Returns False if the prefetch failed, did not finish within
+        ``timeout`` or was never requested.
+        """
+        future = self._futures.get(path)
+        if future is None:
+            return False
+        try:
+            future.result(timeout)
+            return True
+        except Exception:
+            return False
+
+    def shutdown(self, wait: bool = False):
+        """Stop the workers, cancelling prefetches that have not started.
+
+        Without ``wait`` downloads in flight are abandoned to their daemon
+        threads.  A ``temporary`` cache is deleted.
+        """
+        self._stopped.set()
+        for future in self._futures.values():
+            future.cancel()
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        if self.temporary:
+            if os.environ.get("SBIO_INPUT_CACHE_DIR") == self.cache.root:
+                os.environ.pop("SBIO_INPUT_CACHE_DIR")
+                os.environ.pop("SBIO_INPUT_CACHE_MAX_GB", None)
+                os.environ.pop("SBIO_INPUT_CACHE_CONSUME", None)
+            shutil.rmtree(self.cache.root, ignore_errors=True)
@@ -0,0 +1,97 @@
+import logging
+import os
+import threading
+
+import boto3
+import botocore.session
+from botocore.credentials import RefreshableCredentials
+
+logger = logging.getLogger(__name__)
+
+# Name of the STS session behind assumed-role credentials.
+ROLE_SESSION_NAME = "YourSessionName"
+
+
+def assumed_role_credentials(role_arn, assume_role):
+    """Return credentials for ``role_arn`` that renew themselves before they expire.
+
+    Args:
+        role_arn: The role to assume.
+        assume_role: Callable taking ``role_arn`` and returning the
+            ``Credentials`` of an STS ``assume_role`` response.
+
+    Returns:
+        botocore.credentials.RefreshableCredentials: Credentials that call
+        ``assume_role`` again when they get close to expiry (botocore
+        refreshes within 15 minutes of it), from whichever thread uses
+        them first.
+    """
+    def refresh():
+        credentials = assume_role(role_arn)
+        expiration = credentials["Expiration"]
+        logger.info("Assumed role %s until %s", role_arn, expiration)
+        return {
+            "access_key": credentials["AccessKeyId"],
+            "secret_key": credentials["SecretAccessKey"],
+            "token": credentials["SessionToken"],
+            "expiry_time": expiration.isoformat() if hasattr(expiration, "isoformat") else expiration,
+        }
+
+    return RefreshableCredentials.create_from_metadata(refresh(), refresh, "sts-assume-role")
+
+
+def refreshable_session(credentials, region_name=None):
+    """Return a boto3 session signing with ``credentials`` (e.g. ``assumed_role_credentials``)."""
+    session = botocore.session.get_session()
+    session._credentials = credentials
+    return boto3.session.Session(botocore_session=session, region_name=region_name)
+
+
+class ClientRegistry:
+    """Process-wide cache of S3 clients, sessions and resources.
+
+    Building a boto3 client loads the service model and sets up a fresh
+    connection pool, and an assumed role costs an STS round trip, so
+    ``AppRunnerUtils`` builds each once per credential source and shares
+    it between all transfers of the job.  Clients are thread-safe; boto3
+    resources are not, so ``resource`` caches one per thread.
+    """
+
+    def __init__(self):
+        self._objects = {}
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+    def get(self, key, factory):
+        """Return the object cached under ``key``, calling ``factory`` to build it on first use."""
+        with self._lock:
+            if key not in self._objects:
+                self._objects[key] = factory()
+            return self._objects[key]
+
+    def resource(self, key, factory):
+        """Like ``get``, but cached per calling thread."""
+        resources = getattr(self._local, "resources", None)
+        if resources is None:
+            resources = self._local.resources = {}
+        if key not in resources:
+            resources[key] = factory()
+        return resources[key]
+
+    def clear(self):
+        with self._lock:
+            self._objects.clear()
+        self._local = threading.local()
+
+
+_registry = ClientRegistry()
+
+
+def get_client_registry():
+    """Return the process-wide registry used by ``AppRunnerUtils``."""
+    return _registry
+
+
+if hasattr(os, "register_at_fork"):
+    # connection pools must not be shared with a forked child
+    os.register_at_fork(after_in_child=_registry.clear)
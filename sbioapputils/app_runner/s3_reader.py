@@ -0,0 +1,123 @@
+import io
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+DEFAULT_BLOCK_SIZE = 4 * MB
+DEFAULT_CACHE_BLOCKS = 16
+DEFAULT_READAHEAD_BLOCKS = 4
+
+
+class S3RangeReader(io.RawIOBase):
+    """Seekable, read-only file object over an S3 object, backed by ranged GETs.
+
+    The object is read in fixed-size blocks which are kept in a small LRU
+    cache, so libraries such as h5py or pandas only fetch the parts of a
+    file they actually touch.  When reads are sequential the next
+    ``readahead_blocks`` blocks are fetched in the same request, cutting
+    round trips for scans.  Memory use is bounded by
+    ``block_size * cache_blocks`` whatever the size of the object.
+
+    Every request is pinned to the ETag seen when the reader was opened,
+    so an object replaced while it is being read raises instead of
+    returning a mix of old and new bytes.
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str, block_size: int = DEFAULT_BLOCK_SIZE,
+                 cache_blocks: int = DEFAULT_CACHE_BLOCKS, readahead_blocks: int = DEFAULT_READAHEAD_BLOCKS):
+        super().__init__()
+        if cache_blocks < readahead_blocks + 1:
+            raise ValueError("cache_blocks must be larger than readahead_blocks")
+        self._s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.name = f"s3://{bucket}/{key}"
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self.readahead_blocks = readahead_blocks
+
+        head = s3_client.head_object(Bucket=bucket, Key=key)
+        self.size = head["ContentLength"]
+        self.etag = head["ETag"]
+        self._pos = 0
+        self._last_block = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+        if pos < 0:
+            raise ValueError("Negative seek position")
+        self._pos = pos
+        return pos
+
+    def readinto(self, b):
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+        view = memoryview(b).cast("B")
+        written = 0
+        with self._lock:
+            while written < len(view) and self._pos < self.size:
+                index, offset = divmod(self._pos, self.block_size)
+                block = self._get_block(index)
+                n = min(len(view) - written, len(block) - offset)
+                view[written:written + n] = block[offset:offset + n]
+                written += n
+                self._pos += n
+        return written
+
+    def readall(self):
+        return self.read(max(0, self.size - self._pos))
+
+    def close(self):
+        self._cache.clear()
+        super().close()
+
+    def _get_block(self, index):
+        block = self._cache.get(index)
+        if block is not None:
+            self._cache.move_to_end(index)
+        else:
+            sequential = self._last_block is not None and index == self._last_block + 1
+            self._fetch(index, 1 + (self.readahead_blocks if sequential else 0))
+            block = self._cache[index]
+        self._last_block = index
+        return block
+
+    def _fetch(self, first, count):
+        last_block = (self.size - 1) // self.block_size
+        count = min(count, last_block - first + 1)
+        start = first * self.block_size
+        end = min((first + count) * self.block_size, self.size) - 1
+        response = self._s3_client.get_object(
+            Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{end}", IfMatch=self.etag,
+        )
+        data = response["Body"].read()
+        self.requests += 1
+        for i in range(count):
+            index = first + i
+            self._cache[index] = data[i * self.block_size:(i + 1) * self.block_size]
+            self._cache.move_to_end(index)
+        while len(self._cache) > self.cache_blocks:
+            self._cache.popitem(last=False)
@@ -1,28 +1,104 @@
+import errno
+import hashlib
+import io
+import json
 import logging
+import mimetypes
 import os
+import statistics
+import tempfile
+import threading
 import time
+import zlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+from sbioapputils.app_runner import checksums
+from sbioapputils.app_runner.checksums import ChecksumMismatchError
+from sbioapputils.app_runner.storage import StorageClient
+from sbioapputils.app_runner.transfer_monitor import get_monitor
+from sbioapputils.app_runner.transfer_tuner import MAX_PARTS, get_default_tuner, static_tier
+from sbioapputils.load.decompress import decompress, extract_stream, is_streamable
 
 logger = logging.getLogger(__name__)
 
 MB = 1024 * 1024
 GB = 1024 * MB
 
+# Number of files uploaded side by side by ``upload_files``.
+DEFAULT_UPLOAD_WORKERS = 8
+
+# Files below this size skip the transfer manager and go out with a single
+# ``put_object``; batches of them share a persistent pool of this many threads.
+SMALL_OBJECT_SIZE = 8 * MB
+SMALL_OBJECT_WORKERS = 8
+
+# Suffix of the sidecar manifest kept next to a resumable download.
+RESUME_MANIFEST_SUFFIX = ".parts.json"
+_READ_BLOCK = 1 * MB
+
+# Text outputs worth compressing on upload, and the size below which the
+# saving is not worth the CPU.
+COMPRESSIBLE_EXTENSIONS = (".csv", ".tsv", ".txt", ".json", ".html", ".htm", ".svg", ".xml", ".pdb")
+COMPRESS_MIN_SIZE = 1 * MB
+MIN_PART_SIZE = 5 * MB
+# Streamed uploads (checksummed, compressed or packed) hold every part in
+# memory until it is sent: at most STREAM_MAX_PARTS_IN_FLIGHT parts of at
+# most STREAM_MAX_PART_SIZE bytes, larger only where S3's part limit
+# requires it, whatever the transfer tuner picks.
+STREAM_MAX_PART_SIZE = 32 * MB
+STREAM_MAX_PARTS_IN_FLIGHT = 8
+
+# Archives streamed into an extractor by ``download_and_extract`` are read
+# in chunks of this size, at most STREAM_DEPTH of them ahead of the
+# extractor, whatever the transfer tuner picks for whole-file downloads.
+STREAM_CHUNK = 8 * MB
+STREAM_DEPTH = 4
+
+# Download engines of ``multipart_download``: boto3's transfer manager, or
+# the ranged-GET engine writing parts in place with ``os.pwrite``.
+BOTO3_ENGINE = "boto3"
+RANGED_ENGINE = "ranged"
+# Without an explicit part timeout, the ranged engine re-issues a part once
+# it has run HEDGE_FACTOR times longer than the median completed part (and
+# at least HEDGE_MIN_SECONDS).  At most a quarter of the thread count (and
+# at least one) duplicate requests are in flight at a time.
+HEDGE_FACTOR = 3
+HEDGE_MIN_SECONDS = 1.0
+_HEDGE_MIN_SAMPLES = 3
+# A part of the ranged engine that fails (e.g. a connection reset mid-body)
+# is requested again up to PART_RETRIES times, after PART_RETRY_BACKOFF
+# seconds, doubling on each further attempt.
+PART_RETRIES = 3
+PART_RETRY_BACKOFF = 0.5
 
-def get_transfer_config(file_size):
+
+def get_transfer_config(file_size, max_concurrency=None, max_pool_connections=None):
     """Return a dynamic TransferConfig based on file size.
 
-    Small files  (< 1 GB):  16 MB chunks, 10 threads
-    Medium files (< 10 GB): 64 MB chunks, 15 threads
-    Large files  (>= 10 GB): 256 MB chunks, 20 threads
+    Chunk size and thread count come from the host's ``TransferTuner``,
+    which learns from the throughput of earlier transfers, bounded by the
+    CPU count and ``max_pool_connections``.  With tuning disabled
+    (``SBIO_TRANSFER_TUNING=0``) the fixed tiers of ``static_tier`` apply.
+
+    ``max_concurrency`` caps the thread count, e.g. when several files
+    share one client's connection pool.
     """
-    if file_size < 1 * GB:
-        chunk, concurrency = 16 * MB, 10
-    elif file_size < 10 * GB:
-        chunk, concurrency = 64 * MB, 15
+    tuner = get_default_tuner()
+    if tuner:
+        chunk, concurrency = tuner.choose(file_size, max_pool_connections)
     else:
-        chunk, concurrency = 256 * MB, 20
+        chunk, concurrency = static_tier(file_size)
+    if max_concurrency:
+        concurrency = max(1, min(concurrency, max_concurrency))
 
     config = TransferConfig(
         multipart_threshold=16 * MB,
@@ -33,7 +109,18 @@ def get_transfer_config(file_size):
     return config, chunk, concurrency
 
 
-def multipart_download(s3_client, bucket, s3_key, local_path, progress=True):
+def stream_part_size(chunk, size):
+    """Return the part size of a streamed upload of about ``size`` bytes.
+
+    ``chunk`` (the tuner's choice) is capped at ``STREAM_MAX_PART_SIZE``
+    but kept between ``MIN_PART_SIZE`` and what ``size`` needs to fit in
+    ``MAX_PARTS`` parts.
+    """
+    return max(MIN_PART_SIZE, min(chunk, STREAM_MAX_PART_SIZE), -(-size // MAX_PARTS))
+
+
+def multipart_download(s3_client, bucket, s3_key, local_path, progress=True, resume=False, engine=None,
+                       part_timeout=None, verify=None):
     """Download a file from S3 using multipart transfer with progress logging.
 
     Args:
@@ -41,100 +128,1118 @@ def multipart_download(s3_client, bucket, s3_key, local_path, progress=True):
         bucket: The S3 bucket name.
         s3_key: The S3 object key to download.
         local_path: The local file path to save the downloaded file.
-        progress: Whether to log download progress (default True).
+        progress: Whether to log download progress (default True).  The
+            transfer is recorded by the ``transfer_monitor`` either way.
+        resume: Keep a sidecar manifest of completed byte ranges next to
+            ``local_path`` so an interrupted download continues where it
+            stopped instead of starting from byte zero (default False).
+        engine: ``"boto3"`` to use boto3's transfer manager, or ``"ranged"``
+            for the ranged-GET engine, which preallocates ``local_path`` and
+            writes each part in place with ``os.pwrite`` (no temporary file
+            and rename) and re-issues straggling parts.  Defaults to the
+            ``SBIO_DOWNLOAD_ENGINE`` environment variable, else ``"boto3"``.
+            Resumable downloads always use the ranged engine.
+        part_timeout: Ranged engine only: seconds after which a part still
+            in flight is requested again, the first copy to finish winning.
+            None adapts it to the median part duration, 0 disables it.
+        verify: Check the bytes against the object's S3 checksum (or its
+            ETag, when that is an MD5) while they stream in, hashing each
+            part as it is written, and raise ``ChecksumMismatchError`` on a
+            mismatch.  Uses the ranged engine, with parts aligned to the
+            upload's parts for composite checksums.  Defaults to True if
+            ``SBIO_TRANSFER_CHECKSUM`` is set.  The outcome is recorded in
+            the transfer monitor.
     """
     os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+    engine = (engine or os.environ.get("SBIO_DOWNLOAD_ENGINE") or BOTO3_ENGINE).lower()
+    if engine not in (BOTO3_ENGINE, RANGED_ENGINE):
+        raise ValueError(f"Unknown download engine {engine!r}")
+    if verify is None:
+        verify = bool(os.environ.get("SBIO_TRANSFER_CHECKSUM"))
+    if not hasattr(os, "pwrite"):
+        engine, verify = BOTO3_ENGINE, False
 
-    head = s3_client.head_object(Bucket=bucket, Key=s3_key)
+    head = s3_client.head_object(Bucket=bucket, Key=s3_key, **({"ChecksumMode": "ENABLED"} if verify else {}))
     file_size = head["ContentLength"]
     file_size_gb = file_size / GB
     filename = os.path.basename(s3_key)
 
-    config, chunk, concurrency = get_transfer_config(file_size)
+    config, chunk, concurrency = get_transfer_config(
+        file_size, max_pool_connections=s3_client.meta.config.max_pool_connections,
+    )
+    expected = _expected_checksum(s3_client, bucket, s3_key, head, chunk) if verify else None
+    if expected:
+        engine = RANGED_ENGINE
+        chunk = expected.get("part_size", chunk)
+    manifest = None
+    if resume:
+        manifest = _load_resume_manifest(local_path, bucket, s3_key, head, chunk, expected)
+        chunk = manifest["chunk"]
+    resumed_bytes = _completed_bytes(manifest, file_size) if manifest else 0
     logger.info(
         "Downloading %s (%.2f GB) [%d MB x %d threads]",
         filename, file_size_gb, chunk // MB, concurrency,
     )
+    if resumed_bytes:
+        logger.info(
+            "  %s: resuming with %.2f GB already downloaded",
+            filename, resumed_bytes / GB,
+        )
 
-    state = {"bytes": 0, "last_pct": 0}
-    start = time.time()
-
-    def _callback(n):
-        state["bytes"] += n
-        pct = int(state["bytes"] / file_size * 100) if file_size > 0 else 100
-        if pct >= state["last_pct"] + 5:
-            state["last_pct"] = pct
-            elapsed = time.time() - start
-            speed = (state["bytes"] / MB) / elapsed if elapsed > 0 else 0
-            gb_done = state["bytes"] / GB
-            logger.info(
-                "  %s: %.2f/%.2f GB (%d%%) - %.0f MB/s",
-                filename, gb_done, file_size_gb, pct, speed,
-            )
-
-    callback = _callback if progress else None
-
-    s3_client.download_file(
-        Bucket=bucket, Key=s3_key, Filename=local_path,
-        Config=config, Callback=callback,
+    tracker = get_monitor().start(
+        filename, "download", file_size, initial_bytes=resumed_bytes, log_progress=progress,
+        key=s3_key, chunk=chunk, concurrency=concurrency,
     )
+    try:
+        if resume or engine == RANGED_ENGINE:
+            algorithm = expected["algorithm"] if expected else None
+            try:
+                if resume:
+                    digests = _resumable_download(s3_client, bucket, s3_key, local_path, manifest, concurrency,
+                                                  tracker, part_timeout, algorithm)
+                else:
+                    n_parts = (file_size + chunk - 1) // chunk
+                    digests = _ranged_download(s3_client, bucket, s3_key, local_path, file_size, head["ETag"],
+                                               chunk, range(n_parts), concurrency, tracker, part_timeout,
+                                               checksum=algorithm)
+                if expected:
+                    _verify_download(s3_key, expected, digests, file_size, chunk, tracker, local_path)
+            except BaseException as e:
+                # a resumable download keeps its partial file, unless its bytes are wrong
+                if (not resume or isinstance(e, ChecksumMismatchError)) and os.path.exists(local_path):
+                    os.remove(local_path)
+                raise
+        else:
+            tracker.add_part(_part_count(file_size, config))
+            s3_client.download_file(
+                Bucket=bucket, Key=s3_key, Filename=local_path,
+                Config=config, Callback=tracker,
+            )
+    except Exception as e:
+        tracker.finish(e)
+        raise
+    tracker.finish()
 
-    elapsed = time.time() - start
+    elapsed = tracker.elapsed
+    if not isinstance(s3_client, StorageClient):
+        _record_throughput(file_size - resumed_bytes, chunk, concurrency, elapsed)
     mins, secs = int(elapsed // 60), int(elapsed % 60)
-    avg = file_size_gb / (elapsed / 60) if elapsed > 0 else 0
+    avg = ((file_size - resumed_bytes) / GB) / (elapsed / 60) if elapsed > 0 else 0
     logger.info(
         "  %s downloaded in %dm %ds (%.2f GB/min)",
         filename, mins, secs, avg,
     )
 
 
-def multipart_upload(s3_client, bucket, local_path, s3_key, progress=True):
+def _record_throughput(nbytes, chunk, concurrency, elapsed):
+    tuner = get_default_tuner()
+    if tuner:
+        tuner.record(nbytes, chunk, concurrency, elapsed)
+
+
+def _part_count(file_size, config):
+    if file_size < config.multipart_threshold:
+        return 1
+    return max(1, (file_size + config.multipart_chunksize - 1) // config.multipart_chunksize)
+
+
+def _part_range(index, chunk, file_size):
+    start = index * chunk
+    return start, min(start + chunk, file_size) - 1
+
+
+def _completed_bytes(manifest, file_size):
+    chunk = manifest["chunk"]
+    return sum(_part_range(i, chunk, file_size)[1] - i * chunk + 1 for i in manifest["done"])
+
+
+def _write_manifest(manifest_path, manifest):
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def _load_resume_manifest(local_path, bucket, s3_key, head, chunk, expected=None):
+    """Return the resume manifest for ``local_path``, starting a new one if needed.
+
+    An existing manifest is only reused if it describes the same object
+    (bucket, key, size and ETag) and the partial file is still present;
+    otherwise the partial file is reset and every range is fetched again.
+    When verifying a checksum (``expected``), the manifest must also hold
+    the part digests of the same algorithm, on the upload's part
+    boundaries if the checksum is composite.
+    """
+    algorithm = expected["algorithm"] if expected else None
+    manifest_path = local_path + RESUME_MANIFEST_SUFFIX
+    file_size = head["ContentLength"]
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if (manifest.get("bucket") == bucket and manifest.get("key") == s3_key
+                and manifest.get("etag") == head["ETag"] and manifest.get("size") == file_size
+                and os.path.getsize(local_path) == file_size
+                and manifest.get("checksum") == algorithm
+                and (not expected or "part_size" not in expected or manifest.get("chunk") == chunk)):
+            manifest["done"] = sorted(set(manifest["done"]))
+            return manifest
+        logger.info("Discarding stale resume manifest %s", manifest_path)
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    manifest = {
+        "bucket": bucket, "key": s3_key, "etag": head["ETag"],
+        "size": file_size, "chunk": chunk, "done": [], "checksum": algorithm, "digests": {},
+    }
+    with open(local_path, "wb") as f:
+        f.truncate(file_size)
+    _write_manifest(manifest_path, manifest)
+    return manifest
+
+
+def _resumable_download(s3_client, bucket, s3_key, local_path, manifest, concurrency, tracker, part_timeout=None,
+                        checksum=None):
+    """Fetch the byte ranges missing from ``manifest`` with ``_ranged_download``.
+
+    Each completed range is recorded in the sidecar manifest, which is
+    removed once the whole object is on disk.  ``IfMatch`` pins every
+    request to the ETag the manifest was built for, so an object that is
+    replaced mid-transfer fails loudly instead of producing a mixed file.
+    With ``checksum``, part digests are kept in the manifest too.
+
+    Returns:
+        dict: Part index to digest, for every part (see ``_ranged_download``).
+    """
+    manifest_path = local_path + RESUME_MANIFEST_SUFFIX
+    file_size, chunk = manifest["size"], manifest["chunk"]
+    n_parts = (file_size + chunk - 1) // chunk
+    done = set(manifest["done"])
+
+    def _on_part(index, digest):
+        manifest["done"].append(index)
+        if digest is not None:
+            manifest.setdefault("digests", {})[str(index)] = digest.hex()
+        _write_manifest(manifest_path, manifest)
+
+    digests = {int(index): bytes.fromhex(digest) for index, digest in manifest.get("digests", {}).items()}
+    digests.update(_ranged_download(s3_client, bucket, s3_key, local_path, file_size, manifest["etag"], chunk,
+                                    [i for i in range(n_parts) if i not in done], concurrency, tracker,
+                                    part_timeout, _on_part, checksum))
+    os.remove(manifest_path)
+    return digests
+
+
+def _preallocate(fd, size):
+    """Reserve ``size`` bytes for ``fd`` up front, so parts landing out of order don't fragment the file."""
+    if size <= 0:
+        return
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError as e:
+            if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+                raise
+    os.ftruncate(fd, size)
+
+
+def _pwrite_all(fd, data, offset):
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+def _ranged_download(s3_client, bucket, s3_key, local_path, file_size, etag, chunk, parts, concurrency, tracker,
+                     part_timeout=None, on_part=None, checksum=None):
+    """Fetch ``parts`` (indexes of ``chunk``-sized ranges) of an object into ``local_path``.
+
+    The file is preallocated and opened once.  Each ranged GET is written
+    at its offset with ``os.pwrite`` as it streams in.  ``IfMatch`` pins
+    every request to ``etag``.  A part still in flight after
+    ``part_timeout`` seconds (see ``multipart_download``) is requested
+    again.  Both copies write the same bytes to the same offsets, the
+    first to finish completes the part and the other stops at its next
+    block.  A failed part is requested again up to ``PART_RETRIES`` times
+    with exponential backoff, unless S3 rejected the request itself (a 4xx
+    other than 408 or 429, e.g. the ETag no longer matching).  Hedges and
+    retries are counted on ``tracker``.  Progress is reported per completed
+    part, so a hedged part is counted once.  ``on_part(index, digest)`` is
+    called, serialised, as each part completes.
+
+    With ``checksum`` (an algorithm of ``checksums``), every part is hashed
+    as it streams in.
+
+    Returns:
+        dict: Part index to digest of the fetched parts (None digests
+        without ``checksum``).
+    """
+    parts = list(parts)
+    fd = os.open(local_path, os.O_RDWR | os.O_CREAT, 0o644)
+    lock = threading.Lock()
+    completed = set()
+    digests = {}
+    bodies = {}
+    durations = []
+    max_hedges = max(1, concurrency // 4)
+
+    def _fetch(index, attempt):
+        start, end = _part_range(index, chunk, file_size)
+        response = s3_client.get_object(
+            Bucket=bucket, Key=s3_key, Range=f"bytes={start}-{end}", IfMatch=etag,
+        )
+        body = response["Body"]
+        with lock:
+            if index in completed:
+                body.close()
+                return False
+            bodies[(index, attempt)] = body
+        hasher = checksums.new(checksum) if checksum else None
+        offset = start
+        try:
+            while offset <= end:
+                data = body.read(_READ_BLOCK)
+                if not data or index in completed:
+                    break
+                if hasher:
+                    hasher.update(data)
+                _pwrite_all(fd, data, offset)
+                offset += len(data)
+        finally:
+            with lock:
+                bodies.pop((index, attempt), None)
+        with lock:
+            if index in completed:
+                return False
+            if offset != end + 1:
+                raise IOError(f"Short read of {s3_key} bytes {start}-{end}: got {offset - start} bytes")
+            completed.add(index)
+            digests[index] = hasher.digest() if hasher else None
+            for (other, _), other_body in list(bodies.items()):
+                if other == index:
+                    try:
+                        other_body.close()
+                    except Exception:
+                        pass
+            if on_part:
+                on_part(index, digests[index])
+        tracker(end - start + 1)
+        tracker.add_part()
+        return True
+
+    def _straggler_after():
+        if part_timeout is not None:
+            return part_timeout or None
+        if len(durations) < _HEDGE_MIN_SAMPLES:
+            return None
+        return max(HEDGE_MIN_SECONDS, HEDGE_FACTOR * statistics.median(durations))
+
+    def _retryable(error):
+        if isinstance(error, ClientError):
+            status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+            return not 400 <= status < 500 or status in (408, 429)
+        return True
+
+    def _schedule(executor):
+        pending = deque(parts)
+        inflight = {}
+        started = {}
+        attempts = {}
+        errors = {}
+        retries = {}
+        backoff = []
+        hedged = set()
+
+        def _submit(index, hedge=False):
+            attempts[index] = attempts.get(index, 0) + 1
+            inflight[executor.submit(_fetch, index, attempts[index])] = (index, hedge)
+
+        while pending or inflight or backoff:
+            now = time.monotonic()
+            for ready, index in [item for item in backoff if item[0] <= now]:
+                backoff.remove((ready, index))
+                pending.appendleft(index)
+            active = {index for index, _ in inflight.values()}
+            while pending and len(active) < concurrency:
+                index = pending.popleft()
+                started[index] = time.monotonic()
+                _submit(index)
+                active.add(index)
+            if not inflight:
+                time.sleep(max(0.0, min(ready for ready, _ in backoff) - now))
+                continue
+
+            done, _ = wait(list(inflight), timeout=0.1, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, _ = inflight.pop(future)
+                try:
+                    if future.result():
+                        durations.append(time.monotonic() - started[index])
+                except Exception as e:
+                    errors[index] = e
+                still_running = any(i == index for i, _ in inflight.values())
+                if index in errors and index not in completed and not still_running:
+                    error = errors.pop(index)
+                    retries[index] = retries.get(index, 0) + 1
+                    if retries[index] > PART_RETRIES or not _retryable(error):
+                        raise error
+                    delay = PART_RETRY_BACKOFF * 2 ** (retries[index] - 1)
+                    logger.warning("  %s: part %d failed (%s), requesting it again in %.1fs",
+                                   s3_key, index, error, delay)
+                    tracker.add_retry()
+                    hedged.discard(index)
+                    backoff.append((time.monotonic() + delay, index))
+
+            threshold = _straggler_after()
+            if threshold is None:
+                continue
+            hedges = sum(1 for _, hedge in inflight.values() if hedge)
+            now = time.monotonic()
+            for index in sorted({i for i, _ in inflight.values()} - hedged, key=started.get):
+                if hedges >= max_hedges or now - started[index] < threshold:
+                    break
+                logger.info("  %s: part %d still running after %.1fs, requesting it again",
+                            s3_key, index, now - started[index])
+                hedged.add(index)
+                _submit(index, hedge=True)
+                tracker.add_retry()
+                hedges += 1
+
+    try:
+        _preallocate(fd, file_size)
+        # a larger file already at ``local_path`` must not keep its old tail
+        os.ftruncate(fd, file_size)
+        if not parts:
+            return digests
+        workers = min(concurrency, len(parts)) + max_hedges
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3-range") as executor:
+            try:
+                _schedule(executor)
+            except BaseException:
+                # let attempts still in flight stop at their next block
+                with lock:
+                    completed.update(parts)
+                raise
+    finally:
+        os.close(fd)
+    return digests
+
+
+def _expected_checksum(s3_client, bucket, s3_key, head, chunk):
+    """Return the checksum to verify a download of ``s3_key`` against, or None.
+
+    See ``checksums.expected_checksum``.  Composite checksums get the
+    upload's ``part_size``, which the download's parts must follow.  Hash
+    checksums of a whole object can only be computed in stream by a
+    single part, so larger objects with one are not verified.
+    """
+    expected = checksums.expected_checksum(head)
+    if expected is None:
+        logger.warning("  %s has no checksum that can be verified locally", s3_key)
+        return None
+    if expected["composite"]:
+        first = s3_client.head_object(Bucket=bucket, Key=s3_key, PartNumber=1)
+        expected["part_size"] = max(first["ContentLength"], 1)
+    elif expected["algorithm"] not in ("crc32", "crc32c") and head["ContentLength"] > chunk:
+        logger.warning("  %s: a whole-object %s can't be verified in parts, not verifying",
+                       s3_key, expected["algorithm"])
+        return None
+    return expected
+
+
+def _verify_download(s3_key, expected, digests, file_size, chunk, tracker, local_path):
+    """Compare the part ``digests`` and the size of a download with the ``expected`` checksum and ``file_size``."""
+    algorithm = expected["algorithm"]
+    if file_size == 0:
+        # nothing was fetched: the object is a single empty part
+        n_parts, ordered = 1, [checksums.new(algorithm).digest()]
+    else:
+        n_parts = (file_size + chunk - 1) // chunk
+        ordered = [digests[i] for i in range(n_parts)]
+    if expected["composite"]:
+        actual = checksums.composite(algorithm, ordered)
+    else:
+        sizes = [end - start + 1 for start, end in (_part_range(i, chunk, file_size) for i in range(n_parts))]
+        actual = checksums.full_object(algorithm, ordered, sizes)
+    size = os.path.getsize(local_path)
+    verified = checksums.normalize(actual) == checksums.normalize(expected["value"]) and size == file_size
+    tracker.details.update(checksum_algorithm=algorithm, checksum=actual, checksum_verified=verified)
+    if size != file_size:
+        raise ChecksumMismatchError(f"{s3_key} is {size} bytes on disk, expected {file_size}")
+    if not verified:
+        raise ChecksumMismatchError(
+            f"{algorithm} checksum mismatch for {s3_key}: expected {expected['value']}, got {actual}")
+
+
+def multipart_upload(s3_client, bucket, local_path, s3_key, progress=True, max_concurrency=None, compress=None,
+                     checksum=None):
     """Upload a file to S3 using multipart transfer with progress logging.
 
+    Files below ``SMALL_OBJECT_SIZE`` are sent with a single ``put_object``
+    instead, see ``small_upload``.
+
     Args:
         s3_client: A boto3 S3 client instance.
         bucket: The S3 bucket name.
         local_path: The local file path to upload.
         s3_key: The S3 object key for the destination.
-        progress: Whether to log upload progress (default True).
+        progress: Whether to log upload progress (default True).  The
+            transfer is recorded by the ``transfer_monitor`` either way.
+        max_concurrency: Optional cap on the number of part-upload threads.
+        compress: ``"gzip"`` or ``"zstd"`` to compress the file while it is
+            uploaded, see ``compressed_upload`` (default None).
+        checksum: ``"crc32"``, ``"crc32c"``, ``"sha1"`` or ``"sha256"`` to
+            hash every part while it is read and send it with its S3
+            checksum, which S3 verifies on receipt; the object's checksum is
+            then compared with the one S3 reports, see ``_StreamUploader``.
+            Defaults to the ``SBIO_TRANSFER_CHECKSUM`` environment variable.
     """
+    checksum = _upload_checksum(checksum)
+    if compress:
+        return compressed_upload(s3_client, bucket, local_path, s3_key, compress, progress, max_concurrency,
+                                 checksum)
+
     file_size = os.path.getsize(local_path)
+    if file_size < SMALL_OBJECT_SIZE:
+        return small_upload(s3_client, bucket, local_path, s3_key, checksum)
     file_size_gb = file_size / GB
     filename = os.path.basename(local_path)
 
-    config, chunk, concurrency = get_transfer_config(file_size)
+    config, chunk, concurrency = get_transfer_config(
+        file_size, max_concurrency, max_pool_connections=s3_client.meta.config.max_pool_connections,
+    )
+    if checksum:
+        chunk = stream_part_size(chunk, file_size)
+        concurrency = min(concurrency, STREAM_MAX_PARTS_IN_FLIGHT)
     logger.info(
         "Uploading %s (%.2f GB) -> %s [%d MB x %d threads]",
         filename, file_size_gb, s3_key, chunk // MB, concurrency,
     )
 
-    state = {"bytes": 0, "last_pct": 0}
+    tracker = get_monitor().start(
+        filename, "upload", file_size, log_progress=progress,
+        key=s3_key, chunk=chunk, concurrency=concurrency,
+    )
+    try:
+        if checksum:
+            uploader = _StreamUploader(s3_client, bucket, s3_key, chunk, concurrency, tracker, checksum=checksum)
+            try:
+                with open(local_path, "rb") as f:
+                    for block in iter(lambda: f.read(uploader.chunk), b""):
+                        uploader.write(block)
+                        tracker(len(block))
+                uploader.close()
+            except BaseException:
+                uploader.abort()
+                raise
+        else:
+            tracker.add_part(_part_count(file_size, config))
+            s3_client.upload_file(
+                Filename=local_path, Bucket=bucket, Key=s3_key,
+                Config=config, Callback=tracker,
+            )
+    except Exception as e:
+        tracker.finish(e)
+        raise
+    tracker.finish()
+
+    elapsed = tracker.elapsed
+    if not max_concurrency and not isinstance(s3_client, StorageClient):
+        # capped uploads share bandwidth with other files and would skew the
+        # tuner, as would non-S3 backends
+        _record_throughput(file_size, chunk, concurrency, elapsed)
+    mins, secs = int(elapsed // 60), int(elapsed % 60)
+    avg = file_size_gb / (elapsed / 60) if elapsed > 0 else 0
+    logger.info(
+        "  %s uploaded in %dm %ds (%.2f GB/min)",
+        filename, mins, secs, avg,
+    )
+
+
+def _upload_checksum(checksum):
+    checksum = (checksum or os.environ.get("SBIO_TRANSFER_CHECKSUM") or "").lower() or None
+    if checksum and checksum not in checksums.S3_ALGORITHMS:
+        raise ValueError(f"Unknown checksum algorithm {checksum!r}, expected one of {checksums.S3_ALGORITHMS}")
+    return checksum
+
+
+def small_upload(s3_client, bucket, local_path, s3_key, checksum=None):
+    """Upload a file below ``SMALL_OBJECT_SIZE`` with one ``put_object``.
+
+    Skips what ``multipart_upload`` sets up for large files (transfer
+    config, transfer manager threads, progress logging), which dominates
+    the time of a small upload.  With ``checksum`` the file's S3 checksum
+    is sent along for S3 to verify.  The upload is still recorded in the
+    transfer monitor.
+    """
+    with open(local_path, "rb") as f:
+        data = f.read()
+    tracker = get_monitor().start(os.path.basename(local_path), "upload", len(data), log_progress=False, key=s3_key)
+    args = {}
+    if checksum:
+        hasher = checksums.new(checksum)
+        hasher.update(data)
+        args = {"ChecksumAlgorithm": checksum.upper(),
+                checksums.s3_field(checksum): checksums.encode(checksum, hasher.digest())}
+        tracker.details.update(checksum_algorithm=checksum, checksum=args[checksums.s3_field(checksum)],
+                               checksum_verified=False)
+    try:
+        s3_client.put_object(Bucket=bucket, Key=s3_key, Body=data, **args)
+    except Exception as e:
+        tracker.finish(e)
+        raise
+    if checksum:
+        # S3 rejects the put if the object does not match the checksum sent with it
+        tracker.details["checksum_verified"] = True
+    tracker(len(data))
+    tracker.add_part()
+    tracker.finish()
+    logger.debug("Uploaded %s -> %s (%d bytes)", local_path, s3_key, len(data))
+
+
+_small_pool = None
+_small_pool_lock = threading.Lock()
+
+
+def _small_object_pool():
+    """Return the process-wide thread pool for small uploads, creating it on first use."""
+    global _small_pool
+    with _small_pool_lock:
+        if _small_pool is None:
+            _small_pool = ThreadPoolExecutor(max_workers=SMALL_OBJECT_WORKERS, thread_name_prefix="s3-small")
+        return _small_pool
+
+
+def _reset_small_pool():
+    # a forked child has none of the parent's threads
+    global _small_pool, _small_pool_lock
+    _small_pool = None
+    _small_pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_small_pool)
+
+
+def upload_files(s3_client, bucket, uploads, max_workers=DEFAULT_UPLOAD_WORKERS, progress=True, compress=None):
+    """Upload many files concurrently through one shared S3 client.
+
+    Files are pushed through a bounded worker pool, each with
+    ``multipart_upload``.  The per-file thread count is capped so that all
+    workers together stay within the client's connection pool.  Files
+    below ``SMALL_OBJECT_SIZE`` that are not compressed go out with
+    ``small_upload`` on a persistent pool of ``SMALL_OBJECT_WORKERS``
+    threads instead, alongside the large ones.
+
+    Args:
+        s3_client: A boto3 S3 client instance, shared by all workers.
+        bucket: The S3 bucket name.
+        uploads: Iterable of ``(local_path, s3_key)`` pairs.
+        max_workers: Number of files uploaded in parallel.
+        progress: Whether to log per-file upload progress (default True).
+        compress: ``"gzip"`` or ``"zstd"`` to compress text files
+            (``COMPRESSIBLE_EXTENSIONS``, at least ``COMPRESS_MIN_SIZE``) on
+            the fly; other files are uploaded as they are.
+
+    Returns:
+        list: One dict per upload, in input order, with keys ``file``,
+        ``key``, ``ok``, ``skipped`` (always False here), ``bytes`` sent
+        (the compressed size for compressed files) and ``error`` (the
+        exception, or None).
+    """
+    uploads = list(uploads)
+    results = [
+        {"file": src, "key": key, "ok": False, "skipped": False, "bytes": 0, "error": None}
+        for src, key in uploads
+    ]
+    if not uploads:
+        return results
+
+    checksum = _upload_checksum(None)
+    small, large = [], []
+    for i, (src, key) in enumerate(uploads):
+        file_compress = compress if compress and is_compressible(src) else None
+        try:
+            is_small = not file_compress and os.path.getsize(src) < SMALL_OBJECT_SIZE
+        except OSError:
+            is_small = False  # let the upload report the error
+        (small if is_small else large).append((i, src, key, file_compress))
+
+    workers = max(1, min(max_workers, len(large)))
+    pool_size = s3_client.meta.config.max_pool_connections or 10
+    if small:
+        pool_size = max(workers, pool_size - SMALL_OBJECT_WORKERS)
+    per_file_concurrency = max(1, pool_size // workers)
+
     start = time.time()
+    compressed = {i for i, _, _, file_compress in large if file_compress}
+    futures = {
+        _small_object_pool().submit(small_upload, s3_client, bucket, src, key, checksum): i
+        for i, src, key, _ in small
+    }
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3-upload") as executor:
+        futures.update({
+            executor.submit(
+                multipart_upload, s3_client, bucket, src, key,
+                progress=progress, max_concurrency=per_file_concurrency, compress=file_compress,
+            ): i
+            for i, src, key, file_compress in large
+        })
+        for future in as_completed(futures):
+            index = futures[future]
+            result = results[index]
+            try:
+                sent = future.result()
+                result["ok"] = True
+                # compressed files report what went over the wire
+                result["bytes"] = sent if index in compressed else os.path.getsize(result["file"])
+            except Exception as e:
+                result["error"] = e
+                logger.error("Upload of %s -> %s failed: %s", result["file"], result["key"], e)
+
+    failed = sum(1 for r in results if not r["ok"])
+    logger.info(
+        "Uploaded %d/%d files in %.1fs [%d small, %d large: %d files x %d threads]",
+        len(results) - failed, len(results), time.time() - start, len(small), len(large),
+        workers, per_file_concurrency,
+    )
+    return results
+
+
+def is_compressible(local_path):
+    """Return True for text files large enough to be worth compressing on upload.
+
+    A file that can't be read is not compressible; its upload reports the error.
+    """
+    try:
+        return (local_path.lower().endswith(COMPRESSIBLE_EXTENSIONS)
+                and os.path.getsize(local_path) >= COMPRESS_MIN_SIZE)
+    except OSError:
+        return False
+
+
+def _make_compressor(compress):
+    if compress == "zstd":
+        if zstandard is not None:
+            return "zstd", zstandard.ZstdCompressor(level=3).compressobj()
+        logger.warning("zstandard is not installed, compressing with gzip instead")
+        compress = "gzip"
+    if compress == "gzip":
+        # wbits=31 writes a gzip header and trailer rather than raw zlib
+        return "gzip", zlib.compressobj(6, zlib.DEFLATED, 31)
+    raise ValueError(f"Unsupported compression {compress!r}, expected 'gzip' or 'zstd'")
+
+
+class _StreamUploader:
+    """Upload a stream of bytes as one object, sending parts while it is produced.
+
+    ``write`` buffers data and hands every full ``chunk`` to a thread pool;
+    at most ``concurrency`` (capped at ``STREAM_MAX_PARTS_IN_FLIGHT``) parts
+    are in flight or queued, so memory stays bounded whatever the stream's
+    length; see ``stream_part_size`` for the matching ``chunk``.  ``close`` sends the rest and
+    completes the upload.  A stream that never filled a part is sent with
+    one ``put_object`` instead.  ``abort`` discards a failed upload.
 
-    def _callback(n):
-        state["bytes"] += n
-        pct = int(state["bytes"] / file_size * 100) if file_size > 0 else 100
-        if pct >= state["last_pct"] + 5:
-            state["last_pct"] = pct
-            elapsed = time.time() - start
-            speed = (state["bytes"] / MB) / elapsed if elapsed > 0 else 0
-            gb_done = state["bytes"] / GB
-            logger.info(
-                "  %s: %.2f/%.2f GB (%d%%) - %.0f MB/s",
-                filename, gb_done, file_size_gb, pct, speed,
+    With ``checksum`` each part is hashed in its worker thread and sent
+    with its S3 checksum, which S3 verifies on receipt.  On ``close`` the
+    object's checksum (composite over the parts) is compared with the one
+    S3 reports, and recorded on ``tracker``.  Byte progress is left to
+    the caller, which knows the uncompressed size.
+    """
+
+    def __init__(self, s3_client, bucket, s3_key, chunk, concurrency, tracker, extra_args=None, checksum=None):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.s3_key = s3_key
+        self.chunk = chunk
+        self.tracker = tracker
+        self.extra_args = extra_args or {}
+        self.checksum = checksum
+        self.upload_id = None
+        self.sent_bytes = 0
+        self._completed = False
+        self._buffer = bytearray()
+        self._futures = []
+        concurrency = min(concurrency, STREAM_MAX_PARTS_IN_FLIGHT)
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="s3-part")
+
+    def write(self, data):
+        if not self._buffer and len(data) == self.chunk:
+            self._submit(bytes(data))
+            return
+        self._buffer += data
+        while len(self._buffer) >= self.chunk:
+            part = bytes(self._buffer[:self.chunk])
+            del self._buffer[:self.chunk]
+            self._submit(part)
+
+    def _checksum_args(self, data):
+        if not self.checksum:
+            return {}, None
+        hasher = checksums.new(self.checksum)
+        hasher.update(data)
+        digest = hasher.digest()
+        return {"ChecksumAlgorithm": self.checksum.upper(),
+                checksums.s3_field(self.checksum): checksums.encode(self.checksum, digest)}, digest
+
+    def _send_part(self, number, data):
+        try:
+            args, digest = self._checksum_args(data)
+            response = self.s3_client.upload_part(
+                Bucket=self.bucket, Key=self.s3_key, UploadId=self.upload_id, PartNumber=number, Body=data, **args,
             )
+            self.tracker.add_part()
+            part = {"PartNumber": number, "ETag": response["ETag"]}
+            part.update((k, v) for k, v in args.items() if k != "ChecksumAlgorithm")
+            return part, digest
+        finally:
+            self._slots.release()
+
+    def _submit(self, data):
+        if self.upload_id is None:
+            args = dict(self.extra_args)
+            if self.checksum:
+                args["ChecksumAlgorithm"] = self.checksum.upper()
+            self.upload_id = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.s3_key, **args)["UploadId"]
+        self._slots.acquire()
+        self.sent_bytes += len(data)
+        self._futures.append(self._executor.submit(self._send_part, len(self._futures) + 1, data))
+
+    def close(self):
+        """Send what is buffered and complete the object.
+
+        Returns:
+            dict: The ``put_object`` or ``complete_multipart_upload`` response.
+        """
+        try:
+            if self.upload_id is None:
+                data = bytes(self._buffer)
+                self._buffer.clear()
+                self.sent_bytes += len(data)
+                args, digest = self._checksum_args(data)
+                response = self.s3_client.put_object(
+                    Bucket=self.bucket, Key=self.s3_key, Body=data, **self.extra_args, **args)
+                self.tracker.add_part()
+                local = checksums.encode(self.checksum, digest) if digest else None
+            else:
+                if self._buffer:
+                    self._submit(bytes(self._buffer))
+                    self._buffer.clear()
+                results = [future.result() for future in self._futures]
+                response = self.s3_client.complete_multipart_upload(
+                    Bucket=self.bucket, Key=self.s3_key, UploadId=self.upload_id,
+                    MultipartUpload={"Parts": [part for part, _ in results]},
+                )
+                local = checksums.composite(self.checksum, [d for _, d in results]) if self.checksum else None
+            self._completed = True
+        finally:
+            self._executor.shutdown(wait=True)
+        if self.checksum:
+            self._verify(response, local)
+        return response
+
+    def _verify(self, response, local):
+        field = checksums.s3_field(self.checksum)
+        remote = response.get(field)
+        if remote is None:
+            remote = self.s3_client.head_object(Bucket=self.bucket, Key=self.s3_key, ChecksumMode="ENABLED").get(field)
+        verified = None if remote is None else checksums.normalize(remote) == checksums.normalize(local)
+        self.tracker.details.update(checksum_algorithm=self.checksum, checksum=local, checksum_verified=verified)
+        if verified is False:
+            raise ChecksumMismatchError(
+                f"{self.checksum} checksum mismatch for {self.s3_key}: sent {local}, S3 has {remote}")
+
+    def abort(self):
+        for future in self._futures:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+        if self.upload_id is not None and not self._completed:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.s3_key, UploadId=self.upload_id)
+
+
+def compressed_upload(s3_client, bucket, local_path, s3_key, compress="gzip", progress=True, max_concurrency=None,
+                      checksum=None):
+    """Upload ``local_path`` compressed on the fly, without a compressed temp file.
 
-    callback = _callback if progress else None
+    The file is read and compressed block by block; every time a part's
+    worth of compressed bytes has accumulated it is sent with
+    ``upload_part`` from a small thread pool while compression continues
+    (see ``_StreamUploader``, which also handles ``checksum``).
+    Output that fits in a single part is sent with one ``put_object``.
 
-    s3_client.upload_file(
-        Filename=local_path, Bucket=bucket, Key=s3_key,
-        Config=config, Callback=callback,
+    The object keeps its key and gets the matching ``Content-Encoding``
+    (``gzip`` or ``zstd``) and ``Content-Type``, so browsers decode it
+    transparently; the original size is stored in the
+    ``sbio-uncompressed-size`` metadata field.  zstd needs the optional
+    ``zstandard`` package and falls back to gzip without it.
+
+    Returns:
+        int: The number of (compressed) bytes sent.
+    """
+    file_size = os.path.getsize(local_path)
+    filename = os.path.basename(local_path)
+    encoding, compressor = _make_compressor(compress)
+    _, chunk, concurrency = get_transfer_config(
+        file_size, max_concurrency, max_pool_connections=s3_client.meta.config.max_pool_connections,
+    )
+    chunk = stream_part_size(chunk, file_size)
+    concurrency = min(concurrency, STREAM_MAX_PARTS_IN_FLIGHT)
+    extra_args = {
+        "ContentEncoding": encoding,
+        "ContentType": mimetypes.guess_type(local_path)[0] or "application/octet-stream",
+        "Metadata": {"sbio-uncompressed-size": str(file_size)},
+    }
+    logger.info(
+        "Uploading %s (%.2f GB, %s) -> %s [%d MB x %d threads]",
+        filename, file_size / GB, encoding, s3_key, chunk // MB, concurrency,
     )
 
-    elapsed = time.time() - start
-    mins, secs = int(elapsed // 60), int(elapsed % 60)
-    avg = file_size_gb / (elapsed / 60) if elapsed > 0 else 0
+    tracker = get_monitor().start(
+        filename, "upload", file_size, log_progress=progress,
+        key=s3_key, chunk=chunk, concurrency=concurrency, compression=encoding,
+    )
+    uploader = _StreamUploader(s3_client, bucket, s3_key, chunk, concurrency, tracker, extra_args, checksum)
+    try:
+        with open(local_path, "rb") as f:
+            for block in iter(lambda: f.read(8 * MB), b""):
+                uploader.write(compressor.compress(block))
+                tracker(len(block))
+        uploader.write(compressor.flush())
+        uploader.close()
+    except BaseException as e:
+        uploader.abort()
+        tracker.finish(e)
+        raise
+    sent_bytes = uploader.sent_bytes
+    tracker.details["compressed_bytes"] = sent_bytes
+    tracker.finish()
+
+    elapsed = tracker.elapsed
+    ratio = sent_bytes / file_size if file_size else 1
     logger.info(
-        "  %s uploaded in %dm %ds (%.2f GB/min)",
-        filename, mins, secs, avg,
+        "  %s uploaded in %dm %ds (%.2f GB sent, %.0f%% of original)",
+        filename, int(elapsed // 60), int(elapsed % 60), sent_bytes / GB, ratio * 100,
     )
+    return sent_bytes
+
+
+def compute_etag(local_path, part_size=None):
+    """Compute the ETag S3 assigns to ``local_path`` when uploaded unencrypted.
+
+    Without ``part_size`` this is the plain MD5 of the file; with it, the
+    multipart form: the MD5 of the concatenated part MD5s, suffixed with
+    the number of parts.
+    """
+    if part_size is None:
+        md5 = hashlib.md5()
+        with open(local_path, "rb") as f:
+            for block in iter(lambda: f.read(_READ_BLOCK), b""):
+                md5.update(block)
+        return f'"{md5.hexdigest()}"'
+
+    digests = []
+    with open(local_path, "rb") as f:
+        while True:
+            part = f.read(part_size)
+            if not part:
+                break
+            digests.append(hashlib.md5(part).digest())
+    return f'"{hashlib.md5(b"".join(digests)).hexdigest()}-{len(digests)}"'
+
+
+def is_unchanged(s3_client, bucket, local_path, s3_key):
+    """Return True if ``s3_key`` already holds exactly the bytes of ``local_path``.
+
+    Sizes are compared first, so most changed files are detected without
+    reading them.  Otherwise the local ETag is computed with the part size
+    of the existing object.  Objects whose ETag is not an MD5 digest (e.g.
+    SSE-KMS encrypted) are always treated as changed.
+    """
+    try:
+        head = s3_client.head_object(Bucket=bucket, Key=s3_key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+    if head["ContentLength"] != os.path.getsize(local_path):
+        return False
+
+    etag = head["ETag"]
+    digest, _, parts = etag.strip('"').partition("-")
+    if len(digest) != 32:
+        return False
+    if not parts:
+        return compute_etag(local_path) == etag
+    first_part = s3_client.head_object(Bucket=bucket, Key=s3_key, PartNumber=1)
+    return compute_etag(local_path, first_part["ContentLength"]) == etag
+
+
+def sync_upload_files(s3_client, bucket, uploads, max_workers=DEFAULT_UPLOAD_WORKERS, progress=True,
+                      compress=None):
+    """Like ``upload_files``, but skip files whose bytes are already at their key.
+
+    Existing objects are compared concurrently with ``is_unchanged``; only
+    new or changed files are uploaded.  Skipped files are reported with
+    ``ok`` and ``skipped`` set and ``bytes`` holding their size.  Objects
+    stored compressed never compare equal and are always re-sent.
+    """
+    uploads = list(uploads)
+    results = [None] * len(uploads)
+    to_send = []
+
+    def _check(src, key):
+        return is_unchanged(s3_client, bucket, src, key)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="s3-sync") as executor:
+        futures = [executor.submit(_check, src, key) for src, key in uploads]
+        for i, ((src, key), future) in enumerate(zip(uploads, futures)):
+            try:
+                unchanged = future.result()
+            except Exception as e:
+                logger.warning("Could not compare %s with %s, uploading: %s", src, key, e)
+                unchanged = False
+            if unchanged:
+                results[i] = {"file": src, "key": key, "ok": True, "skipped": True,
+                              "bytes": os.path.getsize(src), "error": None}
+            else:
+                to_send.append(i)
+
+    sent = upload_files(s3_client, bucket, [uploads[i] for i in to_send], max_workers, progress, compress)
+    for i, result in zip(to_send, sent):
+        results[i] = result
+    return results
+
+
+def summarize_uploads(results):
+    """Summarise per-file results of ``upload_files``/``sync_upload_files``."""
+    sent = [r for r in results if r["ok"] and not r["skipped"]]
+    skipped = [r for r in results if r["skipped"]]
+    return {
+        "files_sent": len(sent),
+        "files_skipped": len(skipped),
+        "files_failed": sum(1 for r in results if not r["ok"]),
+        "bytes_sent": sum(r["bytes"] for r in sent),
+        "bytes_skipped": sum(r["bytes"] for r in skipped),
+        "results": results,
+    }
+
+
+class _OrderedRangeReader(io.RawIOBase):
+    """Sequential, non-seekable stream over an S3 object fed by parallel ranged GETs.
+
+    Up to ``depth`` chunks are fetched ahead by a thread pool and handed
+    out strictly in order, so a single consumer (e.g. a tar extractor)
+    reads at multi-connection speed while memory stays bounded by
+    ``depth * chunk`` bytes.
+    """
+
+    def __init__(self, s3_client, bucket, s3_key, size, etag, chunk, depth, tracker):
+        super().__init__()
+        self._fetch_args = (s3_client, bucket, s3_key, etag)
+        self._size = size
+        self._chunk = chunk
+        self._tracker = tracker
+        self._executor = ThreadPoolExecutor(max_workers=depth, thread_name_prefix="s3-stream")
+        self._pending = deque()
+        self._next_offset = 0
+        self._buffer = memoryview(b"")
+        for _ in range(depth):
+            self._submit_next()
+
+    def readable(self):
+        return True
+
+    def _submit_next(self):
+        if self._next_offset >= self._size:
+            return
+        start = self._next_offset
+        end = min(start + self._chunk, self._size) - 1
+        self._next_offset = end + 1
+        self._pending.append(self._executor.submit(self._fetch, start, end))
+
+    def _fetch(self, start, end):
+        s3_client, bucket, s3_key, etag = self._fetch_args
+        response = s3_client.get_object(Bucket=bucket, Key=s3_key, Range=f"bytes={start}-{end}", IfMatch=etag)
+        data = response["Body"].read()
+        self._tracker(len(data))
+        self._tracker.add_part()
+        return data
+
+    def readinto(self, b):
+        if not self._buffer:
+            if not self._pending:
+                return 0
+            self._buffer = memoryview(self._pending.popleft().result())
+            self._submit_next()
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            for future in self._pending:
+                future.cancel()
+            self._executor.shutdown(wait=True)
+        super().close()
+
+
+def download_and_extract(s3_client, bucket, s3_key, dest_dir, progress=True):
+    """Download a compressed S3 object and extract it into ``dest_dir``.
+
+    tar, tar.gz/tgz, tar.bz2, tar.xz and single-file gz objects are piped
+    straight from parallel ranged GETs into the extractor, so the
+    compressed copy never touches the disk; at most ``STREAM_DEPTH``
+    chunks of ``STREAM_CHUNK`` bytes are held in memory.  Member paths that would land
+    outside ``dest_dir`` are rejected.  zip archives need seekable input
+    and go through ``multipart_download`` and ``decompress`` instead, via a
+    temporary file in ``dest_dir`` that is removed afterwards.
+
+    Args:
+        s3_client: A boto3 S3 client instance.
+        bucket: The S3 bucket name.
+        s3_key: The S3 object key of the archive.
+        dest_dir: The directory to extract into.
+        progress: Whether to log download progress (default True).
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    filename = os.path.basename(s3_key)
+
+    if not is_streamable(filename):
+        fd, tmp_path = tempfile.mkstemp(dir=dest_dir, suffix=f"-{filename}")
+        os.close(fd)
+        try:
+            multipart_download(s3_client, bucket, s3_key, tmp_path, progress=progress)
+            decompress(tmp_path, dest_dir)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return
+
+    head = s3_client.head_object(Bucket=bucket, Key=s3_key)
+    file_size = head["ContentLength"]
+    chunk = STREAM_CHUNK
+    concurrency = min(STREAM_DEPTH, s3_client.meta.config.max_pool_connections)
+    logger.info(
+        "Streaming %s (%.2f GB) into %s [%d MB x %d threads]",
+        filename, file_size / GB, dest_dir, chunk // MB, concurrency,
+    )
+
+    tracker = get_monitor().start(
+        filename, "download", file_size, log_progress=progress,
+        key=s3_key, chunk=chunk, concurrency=concurrency, extracted_to=dest_dir,
+    )
+    raw = _OrderedRangeReader(s3_client, bucket, s3_key, file_size, head["ETag"], chunk, concurrency, tracker)
+    try:
+        with io.BufferedReader(raw, buffer_size=_READ_BLOCK) as stream:
+            extract_stream(stream, filename, dest_dir)
+    except Exception as e:
+        tracker.finish(e)
+        raise
+    tracker.finish()
+
+    elapsed = tracker.elapsed
+    logger.info("  %s extracted in %dm %ds", filename, int(elapsed // 60), int(elapsed % 60))
@@ -0,0 +1,436 @@
+import errno
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from abc import ABC, abstractmethod
+from types import SimpleNamespace
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; reflinks are never attempted
+    fcntl = None
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+# Values of ``SBIO_STORAGE_BACKEND``.
+S3_BACKEND = "s3"
+LOCAL_BACKEND = "local"
+
+# ioctl request of Linux's FICLONE (share extents copy-on-write, e.g. on XFS or btrfs).
+_FICLONE = 0x40049409
+_COPY_BLOCK = 64 * 1024 * 1024
+_META_DIR = ".sbio-meta"
+_UPLOADS_DIR = ".sbio-uploads"
+
+
+def get_storage_backend():
+    """Return the storage backend selected by ``SBIO_STORAGE_BACKEND`` (default ``s3``)."""
+    backend = os.environ.get("SBIO_STORAGE_BACKEND", S3_BACKEND).lower()
+    if backend not in (S3_BACKEND, LOCAL_BACKEND):
+        raise ValueError(f"Unknown SBIO_STORAGE_BACKEND {backend!r}, expected {S3_BACKEND!r} or {LOCAL_BACKEND!r}")
+    return backend
+
+
+def clone_file(src, dest, hardlink=False):
+    """Place a copy of ``src`` at ``dest`` (which must not exist) as cheaply as possible.
+
+    Returns:
+        str: ``"hardlink"``, ``"reflink"`` or ``"sendfile"``.
+    """
+    if hardlink:
+        try:
+            os.link(src, dest)
+            return "hardlink"
+        except OSError:
+            pass
+    with open(src, "rb") as fsrc, open(dest, "wb") as fdst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+                return "reflink"
+            except OSError as e:
+                if e.errno not in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS):
+                    raise
+        try:
+            size = os.fstat(fsrc.fileno()).st_size
+            offset = 0
+            while offset < size:
+                sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, min(_COPY_BLOCK, size - offset))
+                if sent == 0:
+                    break
+                offset += sent
+        except (AttributeError, OSError):
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+            shutil.copyfileobj(fsrc, fdst, _COPY_BLOCK)
+        return "sendfile"
+
+
+def _client_error(code, message, status, operation):
+    return ClientError({"Error": {"Code": code, "Message": message},
+                        "ResponseMetadata": {"HTTPStatusCode": status}}, operation)
+
+
+class StorageClient(ABC):
+    """Storage operations used by ``s3_transfer``, ``InputCache`` and ``S3RangeReader``.
+
+    The interface is the subset of the boto3 S3 client those modules call,
+    with boto3's keyword arguments and response dicts, so a boto3 client is
+    the S3 implementation as is.  Other backends subclass this and
+    implement every abstract method.
+
+    ``meta.config.max_pool_connections`` bounds the concurrency transfers use.
+    """
+
+    meta = SimpleNamespace(config=SimpleNamespace(max_pool_connections=25))
+
+    @abstractmethod
+    def head_object(self, Bucket, Key, PartNumber=None, **kwargs):
+        """Return the object's metadata, or that of one part with ``PartNumber``."""
+
+    @abstractmethod
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None, **kwargs):
+        """Return the object (or a byte ``Range`` of it) with a file-like ``Body``."""
+
+    @abstractmethod
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        """Store ``Body`` in one request."""
+
+    @abstractmethod
+    def list_objects_v2(self, Bucket, Prefix="", **kwargs):
+        """List the objects under ``Prefix``."""
+
+    @abstractmethod
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        """Copy ``CopySource`` (``{"Bucket": ..., "Key": ...}``) to ``Key``."""
+
+    @abstractmethod
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        """Start a multipart upload and return its ``UploadId``."""
+
+    @abstractmethod
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        """Store one part of a multipart upload."""
+
+    @abstractmethod
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        """Assemble the uploaded parts into the object."""
+
+    @abstractmethod
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        """Discard a multipart upload and its parts."""
+
+    @abstractmethod
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        """Store a local file, reporting bytes sent to ``Callback``."""
+
+    @abstractmethod
+    def download_file(self, Bucket, Key, Filename, ExtraArgs=None, Callback=None, Config=None):
+        """Write the object to a local file, reporting bytes received to ``Callback``."""
+
+
+class _FileBody:
+    """Reads a byte range of a file lazily, like botocore's ``StreamingBody``."""
+
+    def __init__(self, path, start, length):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = length
+
+    def read(self, amt=None):
+        if amt is None or amt < 0 or amt > self._remaining:
+            amt = self._remaining
+        data = self._file.read(amt)
+        self._remaining -= len(data)
+        return data
+
+    def iter_chunks(self, chunk_size=1024 * 1024):
+        for chunk in iter(lambda: self.read(chunk_size), b""):
+            yield chunk
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LocalStorageClient(StorageClient):
+    """Storage backend on a local or shared filesystem.
+
+    Bucket ``b`` and key ``k`` map to ``root/b/k``.  "Transfers" between the
+    store and job files avoid copying bytes through Python where the
+    filesystem allows it: a reflink (copy-on-write clone) is tried first,
+    then ``os.sendfile`` in the kernel.  With ``hardlink`` set, downloads
+    are hard links instead.  That is the fastest option, but it shares the
+    inode, so a job that modifies a downloaded file in place also modifies
+    the stored object.
+
+    Writes go to a temporary file that is renamed into place, so readers
+    never see a partial object.  Metadata such as ``ContentEncoding`` and
+    the part sizes of multipart uploads is kept in a JSON sidecar under
+    ``root/.sbio-meta``.  ETags are derived from size, mtime and inode
+    rather than the MD5 S3 computes, so ``is_unchanged`` treats every
+    object as changed.
+    """
+
+    def __init__(self, root: str, hardlink: bool = False, max_pool_connections: int = 25):
+        self.root = os.path.abspath(root)
+        self.hardlink = hardlink
+        self.meta = SimpleNamespace(config=SimpleNamespace(max_pool_connections=max_pool_connections))
+        os.makedirs(self.root, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """Build the client from ``SBIO_LOCAL_STORAGE_ROOT`` and ``SBIO_LOCAL_STORAGE_HARDLINK``."""
+        root = os.environ.get("SBIO_LOCAL_STORAGE_ROOT")
+        if not root:
+            raise ValueError("SBIO_LOCAL_STORAGE_ROOT must be set when SBIO_STORAGE_BACKEND=local")
+        hardlink = os.environ.get("SBIO_LOCAL_STORAGE_HARDLINK", "").lower() in ("true", "1", "yes")
+        return cls(root, hardlink=hardlink)
+
+    # -- paths and metadata -------------------------------------------------
+
+    def _path(self, bucket, key):
+        base = os.path.join(self.root, bucket)
+        path = os.path.normpath(os.path.join(base, key))
+        if not path.startswith(base + os.sep):
+            raise _client_error("InvalidKey", f"Key escapes the bucket: {key}", 400, "LocalStorage")
+        return path
+
+    def _meta_path(self, bucket, key):
+        return os.path.join(self.root, _META_DIR, os.path.relpath(self._path(bucket, key), self.root)) + ".json"
+
+    def _read_meta(self, bucket, key):
+        try:
+            with open(self._meta_path(bucket, key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_meta(self, bucket, key, meta):
+        meta_path = self._meta_path(bucket, key)
+        if not meta:
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+            return
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        tmp = f"{meta_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+
+    @staticmethod
+    def _etag(st):
+        return f'"{st.st_size:x}-{st.st_mtime_ns:x}-{st.st_ino:x}"'
+
+    def _stat(self, bucket, key, operation):
+        try:
+            return os.stat(self._path(bucket, key))
+        except (FileNotFoundError, NotADirectoryError):
+            raise _client_error("404", "Not Found", 404, operation) from None
+
+    def _commit(self, tmp_path, bucket, key, extra=None):
+        dest = self._path(bucket, key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(tmp_path, dest)
+        meta = {k: v for k, v in (extra or {}).items() if k in ("ContentEncoding", "ContentType", "Metadata", "Parts")}
+        self._write_meta(bucket, key, meta)
+        return {"ETag": self._etag(os.stat(dest))}
+
+    def _tmp_in(self, bucket, key):
+        directory = os.path.dirname(self._path(bucket, key))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        os.close(fd)
+        return tmp
+
+    # -- object calls -------------------------------------------------------
+
+    def head_object(self, Bucket, Key, PartNumber=None, **kwargs):
+        st = self._stat(Bucket, Key, "HeadObject")
+        meta = self._read_meta(Bucket, Key)
+        head = {k: v for k, v in meta.items() if k != "Parts"}
+        head.update(ContentLength=st.st_size, ETag=self._etag(st))
+        if PartNumber and meta.get("Parts"):
+            head["ContentLength"] = meta["Parts"][PartNumber - 1]
+            head["PartsCount"] = len(meta["Parts"])
+        return head
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None, **kwargs):
+        st = self._stat(Bucket, Key, "GetObject")
+        if IfMatch and IfMatch != self._etag(st):
+            raise _client_error("PreconditionFailed", "At least one of the pre-conditions you specified did not hold",
+                                412, "GetObject")
+        start, end = 0, st.st_size - 1
+        if Range:
+            first, _, last = Range.split("=", 1)[1].partition("-")
+            start, end = int(first), min(int(last), st.st_size - 1) if last else st.st_size - 1
+        response = {k: v for k, v in self._read_meta(Bucket, Key).items() if k != "Parts"}
+        response.update(Body=_FileBody(self._path(Bucket, Key), start, end - start + 1),
+                        ContentLength=end - start + 1, ETag=self._etag(st))
+        return response
+
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        tmp = self._tmp_in(Bucket, Key)
+        with open(tmp, "wb") as f:
+            if hasattr(Body, "read"):
+                shutil.copyfileobj(Body, f, _COPY_BLOCK)
+            else:
+                f.write(Body)
+        return self._commit(tmp, Bucket, Key, kwargs)
+
+    def list_objects_v2(self, Bucket, Prefix="", **kwargs):
+        base = os.path.join(self.root, Bucket)
+        contents = []
+        for directory, dirs, files in os.walk(base):
+            dirs.sort()
+            for name in sorted(files):
+                if name.startswith(".tmp-"):
+                    continue
+                path = os.path.join(directory, name)
+                key = os.path.relpath(path, base).replace(os.sep, "/")
+                if key.startswith(Prefix):
+                    st = os.stat(path)
+                    contents.append({"Key": key, "Size": st.st_size, "ETag": self._etag(st)})
+        response = {"KeyCount": len(contents), "IsTruncated": False}
+        if contents:
+            response["Contents"] = contents
+        return response
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        if isinstance(CopySource, str):
+            src_bucket, _, src_key = CopySource.lstrip("/").partition("/")
+        else:
+            src_bucket, src_key = CopySource["Bucket"], CopySource["Key"]
+        self._stat(src_bucket, src_key, "CopyObject")
+        tmp = self._tmp_in(Bucket, Key)
+        os.remove(tmp)
+        clone_file(self._path(src_bucket, src_key), tmp)
+        meta = self._read_meta(src_bucket, src_key)
+        return {"CopyObjectResult": self._commit(tmp, Bucket, Key, meta)}
+
+    # -- multipart ----------------------------------------------------------
+
+    def _upload_dir(self, upload_id):
+        return os.path.join(self.root, _UPLOADS_DIR, upload_id)
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._upload_dir(upload_id))
+        with open(os.path.join(self._upload_dir(upload_id), "extra.json"), "w") as f:
+            json.dump(kwargs, f)
+        return {"UploadId": upload_id, "Bucket": Bucket, "Key": Key}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        part_path = os.path.join(self._upload_dir(UploadId), f"{PartNumber:05d}")
+        with open(part_path + ".tmp", "wb") as f:
+            if hasattr(Body, "read"):
+                shutil.copyfileobj(Body, f, _COPY_BLOCK)
+            else:
+                f.write(Body)
+        os.replace(part_path + ".tmp", part_path)
+        return {"ETag": self._etag(os.stat(part_path))}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        upload_dir = self._upload_dir(UploadId)
+        with open(os.path.join(upload_dir, "extra.json")) as f:
+            extra = json.load(f)
+        tmp = self._tmp_in(Bucket, Key)
+        sizes = []
+        with open(tmp, "wb") as out:
+            for part in MultipartUpload["Parts"]:
+                with open(os.path.join(upload_dir, f"{part['PartNumber']:05d}"), "rb") as f:
+                    sizes.append(os.fstat(f.fileno()).st_size)
+                    shutil.copyfileobj(f, out, _COPY_BLOCK)
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        extra["Parts"] = sizes
+        return self._commit(tmp, Bucket, Key, extra)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        shutil.rmtree(self._upload_dir(UploadId), ignore_errors=True)
+        return {}
+
+    # -- managed transfers --------------------------------------------------
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        # never hardlink uploads: the job may keep writing to its output file
+        tmp = self._tmp_in(Bucket, Key)
+        os.remove(tmp)
+        method = clone_file(Filename, tmp)
+        size = os.path.getsize(tmp)
+        self._commit(tmp, Bucket, Key, ExtraArgs)
+        logger.debug("Stored %s as %s/%s by %s", Filename, Bucket, Key, method)
+        if Callback:
+            Callback(size)
+
+    def download_file(self, Bucket, Key, Filename, ExtraArgs=None, Callback=None, Config=None):
+        self._stat(Bucket, Key, "HeadObject")
+        directory = os.path.dirname(os.path.abspath(Filename))
+        os.makedirs(directory, exist_ok=True)
+        tmp = os.path.join(directory, f".{os.path.basename(Filename)}.{uuid.uuid4().hex}")
+        method = clone_file(self._path(Bucket, Key), tmp, hardlink=self.hardlink)
+        size = os.path.getsize(tmp)
+        os.replace(tmp, Filename)
+        logger.debug("Fetched %s/%s to %s by %s", Bucket, Key, Filename, method)
+        if Callback:
+            Callback(size)
+
+
+class StorageBucket:
+    """The parts of a boto3 resource ``Bucket`` that jobs use, over a ``StorageClient``.
+
+    Lets code written against ``AppRunnerUtils.get_s3_bucket`` run on a
+    non-S3 backend: ``Object(key)`` (``get``, ``put``, ``download_file``,
+    ``upload_file``), ``objects.all()`` / ``objects.filter(Prefix=...)``
+    and the bucket's own ``download_file`` / ``upload_file``.
+    """
+
+    def __init__(self, client: StorageClient, name: str):
+        self.client = client
+        self.name = name
+        self.objects = SimpleNamespace(all=lambda: self._list(""),
+                                       filter=lambda Prefix="", **kwargs: self._list(Prefix))
+
+    def Object(self, key):
+        return StorageObject(self, key)
+
+    def _list(self, prefix):
+        for item in self.client.list_objects_v2(Bucket=self.name, Prefix=prefix).get("Contents", []):
+            yield SimpleNamespace(bucket_name=self.name, key=item["Key"], size=item["Size"], e_tag=item["ETag"])
+
+    def download_file(self, Key, Filename, **kwargs):
+        self.client.download_file(self.name, Key, Filename, **kwargs)
+
+    def upload_file(self, Filename, Key, **kwargs):
+        self.client.upload_file(Filename, self.name, Key, **kwargs)
+
+
+class StorageObject:
+    """One object of a ``StorageBucket``, like a boto3 resource ``Object``."""
+
+    def __init__(self, bucket: StorageBucket, key: str):
+        self.bucket_name = bucket.name
+        self.key = key
+        self._client = bucket.client
+
+    def get(self, **kwargs):
+        return self._client.get_object(Bucket=self.bucket_name, Key=self.key, **kwargs)
+
+    def put(self, Body=b"", **kwargs):
+        return self._client.put_object(Bucket=self.bucket_name, Key=self.key, Body=Body, **kwargs)
+
+    def download_file(self, Filename, **kwargs):
+        self._client.download_file(self.bucket_name, self.key, Filename, **kwargs)
+
+    def upload_file(self, Filename, **kwargs):
+        self._client.upload_file(Filename, self.bucket_name, self.key, **kwargs)
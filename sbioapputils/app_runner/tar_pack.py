@@ -0,0 +1,200 @@
+import json
+import logging
+import os
+import tarfile
+import zlib
+
+from sbioapputils.app_runner.s3_transfer import (
+    GB, MB, STREAM_MAX_PARTS_IN_FLIGHT, _StreamUploader, _make_compressor, get_transfer_config, stream_part_size,
+    zstandard,
+)
+from sbioapputils.app_runner.transfer_monitor import get_monitor
+
+logger = logging.getLogger(__name__)
+
+# Suffix of the member index stored next to a packed archive.
+INDEX_SUFFIX = ".index.json"
+INDEX_FIELDS = ["name", "size", "header_offset", "data_offset", "stored_offset", "stored_length"]
+
+
+class _TarStream:
+    """Write-only file object feeding a tar stream to a ``_StreamUploader``.
+
+    ``tell`` reports the position in the uncompressed tar, which is what
+    ``tarfile`` expects.  With ``compress``, every tar member becomes its own
+    gzip (or zstd) member: ``start_member`` ends the current one.  The
+    concatenation is still a valid .tar.gz, but each member can also be
+    fetched and decompressed on its own from ``stored`` offsets.
+    """
+
+    def __init__(self, uploader, compress=None):
+        self.uploader = uploader
+        self.compress = compress
+        self.position = 0
+        self.stored = 0
+        self._compressor = _make_compressor(compress)[1] if compress else None
+
+    def _store(self, data):
+        if data:
+            self.uploader.write(data)
+            self.stored += len(data)
+
+    def write(self, data):
+        self.position += len(data)
+        self._store(self._compressor.compress(data) if self._compressor else data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def start_member(self):
+        if self._compressor:
+            self._store(self._compressor.flush())
+            self._compressor = _make_compressor(self.compress)[1]
+        return self.stored
+
+    def close(self):
+        self.start_member()
+
+
+def archive_suffix(compress=None):
+    """File name suffix of an archive packed with ``compress`` (zstd falls back to gzip without zstandard)."""
+    if not compress:
+        return ".tar"
+    return {"gzip": ".tar.gz", "zstd": ".tar.zst"}[_make_compressor(compress)[0]]
+
+
+def _pack_members(paths, root):
+    members = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, dirs, files in os.walk(path):
+                dirs.sort()
+                members.extend(os.path.join(directory, name) for name in sorted(files))
+        else:
+            members.append(path)
+    root = root or os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths])
+    return [(path, os.path.relpath(os.path.abspath(path), root).replace(os.sep, "/")) for path in members]
+
+
+def pack_upload(s3_client, bucket, paths, s3_key, root=None, compress=None, progress=True, max_concurrency=None,
+                checksum=None):
+    """Stream files into a single tar object, with an index of where each member lies.
+
+    Files (directories are walked) are read one by one into a tar stream
+    that goes straight into a multipart upload, so thousands of small files
+    cost one object's worth of requests and no local archive is written.
+    Member names are relative to ``root`` (default: the common parent).
+
+    With ``compress`` (``"gzip"`` or ``"zstd"``) each member is compressed
+    separately, see ``_TarStream``; the object stays a standard .tar.gz.
+
+    The index, stored at ``s3_key + INDEX_SUFFIX``, lists for every member
+    its size, the offsets of its header and data in the uncompressed tar,
+    and the byte range holding it in the stored object, so that
+    ``read_member`` fetches a single file with one ranged GET.
+
+    Returns:
+        dict: The index.
+    """
+    members = _pack_members(paths, root)
+    total = sum(os.path.getsize(path) for path, _ in members)
+    _, chunk, concurrency = get_transfer_config(
+        total, max_concurrency, max_pool_connections=s3_client.meta.config.max_pool_connections,
+    )
+    chunk = stream_part_size(chunk, total)
+    concurrency = min(concurrency, STREAM_MAX_PARTS_IN_FLIGHT)
+    encoding = _make_compressor(compress)[0] if compress else None
+    filename = os.path.basename(s3_key)
+    logger.info(
+        "Packing %d files (%.2f GB%s) -> %s [%d MB x %d threads]",
+        len(members), total / GB, f", {encoding}" if encoding else "", s3_key, chunk // MB, concurrency,
+    )
+
+    tracker = get_monitor().start(
+        filename, "upload", total, log_progress=progress,
+        key=s3_key, chunk=chunk, concurrency=concurrency, compression=encoding, files=len(members),
+    )
+    content_type = "application/gzip" if encoding == "gzip" else "application/zstd" if encoding else "application/x-tar"
+    uploader = _StreamUploader(s3_client, bucket, s3_key, chunk, concurrency, tracker,
+                               {"ContentType": content_type}, checksum)
+    stream = _TarStream(uploader, encoding)
+    entries = []
+    try:
+        with tarfile.open(fileobj=stream, mode="w", format=tarfile.PAX_FORMAT) as tar:
+            for path, name in members:
+                info = tar.gettarinfo(path, arcname=name)
+                info.uid = info.gid = 0
+                info.uname = info.gname = ""
+                header_offset = stream.tell()
+                stored_offset = stream.start_member()
+                header_size = len(info.tobuf(tar.format, tar.encoding, tar.errors))
+                if info.isreg():
+                    with open(path, "rb") as f:
+                        tar.addfile(info, f)
+                else:
+                    tar.addfile(info)
+                tracker(info.size)
+                entries.append([name, info.size, header_offset, header_offset + header_size, stored_offset])
+            # the end-of-archive blocks go into a compressed member of their own
+            members_end = stream.start_member()
+        stream.close()
+        for entry, next_offset in zip(entries, [e[4] for e in entries[1:]] + [members_end]):
+            entry.append(next_offset - entry[4])
+        uploader.close()
+    except BaseException as e:
+        uploader.abort()
+        tracker.finish(e)
+        raise
+    tracker.details["stored_bytes"] = stream.stored
+    tracker.finish()
+
+    index = {"key": s3_key, "compression": encoding, "fields": INDEX_FIELDS, "members": entries}
+    s3_client.put_object(Bucket=bucket, Key=s3_key + INDEX_SUFFIX, Body=json.dumps(index).encode(),
+                         ContentType="application/json")
+    logger.info(
+        "  %s: %d files packed in %.1fs (%.2f GB stored)",
+        filename, len(entries), tracker.elapsed, stream.stored / GB,
+    )
+    return index
+
+
+def load_index(s3_client, bucket, s3_key):
+    """Fetch the index ``pack_upload`` stored for ``s3_key``."""
+    body = s3_client.get_object(Bucket=bucket, Key=s3_key + INDEX_SUFFIX)["Body"].read()
+    return json.loads(body)
+
+
+def read_member(s3_client, bucket, s3_key, name, index=None):
+    """Return the bytes of member ``name`` of a packed archive with one ranged GET.
+
+    Pass the ``index`` (from ``pack_upload`` or ``load_index``) when
+    reading several members, to fetch it only once.
+    """
+    index = index or load_index(s3_client, bucket, s3_key)
+    fields = index["fields"]
+    for values in index["members"]:
+        member = dict(zip(fields, values))
+        if member["name"] == name:
+            break
+    else:
+        raise KeyError(f"{name} is not in {s3_key}")
+    if member["size"] == 0:
+        return b""
+
+    if not index.get("compression"):
+        start = member["data_offset"]
+        end = start + member["size"] - 1
+        return s3_client.get_object(Bucket=bucket, Key=s3_key, Range=f"bytes={start}-{end}")["Body"].read()
+
+    start = member["stored_offset"]
+    end = start + member["stored_length"] - 1
+    stored = s3_client.get_object(Bucket=bucket, Key=s3_key, Range=f"bytes={start}-{end}")["Body"].read()
+    if index["compression"] == "zstd":
+        if zstandard is None:
+            raise ImportError("reading a zstd-packed archive needs the zstandard package")
+        raw = zstandard.ZstdDecompressor().decompressobj().decompress(stored)
+    else:
+        raw = zlib.decompressobj(31).decompress(stored)
+    skip = member["data_offset"] - member["header_offset"]
+    return raw[skip:skip + member["size"]]
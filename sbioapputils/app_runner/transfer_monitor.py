@@ -0,0 +1,212 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+# Throughput is sampled at most this often per transfer, and at most
+# _MAX_SAMPLES samples are kept (older ones are thinned out).
+SAMPLE_INTERVAL = 0.5
+_MAX_SAMPLES = 1000
+# Progress is logged every this many percent of a transfer.
+LOG_STEP_PCT = 5
+
+
+def percentile(values, pct):
+    """Return the ``pct`` percentile of ``values`` (nearest-rank), or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class TransferProgress:
+    """Thread-safe progress of a single transfer, usable as a boto3 ``Callback``.
+
+    Created by ``TransferMonitor.start``.  Calling the object with a byte
+    count (as boto3 does from its worker threads) updates the totals,
+    samples throughput and logs progress every ``LOG_STEP_PCT`` percent.
+    """
+
+    def __init__(self, monitor, name, direction, total_bytes, initial_bytes=0, log_progress=True, **details):
+        self.monitor = monitor
+        self.name = name
+        self.direction = direction
+        self.total_bytes = total_bytes
+        self.initial_bytes = initial_bytes
+        self.log_progress = log_progress
+        self.details = details
+        self.bytes = initial_bytes
+        self.parts = 0
+        self.retries = 0
+        self.samples = []
+        self.status = "running"
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._last_pct = int(initial_bytes / total_bytes * 100) if total_bytes else 0
+        self._sample_time = self.started_at
+        self._sample_bytes = initial_bytes
+
+    def __call__(self, n):
+        log_pct = None
+        with self._lock:
+            self.bytes += n
+            now = time.time()
+            dt = now - self._sample_time
+            if dt >= SAMPLE_INTERVAL:
+                self.samples.append((self.bytes - self._sample_bytes) / MB / dt)
+                if len(self.samples) > _MAX_SAMPLES:
+                    del self.samples[::2]
+                self._sample_time, self._sample_bytes = now, self.bytes
+            pct = int(self.bytes / self.total_bytes * 100) if self.total_bytes > 0 else 100
+            if pct >= self._last_pct + LOG_STEP_PCT:
+                self._last_pct = pct
+                log_pct = pct
+        if log_pct is not None and self.log_progress:
+            logger.info(
+                "  %s: %.2f/%.2f GB (%d%%) - %.0f MB/s%s",
+                self.name, self.bytes / GB, self.total_bytes / GB, log_pct, self.mbps,
+                self.monitor.describe_progress(),
+            )
+
+    def add_part(self, n=1):
+        with self._lock:
+            self.parts += n
+
+    def add_retry(self, n=1):
+        with self._lock:
+            self.retries += n
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def mbps(self):
+        elapsed = self.elapsed
+        return (self.bytes - self.initial_bytes) / MB / elapsed if elapsed > 0 else 0.0
+
+    def finish(self, error=None):
+        """Mark the transfer as done (or failed with ``error``)."""
+        with self._lock:
+            self.finished_at = time.time()
+            self.status = "failed" if error else "ok"
+            self.error = str(error) if error else None
+        self.monitor._finished(self)
+        return self
+
+    def to_dict(self):
+        with self._lock:
+            samples = list(self.samples)
+            record = {
+                "name": self.name,
+                "direction": self.direction,
+                "status": self.status,
+                "error": self.error,
+                "total_bytes": self.total_bytes,
+                "bytes": self.bytes,
+                "resumed_bytes": self.initial_bytes,
+                "parts": self.parts,
+                "retries": self.retries,
+                "started_at": self.started_at,
+                "elapsed": round(self.elapsed, 3),
+                "mbps": round(self.mbps, 2),
+            }
+        for pct in (50, 90, 99):
+            value = percentile(samples, pct)
+            record[f"mbps_p{pct}"] = round(value, 2) if value is not None else None
+        record.update(self.details)
+        return record
+
+
+class TransferMonitor:
+    """Collects ``TransferProgress`` records of all transfers in a process.
+
+    Aggregates progress across concurrent transfers for log lines and
+    produces a machine-readable summary (per-transfer records plus totals
+    and throughput percentiles) that can be written as JSON per job.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = []
+        self._done = []
+
+    def start(self, name, direction, total_bytes, initial_bytes=0, log_progress=True, **details):
+        progress = TransferProgress(self, name, direction, total_bytes, initial_bytes, log_progress, **details)
+        with self._lock:
+            self._active.append(progress)
+        return progress
+
+    def _finished(self, progress):
+        with self._lock:
+            if progress in self._active:
+                self._active.remove(progress)
+                self._done.append(progress)
+
+    def progress(self):
+        """Return the combined progress of the transfers currently running."""
+        with self._lock:
+            active = list(self._active)
+        return {
+            "active": len(active),
+            "bytes": sum(p.bytes for p in active),
+            "total_bytes": sum(p.total_bytes for p in active),
+        }
+
+    def describe_progress(self):
+        current = self.progress()
+        if current["active"] < 2:
+            return ""
+        return " [%d transfers: %.2f/%.2f GB]" % (
+            current["active"], current["bytes"] / GB, current["total_bytes"] / GB)
+
+    def summary(self):
+        with self._lock:
+            transfers = [p.to_dict() for p in self._done + self._active]
+        totals = {}
+        for direction in ("download", "upload"):
+            records = [t for t in transfers if t["direction"] == direction]
+            rates = [t["mbps"] for t in records if t["status"] == "ok"]
+            totals[direction] = {
+                "transfers": len(records),
+                "failed": sum(1 for t in records if t["status"] == "failed"),
+                "bytes": sum(t["bytes"] - t["resumed_bytes"] for t in records),
+                "seconds": round(sum(t["elapsed"] for t in records), 3),
+                "parts": sum(t["parts"] for t in records),
+                "retries": sum(t["retries"] for t in records),
+                "mbps_p50": percentile(rates, 50),
+                "mbps_p90": percentile(rates, 90),
+                "mbps_p99": percentile(rates, 99),
+            }
+        return {"generated_at": time.time(), "totals": totals, "transfers": transfers}
+
+    def export_json(self, path, **extra):
+        """Write ``summary()`` (plus ``extra`` top-level fields) to ``path`` as JSON."""
+        summary = dict(extra, **self.summary())
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._active = []
+            self._done = []
+
+
+_monitor = TransferMonitor()
+
+
+def get_monitor():
+    """Return the process-wide transfer monitor used by ``s3_transfer``."""
+    return _monitor
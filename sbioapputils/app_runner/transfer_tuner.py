@@ -0,0 +1,184 @@
+import json
+import logging
+import math
+import os
+import random
+import threading
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+# Chunk sizes the tuner may pick from.  S3 allows at most 10,000 parts,
+# which sets a lower bound for very large files.
+CHUNK_SIZES = [8 * MB, 16 * MB, 32 * MB, 64 * MB, 128 * MB, 256 * MB, 512 * MB]
+MAX_PARTS = 10000
+MIN_CONCURRENCY = 2
+# Transfers smaller than this are dominated by request latency and say
+# little about achievable bandwidth, so they are not recorded.
+MIN_RECORDED_SIZE = 64 * MB
+
+_EWMA_ALPHA = 0.3
+
+
+def static_tier(file_size):
+    """Return the (chunk, concurrency) of the original fixed size tiers.
+
+    Small files  (< 1 GB):  16 MB chunks, 10 threads
+    Medium files (< 10 GB): 64 MB chunks, 15 threads
+    Large files  (>= 10 GB): 256 MB chunks, 20 threads
+    """
+    if file_size < 1 * GB:
+        return 16 * MB, 10
+    elif file_size < 10 * GB:
+        return 64 * MB, 15
+    else:
+        return 256 * MB, 20
+
+
+def default_stats_path():
+    return os.environ.get(
+        "SBIO_TRANSFER_STATS",
+        os.path.join(os.path.expanduser("~"), ".cache", "sbioapputils", "transfer_stats.json"),
+    )
+
+
+class TransferTuner:
+    """Choose chunk size and thread count from throughput measured on this host.
+
+    Transfers are grouped into size classes (powers of four from 64 MB).
+    For each class the tuner keeps an exponentially weighted average of the
+    throughput achieved by every (chunk, concurrency) pair it has tried and
+    usually picks the best one.  With probability ``explore_rate`` it tries
+    a neighbour of the best pair instead (chunk halved or doubled, threads
+    stepped down or up), so it hill-climbs towards the configuration that
+    saturates the network without piling on threads that do not help.
+
+    Thread counts are bounded by the S3 client's connection pool and by the
+    CPU count.  The first transfer of a class starts from ``static_tier``.
+    Results are persisted as JSON at ``path`` so later jobs on the same
+    host start from what earlier ones learned.
+    """
+
+    def __init__(self, path=None, explore_rate=0.2, cpu_count=None, rng=None):
+        self.path = path
+        self.explore_rate = explore_rate
+        self.cpu_count = cpu_count or os.cpu_count() or 1
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._stats = self._load()
+
+    def concurrency_limits(self, max_pool_connections=None):
+        upper = max(MIN_CONCURRENCY, min(4 * self.cpu_count, 64))
+        if max_pool_connections:
+            upper = max(1, min(upper, max_pool_connections))
+        return min(MIN_CONCURRENCY, upper), upper
+
+    def choose(self, file_size, max_pool_connections=None):
+        """Return the (chunk, concurrency) to use for a transfer of ``file_size`` bytes."""
+        low, high = self.concurrency_limits(max_pool_connections)
+        chunks = self._allowed_chunks(file_size)
+        with self._lock:
+            tried = self._stats.get(self._size_class(file_size), {})
+            candidates = {}
+            for name, entry in tried.items():
+                chunk, concurrency = (int(v) for v in name.split(":"))
+                if chunk in chunks and low <= concurrency <= high:
+                    candidates[(chunk, concurrency)] = entry["mbps"]
+
+        if not candidates:
+            chunk, concurrency = static_tier(file_size)
+            return self._nearest_chunk(chunk, chunks), max(low, min(concurrency, high))
+
+        best = max(candidates, key=candidates.get)
+        if self.rng.random() >= self.explore_rate:
+            return best
+        neighbours = self._neighbours(best, chunks, low, high)
+        untried = [n for n in neighbours if n not in candidates]
+        return self.rng.choice(untried or neighbours or [best])
+
+    def record(self, file_size, chunk, concurrency, elapsed):
+        """Record the outcome of a transfer and persist the updated statistics."""
+        if file_size < MIN_RECORDED_SIZE or elapsed <= 0:
+            return
+        mbps = file_size / MB / elapsed
+        name = f"{chunk}:{concurrency}"
+        with self._lock:
+            entries = self._stats.setdefault(self._size_class(file_size), {})
+            entry = entries.get(name)
+            if entry:
+                entry["mbps"] = (1 - _EWMA_ALPHA) * entry["mbps"] + _EWMA_ALPHA * mbps
+                entry["n"] += 1
+            else:
+                entries[name] = {"mbps": mbps, "n": 1}
+            self._save()
+
+    @staticmethod
+    def _size_class(file_size):
+        if file_size < MIN_RECORDED_SIZE:
+            return "0"
+        return str(int(math.log(file_size / MIN_RECORDED_SIZE, 4)) + 1)
+
+    @staticmethod
+    def _allowed_chunks(file_size):
+        min_chunk = math.ceil(file_size / MAX_PARTS)
+        allowed = [c for c in CHUNK_SIZES if c >= min_chunk]
+        return allowed or [max(CHUNK_SIZES[-1], min_chunk)]
+
+    @staticmethod
+    def _nearest_chunk(chunk, chunks):
+        return min(chunks, key=lambda c: abs(math.log2(c / chunk)))
+
+    @staticmethod
+    def _neighbours(pair, chunks, low, high):
+        chunk, concurrency = pair
+        step = max(1, concurrency // 4)
+        result = []
+        i = chunks.index(chunk) if chunk in chunks else None
+        if i is not None and i > 0:
+            result.append((chunks[i - 1], concurrency))
+        if i is not None and i + 1 < len(chunks):
+            result.append((chunks[i + 1], concurrency))
+        if concurrency - step >= low:
+            result.append((chunk, concurrency - step))
+        if concurrency + step <= high:
+            result.append((chunk, concurrency + step))
+        return result
+
+    def _load(self):
+        if not self.path:
+            return {}
+        try:
+            with open(self.path) as f:
+                stats = json.load(f)
+            return stats if isinstance(stats, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._stats, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not persist transfer statistics to %s: %s", self.path, e)
+
+
+_default_tuner = None
+_default_tuner_lock = threading.Lock()
+
+
+def get_default_tuner():
+    """Return the process-wide tuner, or None if ``SBIO_TRANSFER_TUNING`` disables tuning."""
+    global _default_tuner
+    if os.environ.get("SBIO_TRANSFER_TUNING", "true").lower() in ("false", "0", "no"):
+        return None
+    with _default_tuner_lock:
+        if _default_tuner is None:
+            _default_tuner = TransferTuner(default_stats_path())
+        return _default_tuner
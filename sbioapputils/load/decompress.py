@@ -22,3 +22,61 @@ def decompress(src: str, dest: str):
             zip_ref.extractall(dest)
     else:
         pass
+
+
+STREAMABLE_EXTENSIONS = ("tar.gz", "tgz", "tar.bz2", "tar.xz", "tar", "gz")
+
+
+def is_streamable(name: str):
+    # zip archives keep their index at the end and need seekable input
+    return name.lower().endswith(STREAMABLE_EXTENSIONS)
+
+
+def _safe_path(dest: str, name: str):
+    dest_root = os.path.realpath(dest)
+    target = os.path.realpath(os.path.join(dest_root, name))
+    if os.path.isabs(name) or os.path.commonpath([dest_root, target]) != dest_root:
+        raise ValueError(f"Refusing to extract {name!r} outside of {dest}")
+    return target
+
+
+def _check_tar_member(dest: str, member: tarfile.TarInfo):
+    _safe_path(dest, member.name)
+    if member.issym():
+        _safe_path(dest, os.path.join(os.path.dirname(member.name), member.linkname))
+    elif member.islnk():
+        _safe_path(dest, member.linkname)
+    elif not (member.isfile() or member.isdir()):
+        raise ValueError(f"Refusing to extract special file {member.name!r}")
+
+
+def extract_stream(fileobj, name: str, dest: str):
+    # fileobj (non-seekable binary stream, e.g. an S3 response body)
+    # name (source file name, used to pick the format from its extension)
+    # dest (destination directory path)
+    # member paths that would escape dest, and device files, are rejected
+
+    os.makedirs(dest, exist_ok=True)
+    lower = name.lower()
+    if lower.endswith(("tar.gz", "tgz", "tar.bz2", "tar.xz", "tar")):
+        if lower.endswith("tar"):
+            compression = ""
+        elif lower.endswith("bz2"):
+            compression = "bz2"
+        elif lower.endswith("xz"):
+            compression = "xz"
+        else:
+            compression = "gz"
+        with tarfile.open(fileobj=fileobj, mode=f"r|{compression}") as tar:
+            for member in tar:
+                _check_tar_member(dest, member)
+                if hasattr(tarfile, "data_filter"):
+                    tar.extract(member, dest, filter="data")
+                else:
+                    tar.extract(member, dest)
+    elif lower.endswith("gz"):
+        target = _safe_path(dest, os.path.basename(name)[:-len(".gz")])
+        with gzip.GzipFile(fileobj=fileobj, mode="rb") as f_in, open(target, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+    else:
+        raise ValueError(f"{name} cannot be extracted from a stream")
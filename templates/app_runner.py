@@ -4,13 +4,21 @@ import traceback
 import time
 import sys
 import json
+import os
 from os.path import exists
 from sbioapputils.app_runner.app_runner_utils import AppRunnerUtils
+from sbioapputils.app_runner.control_plane import ControlPlaneClient
+from sbioapputils.app_runner.job_config import CONFIG_FILE_ENV, JobConfig
 from sbioapputils.app_runner.workflow_utils import parse_workflow, set_defaults, set_numeric, create_directories, validate_request, remove_empty_keys
 from sbioapputils.app_runner.dev_utils import get_yaml, payload_from_yaml
 
+# payload written by the app itself, else derived from the workflow yaml
+RESULTS_FOR_PAYLOAD = '/app/results_for_payload.json'
+RESULTS_FOR_UPLOAD = '/app/results_for_upload.json'
+WORKFLOW_FILE = '/app/workflow.yml'
 
-def _process_stage(stage_name, stage_value, config):
+
+def _process_stage(stage_name, stage_value, config, config_file=None):
     logging.info(f'Stage {stage_name} starting')
     start_time = time.time()
     sub_process_list = ['python', 'app/' + stage_value['file']]
@@ -20,7 +28,9 @@ def _process_stage(stage_name, stage_value, config):
     for key, value in config['input_files'].items():
         sub_process_list.append("--" + key)
         sub_process_list.append(str(value))
-    process = subprocess.Popen(sub_process_list, stdout=subprocess.PIPE)
+    # stages can also load the whole config with JobConfig.load()
+    env = dict(os.environ, **{CONFIG_FILE_ENV: os.path.abspath(config_file)}) if config_file else None
+    process = subprocess.Popen(sub_process_list, stdout=subprocess.PIPE, env=env)
     while True:
         line = process.stdout.readline()
         if not line:
@@ -36,38 +46,46 @@ def _process_stage(stage_name, stage_value, config):
     logging.info(f'Stage {stage_name} completed in {end_time - start_time} seconds')
 
 
-def _upload_results(job_id: str):
+def _upload_results(job_id: str, control: ControlPlaneClient):
 
     #reads payload json if generated by code, otherwise gets from yaml
-    if (exists('/app/results_for_payload.json')) and (exists('/app/results_for_upload.json')):
+    if (exists(RESULTS_FOR_PAYLOAD)) and (exists(RESULTS_FOR_UPLOAD)):
         logging.info("Generating payload from custom json")
-        with open('/app/results_for_payload.json', 'r') as f:
+        with open(RESULTS_FOR_PAYLOAD, 'r') as f:
             results_for_payload = json.load(f)
-        with open('/app/results_for_upload.json', 'r') as f:
+        with open(RESULTS_FOR_UPLOAD, 'r') as f:
             results_for_upload = json.load(f)
     else:
         logging.info("Generating payload from yaml file")
-        results_for_payload, results_for_upload = payload_from_yaml('/app/workflow.yml')
+        results_for_payload, results_for_upload = payload_from_yaml(WORKFLOW_FILE)
     results_for_payload = remove_empty_keys(results_for_payload)
     
     #upload results
     logging.info('Payload:')
     logging.info(results_for_payload)
 
-    AppRunnerUtils.upload_results(job_id, results_for_payload)
     logging.info('Additional artifacts:')
     logging.info(results_for_upload)
-    for element in results_for_upload:
-        AppRunnerUtils.upload_file(job_id, element)
-    AppRunnerUtils.set_job_completed(job_id, results_for_payload)
+    AppRunnerUtils.upload_results(job_id, results_for_payload, additional_files=results_for_upload)
+    # the final status must be accepted before the job counts as done
+    control.set_job_completed(results_for_payload).result()
 
 
 def main():
     job_log_file = 'job.log'
+    job_config_file = 'job_config.json'
+    transfer_metrics_file = 'transfer_metrics.json'
     AppRunnerUtils.set_logging(job_log_file)
     job_id = sys.argv[1]
+    prefetcher = None
+    # job.log goes up in segments while the job runs, and whole at the end
+    log_shipper = AppRunnerUtils.ship_logs(job_id, job_log_file)
+    # status updates and heartbeats go out in the background
+    control = ControlPlaneClient(job_id)
     try:
         request = AppRunnerUtils.get_job_config(job_id)
+        # with SBIO_PREFETCH_INPUTS, fetch inputs while the workflow is validated and the job is marked running
+        prefetcher = AppRunnerUtils.prefetch_inputs(request.get('input_files', {}))
         stages, parameters = parse_workflow(request)
         request = set_defaults(request, parameters, job_id)
         request = set_numeric(request, parameters)
@@ -79,21 +97,31 @@ def main():
         if output_errors:
             raise Exception(f"Invalid json request:\n {output_errors}")
         
-        AppRunnerUtils.set_job_running(job_id)
+        # the job must be accepted as running before any compute starts
+        control.set_job_running().result()
         logging.info(f'Job {job_id} is running')
+        JobConfig(request).dump(job_config_file)
         
         for stage_name, stage_value in stages.items():
-            _process_stage(stage_name, stage_value, request)
-        _upload_results(job_id)
+            control.set_stage(stage_name)
+            _process_stage(stage_name, stage_value, request, job_config_file)
+        control.set_stage('upload')
+        _upload_results(job_id, control)
         
     except Exception as e:
         err = str(e)
-        AppRunnerUtils.set_job_failed(job_id, err)
+        control.set_job_failed(err)
         logging.error(traceback.format_exc())
         
     finally:
+        if prefetcher:
+            prefetcher.shutdown()
         # upload log files to S3
-        AppRunnerUtils.upload_file(job_id, job_log_file)
+        AppRunnerUtils.export_transfer_metrics(job_id, transfer_metrics_file)
+        control.close()
+        if log_shipper:
+            log_shipper.close()
+        AppRunnerUtils.upload_result_files(job_id, [transfer_metrics_file, job_log_file])
 
 
 if __name__ == '__main__':
@@ -1,6 +1,7 @@
 from io import BytesIO
 
 
+BUCKET = 'test-bucket'
 INPUT_FILES_PATH = 'tests/test_sbioapputils/input_files'
 
 
@@ -0,0 +1,14 @@
+import pytest
+
+from tests.test_sbioapputils import BUCKET
+
+
+@pytest.fixture
+def s3_client():
+    """A moto S3 client with an empty ``test-bucket``."""
+    boto3 = pytest.importorskip("boto3")
+    moto = pytest.importorskip("moto")
+    with moto.mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
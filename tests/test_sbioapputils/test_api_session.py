@@ -0,0 +1,54 @@
+import pytest
+import requests
+
+from benchmarks.fake_sbio_api import FakeSbioApi
+from sbioapputils.app_runner import api_session
+from sbioapputils.app_runner.api_token import get_token_cache
+from sbioapputils.app_runner.app_runner_utils import AppRunnerUtils
+
+
+@pytest.fixture
+def api(monkeypatch):
+    with FakeSbioApi() as server:
+        monkeypatch.setenv('SBIO_API_URL', server.url)
+        monkeypatch.setenv('APP_USER', 'runner@example.com')
+        monkeypatch.setattr(api_session, 'RETRY_BACKOFF', 0)
+        monkeypatch.setattr(api_session, '_session', api_session.new_api_session())
+        get_token_cache().invalidate()
+        yield server
+    get_token_cache().invalidate()
+
+
+class TestApiSession:
+
+    def test_calls_share_connection_and_login(self, api):
+        AppRunnerUtils.set_job_running('1')
+        assert AppRunnerUtils.get_job_folder('1') == 'jobs/1/'
+        assert AppRunnerUtils.verify_user_has_enough_credits('1', 10)
+        assert api.logins == 1
+        assert api.connections == 1
+
+    def test_idempotent_call_is_retried(self, api):
+        api.fail_next('PUT', '/api/jobs/{id}/completed', 503, 502)
+        AppRunnerUtils.set_job_completed('1', {'a': 'b'})
+        assert api.counts['PUT /api/jobs/{id}/completed'] == 3
+        assert api.statuses['1'] == ['completed']
+
+    def test_post_is_not_retried_after_response(self, api):
+        api.fail_next('POST', '/login', 503)
+        with pytest.raises(requests.HTTPError):
+            AppRunnerUtils.get_api_token()
+        assert api.counts['POST /login'] == 1 and api.logins == 0
+
+    def test_rejected_token_is_renewed(self, api):
+        AppRunnerUtils.get_job_folder('1')
+        api.expire_tokens()
+        assert AppRunnerUtils.get_job_folder('1') == 'jobs/1/'
+        assert api.logins == 2
+        assert api.counts['GET /api/jobs/{id}/folder'] == 3
+
+    def test_timeout_from_environment(self, monkeypatch):
+        monkeypatch.setenv('SBIO_API_TIMEOUT', '2,30')
+        assert api_session.api_timeout() == (2.0, 30.0)
+        monkeypatch.setenv('SBIO_API_TIMEOUT', '10')
+        assert api_session.api_timeout() == (10.0, 10.0)
@@ -0,0 +1,100 @@
+import base64
+import json
+import threading
+import time
+
+from sbioapputils.app_runner.api_token import TokenCache, token_expiry
+
+
+def _jwt(exp):
+    claims = base64.urlsafe_b64encode(json.dumps({'sub': 'app', 'exp': exp}).encode()).rstrip(b'=').decode()
+    return f'eyJhbGciOiJIUzI1NiJ9.{claims}.signature'
+
+
+class _Clock:
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenCache:
+
+    def test_reuses_token_until_refresh_margin(self):
+        clock = _Clock()
+        cache = TokenCache(refresh_margin=60, clock=clock)
+        tokens = iter([_jwt(1300), _jwt(1600)])
+
+        def login():
+            return {'access_token': next(tokens)}
+
+        first = cache.get('api', login)
+        clock.now = 1200
+        assert cache.get('api', login) == first
+        clock.now = 1250
+        assert cache.get('api', login) == _jwt(1600)
+        assert cache.logins == 2
+
+    def test_expiry_from_response_or_default(self):
+        assert token_expiry(_jwt(1234)) == 1234
+        assert token_expiry('opaque', {'expires_in': 30}, now=100) == 130
+        assert token_expiry('opaque', {}) is None
+        clock = _Clock()
+        cache = TokenCache(refresh_margin=10, default_ttl=100, clock=clock)
+        cache.get('api', lambda: {'access_token': 'opaque'})
+        clock.now = 1095
+        cache.get('api', lambda: {'access_token': 'opaque'})
+        assert cache.logins == 2
+
+    def test_concurrent_callers_share_one_login(self):
+        cache = TokenCache()
+
+        def login():
+            time.sleep(0.05)
+            return {'access_token': _jwt(time.time() + 3600)}
+
+        threads = [threading.Thread(target=cache.get, args=('api', login)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert cache.logins == 1
+
+    def test_refresh_and_invalidate(self):
+        cache = TokenCache()
+
+        def login():
+            return {'access_token': _jwt(time.time() + 3600)}
+
+        cache.get('api', login)
+        cache.get('api', login, refresh=True)
+        cache.invalidate('api')
+        cache.get('api', login)
+        assert cache.logins == 3
+
+
+class _Response:
+    ok = True
+    status_code = 200
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+def test_app_runner_logs_in_once(monkeypatch):
+    from sbioapputils.app_runner import app_runner_utils
+    from sbioapputils.app_runner.app_runner_utils import AppRunnerUtils
+    calls = []
+    monkeypatch.setenv('SBIO_API_URL', 'http://api.test-token')
+    monkeypatch.setenv('APP_USER', 'runner@example.com')
+    token = _jwt(time.time() + 3600)
+    monkeypatch.setattr(app_runner_utils.get_api_session(), 'post',
+                        lambda url, json, timeout: calls.append(url) or _Response({'access_token': token}))
+    tokens = {AppRunnerUtils.get_api_token() for _ in range(5)}
+    assert len(tokens) == 1
+    assert calls == ['http://api.test-token/login']
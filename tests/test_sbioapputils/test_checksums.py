@@ -0,0 +1,32 @@
+import base64
+import hashlib
+import os
+import zlib
+
+from sbioapputils.app_runner import checksums
+
+
+def _digests(algorithm, parts):
+    digests = []
+    for part in parts:
+        hasher = checksums.new(algorithm)
+        hasher.update(part)
+        digests.append(hasher.digest())
+    return digests
+
+
+class TestChecksums:
+
+    def test_crc32_parts_combine_into_whole_object_crc(self):
+        data = os.urandom(300001)
+        parts = [data[:100000], data[100000:200000], data[200000:]]
+        combined = checksums.full_object('crc32', _digests('crc32', parts), [len(p) for p in parts])
+        assert combined == base64.b64encode(zlib.crc32(data).to_bytes(4, 'big')).decode()
+
+    def test_composite_matches_s3_format(self):
+        parts = [b'a' * 10, b'b' * 5]
+        digests = [hashlib.sha256(p).digest() for p in parts]
+        expected = base64.b64encode(hashlib.sha256(b''.join(digests)).digest()).decode() + '-2'
+        assert checksums.composite('sha256', digests) == expected
+        assert checksums.full_object('sha256', digests, [10, 5]) is None
+        assert checksums.normalize('"' + expected + '"') == expected[:-2]
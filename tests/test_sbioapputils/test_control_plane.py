@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from sbioapputils.app_runner.app_runner_utils import AppRunnerUtils
+from sbioapputils.app_runner.control_plane import ControlPlaneClient
+
+
+@pytest.fixture
+def api_calls(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def record(name, delay=0):
+        def call(cls, job_id, *args):
+            time.sleep(delay)
+            with lock:
+                calls.append((name, job_id) + args)
+        return classmethod(call)
+
+    monkeypatch.setattr(AppRunnerUtils, 'set_job_running', record('running', delay=0.1))
+    monkeypatch.setattr(AppRunnerUtils, 'set_job_completed', record('completed'))
+    monkeypatch.setattr(AppRunnerUtils, 'set_job_failed', record('failed'))
+    monkeypatch.setattr(AppRunnerUtils, 'send_heartbeat', record('heartbeat'))
+    return calls
+
+
+class TestControlPlaneClient:
+
+    def test_status_updates_are_ordered_and_non_blocking(self, api_calls):
+        client = ControlPlaneClient('job-1', heartbeat_interval=0)
+        start = time.time()
+        running = client.set_job_running()
+        completed = client.set_job_completed({'a': 'b'})
+        assert time.time() - start < 0.05
+        assert completed.result(5) is None and running.done()
+        client.close()
+        assert api_calls == [('running', 'job-1'), ('completed', 'job-1', {'a': 'b'}, 0)]
+
+    def test_heartbeats_report_stage(self, api_calls):
+        with ControlPlaneClient('job-1', heartbeat_interval=0.02) as client:
+            client.set_stage('align', progress=0.5)
+            time.sleep(0.2)
+        beats = [c for c in api_calls if c[0] == 'heartbeat']
+        assert beats and beats[-1][2]['stage'] == 'align' and beats[-1][2]['progress'] == 0.5
+        count = len(beats)
+        time.sleep(0.05)
+        assert len([c for c in api_calls if c[0] == 'heartbeat']) == count
+
+    def test_missing_heartbeat_endpoint_stops_heartbeats(self, monkeypatch):
+        response = requests.Response()
+        response.status_code = 404
+        calls = []
+
+        def heartbeat(cls, job_id, payload):
+            calls.append(payload)
+            raise requests.HTTPError(response=response)
+
+        monkeypatch.setattr(AppRunnerUtils, 'send_heartbeat', classmethod(heartbeat))
+        with ControlPlaneClient('job-1', heartbeat_interval=0.01) as client:
+            time.sleep(0.1)
+        assert len(calls) == 1
+        assert client.failures == []
+
+    def test_heartbeats_need_an_endpoint(self, api_calls, monkeypatch):
+        monkeypatch.delenv('SBIO_HEARTBEAT_PATH', raising=False)
+        monkeypatch.setenv('SBIO_HEARTBEAT_INTERVAL', '0.01')
+        with ControlPlaneClient('job-1') as client:
+            assert client.heartbeat_interval == 0
+        monkeypatch.setenv('SBIO_HEARTBEAT_PATH', '/api/jobs/{job_id}/heartbeat')
+        with ControlPlaneClient('job-1') as client:
+            time.sleep(0.1)
+        assert client.heartbeats and [c for c in api_calls if c[0] == 'heartbeat']
+
+    def test_close_flushes_and_records_failures(self, api_calls):
+        client = ControlPlaneClient('job-1', heartbeat_interval=0)
+
+        def broken():
+            raise RuntimeError('boom')
+
+        failed = client.submit(broken, ordered=False)
+        client.set_job_running()
+        client.set_job_failed('error')
+        client.close()
+        assert [c[0] for c in api_calls] == ['running', 'failed']
+        assert isinstance(failed.exception(), RuntimeError)
+        assert client.failures[0][0] == 'broken'
+        with pytest.raises(RuntimeError):
+            client.set_job_running()
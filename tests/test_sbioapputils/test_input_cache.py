@@ -0,0 +1,66 @@
+import os
+
+from sbioapputils.app_runner.input_cache import InputCache
+from tests.test_sbioapputils import BUCKET
+
+
+class TestInputCache:
+
+    def test_hit_is_not_downloaded_again(self, s3_client, tmp_path):
+        s3_client.put_object(Bucket=BUCKET, Key='ref/genome.fa', Body=b'ACGT' * 100)
+        cache = InputCache(str(tmp_path / 'cache'))
+        assert not cache.fetch(s3_client, BUCKET, 'ref/genome.fa', str(tmp_path / 'job1' / 'genome.fa'))
+        assert cache.fetch(s3_client, BUCKET, 'ref/genome.fa', str(tmp_path / 'job2' / 'genome.fa'))
+        assert open(tmp_path / 'job2' / 'genome.fa', 'rb').read() == b'ACGT' * 100
+
+    def test_changed_object_misses(self, s3_client, tmp_path):
+        cache = InputCache(str(tmp_path / 'cache'))
+        dest = str(tmp_path / 'data.csv')
+        s3_client.put_object(Bucket=BUCKET, Key='data.csv', Body=b'a,b\n1,2\n')
+        cache.fetch(s3_client, BUCKET, 'data.csv', dest)
+        s3_client.put_object(Bucket=BUCKET, Key='data.csv', Body=b'a,b\n3,4\n')
+        assert not cache.fetch(s3_client, BUCKET, 'data.csv', dest)
+        assert open(dest, 'rb').read() == b'a,b\n3,4\n'
+
+    def test_lru_eviction(self, s3_client, tmp_path):
+        cache = InputCache(str(tmp_path / 'cache'), max_bytes=250)
+        for i, name in enumerate(['a', 'b', 'c']):
+            s3_client.put_object(Bucket=BUCKET, Key=name, Body=b'x' * 100)
+            cache.fetch(s3_client, BUCKET, name, str(tmp_path / name))
+            entry = os.path.join(cache.objects_dir, cache.entry_name(
+                BUCKET, name, s3_client.head_object(Bucket=BUCKET, Key=name)['ETag']))
+            if os.path.exists(entry):
+                os.utime(entry, (1000 + i, 1000 + i))
+        # 'a' was least recently used and has been evicted
+        assert not cache.fetch(s3_client, BUCKET, 'a', str(tmp_path / 'a2'))
+        assert cache.fetch(s3_client, BUCKET, 'c', str(tmp_path / 'c2'))
+
+    def test_hits_are_private_writable_copies(self, s3_client, tmp_path):
+        s3_client.put_object(Bucket=BUCKET, Key='data.csv', Body=b'a,b\n1,2\n')
+        cache = InputCache(str(tmp_path / 'cache'))
+        dest = tmp_path / 'data.csv'
+        cache.fetch(s3_client, BUCKET, 'data.csv', str(dest))
+        with open(dest, 'a') as f:
+            f.write('3,4\n')
+        assert cache.fetch(s3_client, BUCKET, 'data.csv', str(tmp_path / 'again.csv'))
+        assert (tmp_path / 'again.csv').read_bytes() == b'a,b\n1,2\n'
+
+    def test_hardlinks_are_opt_in(self, s3_client, tmp_path, monkeypatch):
+        monkeypatch.setenv('SBIO_INPUT_CACHE_DIR', str(tmp_path / 'cache'))
+        monkeypatch.setenv('SBIO_INPUT_CACHE_HARDLINK', 'true')
+        s3_client.put_object(Bucket=BUCKET, Key='data.csv', Body=b'a,b\n1,2\n')
+        cache = InputCache.from_env()
+        cache.fetch(s3_client, BUCKET, 'data.csv', str(tmp_path / 'data.csv'))
+        assert os.stat(tmp_path / 'data.csv').st_nlink == 2
+
+    def test_damaged_entry_is_downloaded_again(self, s3_client, tmp_path):
+        s3_client.put_object(Bucket=BUCKET, Key='data.csv', Body=b'a,b\n1,2\n')
+        cache = InputCache(str(tmp_path / 'cache'))
+        cache.fetch(s3_client, BUCKET, 'data.csv')
+        entry = os.path.join(cache.objects_dir, cache.entry_name(
+            BUCKET, 'data.csv', s3_client.head_object(Bucket=BUCKET, Key='data.csv')['ETag']))
+        os.chmod(entry, 0o644)
+        with open(entry, 'ab') as f:
+            f.write(b'garbage')
+        assert not cache.fetch(s3_client, BUCKET, 'data.csv', str(tmp_path / 'data.csv'))
+        assert (tmp_path / 'data.csv').read_bytes() == b'a,b\n1,2\n'
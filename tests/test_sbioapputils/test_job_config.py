@@ -0,0 +1,95 @@
+import pytest
+
+from sbioapputils.app_runner.app_runner_utils import AppRunnerUtils
+from sbioapputils.app_runner.job_config import CONFIG_FILE_ENV, JobConfig, decode_config
+
+CONFIG = {
+    'input_files': {
+        'reads': [{'path': f'data/sample_{i}.fastq', 'additional_info': {}} for i in range(1000)],
+        'reference': [{'path': 'user/genome.fa', 'additional_info': {'user_data': True}}],
+    },
+}
+
+
+@pytest.fixture
+def job_env(monkeypatch):
+    monkeypatch.setenv('JOB_ID', 'job-1')
+    monkeypatch.setenv('JOB_CONFIG', repr(CONFIG))
+    monkeypatch.setattr(AppRunnerUtils, '_job_configs', {})
+    monkeypatch.setattr(AppRunnerUtils, '_job_config_dicts', {})
+    calls = []
+    fetch = AppRunnerUtils._fetch_job_config_v2.__func__
+    monkeypatch.setattr(AppRunnerUtils, '_fetch_job_config_v2',
+                        classmethod(lambda cls, job_id: calls.append(job_id) or fetch(cls, job_id)))
+    return calls
+
+
+class TestJobConfigV2:
+
+    def test_fetched_once_per_job(self, job_env):
+        config = AppRunnerUtils.get_job_config_object('job-1')
+        assert config.to_dict() == CONFIG
+        assert AppRunnerUtils.get_job_config_object('job-1') is config
+        AppRunnerUtils.get_job_config_object('job-1', refresh=True)
+        assert job_env == ['job-1', 'job-1']
+
+    def test_v2_dict_is_thawed_once(self, job_env):
+        config = AppRunnerUtils.get_job_config_v2('job-1')
+        assert config == CONFIG and isinstance(config['input_files']['reads'], list)
+        assert AppRunnerUtils.get_job_config_v2('job-1') is config
+        index = AppRunnerUtils._get_input_file_index(config)
+        assert AppRunnerUtils._get_input_file_index(AppRunnerUtils.get_job_config_v2('job-1')) is index
+        refreshed = AppRunnerUtils.get_job_config_v2('job-1', refresh=True)
+        assert refreshed == CONFIG and refreshed is not config
+        assert job_env == ['job-1', 'job-1']
+
+    def test_remote_lookup(self, job_env, monkeypatch):
+        config = AppRunnerUtils.get_job_config_object('job-1')
+        assert AppRunnerUtils.get_file_is_remote('user/genome.fa', config) is True
+        assert AppRunnerUtils.get_file_is_remote('data/sample_7.fastq', config) is False
+        assert AppRunnerUtils.get_file_is_remote('unknown.txt', config) is None
+        monkeypatch.setenv('EXTERNAL_BUCKET', 'user-bucket')
+        assert AppRunnerUtils._get_input_external_bucket('user/genome.fa') == 'user-bucket'
+        assert AppRunnerUtils._get_input_external_bucket('data/sample_1.fastq') is None
+        assert job_env == ['job-1']
+
+    def test_no_external_bucket_skips_config(self, job_env, monkeypatch):
+        monkeypatch.delenv('EXTERNAL_BUCKET', raising=False)
+        assert AppRunnerUtils._get_input_external_bucket('user/genome.fa') is None
+        assert job_env == []
+
+
+class TestJobConfigObject:
+
+    def test_decodes_json_and_python_literals(self):
+        assert decode_config('{"a": true, "b": null}') == {'a': True, 'b': None}
+        assert decode_config(repr(CONFIG)) == CONFIG
+        with pytest.raises(ValueError):
+            decode_config("__import__('os').system('true')")
+
+    def test_read_only_with_indexed_inputs(self):
+        config = JobConfig.from_string(repr(CONFIG))
+        assert JobConfig.from_string(repr(CONFIG)) is config
+        assert config.input_file('user/genome.fa')['additional_info']['user_data'] is True
+        assert config.input_file('missing') is None
+        with pytest.raises(TypeError):
+            config['input_files']['reads'] = []
+        with pytest.raises(AttributeError):
+            config.extra = 1
+        copy = config.to_dict()
+        copy['input_files']['reads'].clear()
+        assert len(config['input_files']['reads']) == 1000
+
+    def test_file_for_stage_subprocesses(self, tmp_path, monkeypatch):
+        path = JobConfig({'alpha': 0.5, **CONFIG}).dump(str(tmp_path / 'job_config.json'))
+        monkeypatch.setenv(CONFIG_FILE_ENV, path)
+        monkeypatch.setenv('JOB_CONFIG', '{}')
+        config = JobConfig.from_env()
+        assert config['alpha'] == 0.5 and config.to_dict()['input_files'] == CONFIG['input_files']
+
+    def test_run_by_admin(self, monkeypatch):
+        for value, expected in (('True', True), ('false', False), ('0', False)):
+            monkeypatch.setenv('RUN_BY_ADMIN', value)
+            assert AppRunnerUtils.get_job_run_by_admin() is expected
+        monkeypatch.delenv('RUN_BY_ADMIN')
+        assert AppRunnerUtils.get_job_run_by_admin() is False
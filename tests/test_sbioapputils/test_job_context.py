@@ -0,0 +1,42 @@
+import pytest
+
+from sbioapputils.app_runner.app_runner_utils import AppRunnerUtils
+from sbioapputils.app_runner.storage import LocalStorageClient
+
+
+@pytest.fixture
+def job(tmp_path, monkeypatch):
+    monkeypatch.setenv('SBIO_STORAGE_BACKEND', 'local')
+    monkeypatch.setenv('SBIO_LOCAL_STORAGE_ROOT', str(tmp_path / 'store'))
+    monkeypatch.setenv('AWS_DATASET_BUCKET', 'results')
+    monkeypatch.delenv('EXTERNAL_BUCKET', raising=False)
+    monkeypatch.setattr(AppRunnerUtils, '_job_contexts', {})
+    lookups = []
+    monkeypatch.setattr(AppRunnerUtils, 'get_job_folder',
+                        classmethod(lambda cls, job_id: lookups.append(job_id) or f'jobs/{job_id}/'))
+    monkeypatch.chdir(tmp_path)
+    for i in range(5):
+        (tmp_path / f'artifact_{i}.txt').write_text(str(i))
+    return lookups
+
+
+class TestJobContext:
+
+    def test_uploads_share_one_folder_lookup(self, job):
+        for i in range(5):
+            AppRunnerUtils.upload_file('7', f'artifact_{i}.txt')
+        AppRunnerUtils.upload_result_files('7', ['artifact_0.txt', 'artifact_1.txt'])
+        assert job == ['7']
+        context = AppRunnerUtils.get_job_context('7')
+        assert isinstance(context.s3_client, LocalStorageClient)
+        body = context.s3_client.get_object(Bucket='results', Key='jobs/7/artifact_3.txt')['Body'].read()
+        assert body == b'3'
+
+    def test_resolved_per_job_and_output_bucket(self, job, monkeypatch):
+        AppRunnerUtils.get_job_context('7')
+        AppRunnerUtils.get_job_context('8')
+        monkeypatch.setenv('EXTERNAL_BUCKET', 'user-bucket')
+        monkeypatch.setenv('SAVE_RESULTS_TO_USER_DATA', 'true')
+        assert AppRunnerUtils.get_job_context('7').bucket == 'user-bucket'
+        AppRunnerUtils.get_job_context('7', refresh=True)
+        assert job == ['7', '8', '7', '7']
@@ -0,0 +1,67 @@
+import gzip
+import time
+
+from sbioapputils.app_runner.app_runner_utils import AppRunnerUtils
+from sbioapputils.app_runner.log_shipper import LogShipper
+from sbioapputils.app_runner.storage import LocalStorageClient
+
+BUCKET = 'logs'
+
+
+def _shipped(client, prefix):
+    keys = [o['Key'] for o in client.list_objects_v2(Bucket=BUCKET, Prefix=prefix).get('Contents', [])]
+    return keys, gzip.decompress(b''.join(client.get_object(Bucket=BUCKET, Key=k)['Body'].read() for k in keys))
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestLogShipper:
+
+    def test_ships_segments_while_log_grows(self, tmp_path):
+        client = LocalStorageClient(str(tmp_path / 'store'))
+        log = tmp_path / 'job.log'
+        log.write_bytes(b'stage 1 starting\n')
+        shipper = LogShipper(str(log), lambda: (client, BUCKET, 'jobs/1/job.log.segments/'), interval=0.05, poll=0.01)
+        shipper.start()
+        assert _wait_for(lambda: shipper.segments == 1)
+        with open(log, 'ab') as f:
+            f.write(b'stage 1 completed\n')
+        shipper.close()
+        keys, content = _shipped(client, 'jobs/1/job.log.segments/')
+        assert keys == ['jobs/1/job.log.segments/00000.gz', 'jobs/1/job.log.segments/00001.gz']
+        assert content == log.read_bytes()
+
+    def test_size_threshold_and_truncation(self, tmp_path):
+        client = LocalStorageClient(str(tmp_path / 'store'))
+        log = tmp_path / 'job.log'
+        log.write_bytes(b'x' * 2500)
+        shipper = LogShipper(str(log), lambda: (client, BUCKET, 'seg/'), interval=3600, segment_bytes=1000, poll=0.01)
+        shipper.start()
+        assert _wait_for(lambda: shipper.segments == 3)
+        log.write_bytes(b'new log\n')
+        shipper.close()
+        keys, content = _shipped(client, 'seg/')
+        assert len(keys) == 4
+        assert content == b'x' * 2500 + b'new log\n'
+
+    def test_disabled_and_job_destination(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('SBIO_LOG_SHIP_INTERVAL', '0')
+        assert AppRunnerUtils.ship_logs('1', 'job.log') is None
+        monkeypatch.setenv('SBIO_LOG_SHIP_INTERVAL', '3600')
+        monkeypatch.setenv('SBIO_STORAGE_BACKEND', 'local')
+        monkeypatch.setenv('SBIO_LOCAL_STORAGE_ROOT', str(tmp_path / 'store'))
+        monkeypatch.setenv('AWS_DATASET_BUCKET', BUCKET)
+        monkeypatch.delenv('EXTERNAL_BUCKET', raising=False)
+        monkeypatch.setattr(AppRunnerUtils, '_job_contexts', {})
+        monkeypatch.setattr(AppRunnerUtils, 'get_job_folder', classmethod(lambda cls, job_id: 'jobs/1/'))
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / 'job.log').write_bytes(b'done\n')
+        shipper = AppRunnerUtils.ship_logs('1', 'job.log')
+        shipper.close()
+        client = AppRunnerUtils.get_job_context('1').s3_client
+        assert _shipped(client, 'jobs/1/job.log.segments/')[1] == b'done\n'
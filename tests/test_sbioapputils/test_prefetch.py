@@ -0,0 +1,72 @@
+import os
+import threading
+import time
+
+from sbioapputils.app_runner.app_runner_utils import AppRunnerUtils
+from sbioapputils.app_runner.input_cache import InputCache
+from sbioapputils.app_runner.prefetch import DEFAULT_PREFETCH_MAX_GB, InputPrefetcher, input_file_paths
+from sbioapputils.app_runner.s3_transfer import GB
+from tests.test_sbioapputils import BUCKET
+
+
+class TestInputPrefetcher:
+
+    def test_input_file_paths(self):
+        input_files = {
+            'table': [{'path': 'user/a.csv', 'additional_info': {}}],
+            'images': 'user/b.zip',
+            'extra': ['user/c.txt', 'user/a.csv'],
+        }
+        assert input_file_paths(input_files) == ['user/a.csv', 'user/b.zip', 'user/c.txt']
+
+    def test_prefetched_files_are_cache_hits(self, s3_client, tmp_path):
+        for name in ['a.csv', 'b.csv']:
+            s3_client.put_object(Bucket=BUCKET, Key=f'user/{name}', Body=name.encode())
+        cache = InputCache(str(tmp_path / 'cache'), max_bytes=None)
+        prefetcher = InputPrefetcher(cache, lambda path: (s3_client, BUCKET))
+        prefetcher.start(['user/a.csv', 'user/b.csv'])
+        assert prefetcher.wait('user/a.csv') and prefetcher.wait('user/b.csv')
+        prefetcher.shutdown()
+        assert cache.fetch(s3_client, BUCKET, 'user/a.csv', str(tmp_path / 'a.csv'))
+        assert (tmp_path / 'a.csv').read_bytes() == b'a.csv'
+
+    def test_failures_are_not_raised(self, s3_client, tmp_path):
+        cache = InputCache(str(tmp_path / 'cache'))
+        prefetcher = InputPrefetcher(cache, lambda path: (s3_client, BUCKET))
+        prefetcher.start(['user/missing.csv'])
+        assert not prefetcher.wait('user/missing.csv')
+        assert not prefetcher.wait('user/never-requested.csv')
+        prefetcher.shutdown()
+
+    def test_shutdown_abandons_in_flight_downloads(self, tmp_path):
+        release = threading.Event()
+        prefetcher = InputPrefetcher(InputCache(str(tmp_path / 'cache')), lambda path: release.wait(30), max_workers=1)
+        prefetcher.start(['user/slow.csv', 'user/queued.csv'])
+        start = time.monotonic()
+        prefetcher.shutdown()
+        assert time.monotonic() - start < 1
+        assert all(thread.daemon for thread in prefetcher._threads)
+        assert prefetcher.future('user/queued.csv').cancelled()
+        release.set()
+
+    def test_temporary_cache_is_removed(self, s3_client, tmp_path, monkeypatch):
+        monkeypatch.delenv('SBIO_INPUT_CACHE_DIR', raising=False)
+        monkeypatch.setenv('SBIO_PREFETCH_INPUTS', 'true')
+        monkeypatch.setenv('SBIO_PREFETCH_DIR', str(tmp_path))
+        monkeypatch.setattr(AppRunnerUtils, 'get_input_s3_client', classmethod(lambda cls, path: (s3_client, BUCKET)))
+        s3_client.put_object(Bucket=BUCKET, Key='user/a.csv', Body=b'a')
+        prefetcher = AppRunnerUtils.prefetch_inputs({'table': [{'path': 'user/a.csv'}]})
+        root = prefetcher.cache.root
+        assert os.path.dirname(root) == str(tmp_path) and os.environ['SBIO_INPUT_CACHE_DIR'] == root
+        assert prefetcher.cache.max_bytes == DEFAULT_PREFETCH_MAX_GB * GB
+        assert prefetcher.wait('user/a.csv')
+        AppRunnerUtils.download_file('user/a.csv', str(tmp_path / 'a.csv'))
+        assert (tmp_path / 'a.csv').read_bytes() == b'a'
+        assert os.listdir(prefetcher.cache.objects_dir) == []
+        prefetcher.shutdown(wait=True)
+        assert not os.path.exists(root)
+        assert 'SBIO_INPUT_CACHE_DIR' not in os.environ and 'SBIO_INPUT_CACHE_CONSUME' not in os.environ
+
+    def test_disabled_by_default(self, monkeypatch):
+        monkeypatch.delenv('SBIO_PREFETCH_INPUTS', raising=False)
+        assert AppRunnerUtils.prefetch_inputs({'table': [{'path': 'user/a.csv'}]}) is None
@@ -0,0 +1,81 @@
+import datetime
+import threading
+
+import pytest
+
+from sbioapputils.app_runner.app_runner_utils import AppRunnerUtils
+from sbioapputils.app_runner.s3_clients import ClientRegistry, assumed_role_credentials, get_client_registry
+from tests.test_sbioapputils import BUCKET
+
+
+@pytest.fixture
+def aws_env(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_REGION', 'us-east-1')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('AWS_DATASET_BUCKET', BUCKET)
+    monkeypatch.setenv('ROLE_ARN', 'arn:aws:iam::123456789012:role/sbio-external')
+    monkeypatch.delenv('SBIO_STORAGE_BACKEND', raising=False)
+    moto = pytest.importorskip("moto")
+    get_client_registry().clear()
+    with moto.mock_aws():
+        yield
+    get_client_registry().clear()
+
+
+def _credentials(expires_in):
+    return {'AccessKeyId': 'AKIA', 'SecretAccessKey': 'secret', 'SessionToken': 'token',
+            'Expiration': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=expires_in)}
+
+
+class TestClientRegistry:
+
+    def test_builds_once(self):
+        registry = ClientRegistry()
+        calls = []
+        assert registry.get('a', lambda: calls.append(1) or object()) is registry.get('a', object)
+        assert len(calls) == 1
+
+    def test_resources_are_per_thread(self):
+        registry = ClientRegistry()
+        mine = registry.resource('r', object)
+        other = []
+        thread = threading.Thread(target=lambda: other.append(registry.resource('r', object)))
+        thread.start()
+        thread.join()
+        assert registry.resource('r', object) is mine
+        assert other[0] is not mine
+
+    def test_assumed_role_refreshes_before_expiry(self):
+        calls = []
+
+        def assume_role(role_arn):
+            calls.append(role_arn)
+            return _credentials(3600 if len(calls) > 1 else 60)
+
+        credentials = assumed_role_credentials('arn:role', assume_role)
+        assert credentials.get_frozen_credentials().access_key == 'AKIA'
+        credentials.get_frozen_credentials()
+        assert calls == ['arn:role', 'arn:role']
+
+
+class TestAppRunnerClients:
+
+    def test_client_is_shared(self, aws_env):
+        client, bucket = AppRunnerUtils.get_s3_client()
+        assert bucket == BUCKET
+        assert AppRunnerUtils.get_s3_client()[0] is client
+
+    def test_external_bucket_assumes_role_once(self, aws_env, monkeypatch):
+        calls = []
+        assume_role = AppRunnerUtils.assume_role.__func__
+        monkeypatch.setattr(AppRunnerUtils, 'assume_role',
+                            classmethod(lambda cls, arn: calls.append(arn) or assume_role(cls, arn)))
+        client, bucket = AppRunnerUtils.get_s3_client('user-bucket')
+        client.create_bucket(Bucket='user-bucket')
+        client.put_object(Bucket='user-bucket', Key='a.txt', Body=b'a')
+        assert AppRunnerUtils.get_s3_client('user-bucket')[0] is client
+        assert AppRunnerUtils.get_s3_bucket('user-bucket').name == 'user-bucket'
+        assert [o.key for o in AppRunnerUtils.get_s3_bucket('user-bucket').objects.all()] == ['a.txt']
+        assert len(calls) == 1
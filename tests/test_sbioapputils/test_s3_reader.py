@@ -0,0 +1,47 @@
+import io
+import os
+
+import pytest
+
+from sbioapputils.app_runner.s3_reader import S3RangeReader
+from tests.test_sbioapputils import BUCKET, INPUT_FILES_PATH
+KB = 1024
+
+
+class TestS3RangeReader:
+
+    def test_random_access(self, s3_client):
+        data = os.urandom(100 * KB + 7)
+        s3_client.put_object(Bucket=BUCKET, Key='data.bin', Body=data)
+        reader = S3RangeReader(s3_client, BUCKET, 'data.bin', block_size=8 * KB, cache_blocks=4, readahead_blocks=2)
+        for offset, size in [(0, 10), (50 * KB, 20 * KB), (100 * KB, 100), (3, 9 * KB)]:
+            reader.seek(offset)
+            assert reader.read(size) == data[offset:offset + size]
+        reader.seek(-5, io.SEEK_END)
+        assert reader.read() == data[-5:]
+        assert reader.read(10) == b''
+
+    def test_reads_only_touched_blocks(self, s3_client):
+        s3_client.put_object(Bucket=BUCKET, Key='data.bin', Body=os.urandom(1024 * KB))
+        reader = S3RangeReader(s3_client, BUCKET, 'data.bin', block_size=16 * KB, cache_blocks=4, readahead_blocks=1)
+        reader.seek(500 * KB)
+        reader.read(100)
+        reader.seek(500 * KB + 200)
+        reader.read(100)
+        assert reader.requests == 1
+
+    def test_cache_is_bounded(self, s3_client):
+        data = os.urandom(512 * KB)
+        s3_client.put_object(Bucket=BUCKET, Key='data.bin', Body=data)
+        reader = S3RangeReader(s3_client, BUCKET, 'data.bin', block_size=16 * KB, cache_blocks=3, readahead_blocks=2)
+        assert reader.read() == data
+        assert len(reader._cache) <= 3
+        # sequential scans fetch the read-ahead blocks in the same request
+        assert reader.requests < 512 // 16
+
+    def test_h5py_reads_through_reader(self, s3_client):
+        h5py = pytest.importorskip("h5py")
+        with open(f'{INPUT_FILES_PATH}/follicular_sample.h5ad', 'rb') as f:
+            s3_client.put_object(Bucket=BUCKET, Key='sample.h5ad', Body=f.read())
+        with S3RangeReader(s3_client, BUCKET, 'sample.h5ad') as reader, h5py.File(reader, 'r') as h5:
+            assert 'obs' in h5
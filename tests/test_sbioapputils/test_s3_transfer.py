@@ -0,0 +1,463 @@
+import gzip
+import io
+import json
+import os
+import tarfile
+import time
+
+import pytest
+
+from boto3.s3.transfer import TransferConfig
+from sbioapputils.app_runner import s3_transfer
+from sbioapputils.app_runner.checksums import ChecksumMismatchError, expected_checksum
+from sbioapputils.app_runner.s3_transfer import (
+    COMPRESS_MIN_SIZE, MB, RESUME_MANIFEST_SUFFIX, compute_etag, download_and_extract, is_unchanged,
+    multipart_download, multipart_upload, summarize_uploads, sync_upload_files, upload_files,
+)
+from sbioapputils.app_runner.transfer_monitor import get_monitor
+from tests.test_sbioapputils import BUCKET, INPUT_FILES_PATH
+
+
+def _write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+class TestUploadFiles:
+
+    def test_upload_many(self, s3_client, tmp_path):
+        uploads = [(_write(tmp_path / f'f{i}.txt', b'x' * i), f'results/f{i}.txt') for i in range(20)]
+        results = upload_files(s3_client, BUCKET, uploads, max_workers=4)
+        assert all(r['ok'] for r in results)
+        assert [r['key'] for r in results] == [key for _, key in uploads]
+        for i in range(20):
+            body = s3_client.get_object(Bucket=BUCKET, Key=f'results/f{i}.txt')['Body'].read()
+            assert body == b'x' * i
+
+    def test_reports_failures(self, s3_client, tmp_path):
+        good = _write(tmp_path / 'good.txt', b'data')
+        uploads = [(good, 'good.txt'), (str(tmp_path / 'missing.txt'), 'missing.txt')]
+        results = upload_files(s3_client, BUCKET, uploads)
+        assert results[0]['ok'] and results[0]['error'] is None
+        assert not results[1]['ok'] and results[1]['error'] is not None
+
+
+class TestSmallObjects:
+
+    def test_small_file_skips_transfer_manager(self, s3_client, tmp_path, monkeypatch):
+        monkeypatch.setattr(s3_client, 'upload_file', None)
+        monkeypatch.setattr(s3_transfer, 'get_transfer_config', None)
+        src = _write(tmp_path / 'metrics.json', b'{"auc": 0.9}')
+        multipart_upload(s3_client, BUCKET, src, 'job/metrics.json')
+        assert s3_client.get_object(Bucket=BUCKET, Key='job/metrics.json')['Body'].read() == b'{"auc": 0.9}'
+        upload = get_monitor().summary()['transfers'][-1]
+        assert upload['key'] == 'job/metrics.json' and upload['bytes'] == 12
+
+    def test_batch_mixes_small_and_large(self, s3_client, tmp_path, monkeypatch):
+        monkeypatch.setattr(s3_transfer, 'SMALL_OBJECT_SIZE', 1024)
+        calls = []
+        small_upload = s3_transfer.small_upload
+        monkeypatch.setattr(s3_transfer, 'small_upload', lambda *a: calls.append(a[3]) or small_upload(*a))
+        uploads = [(_write(tmp_path / 'small.txt', b's' * 10), 'small.txt'),
+                   (_write(tmp_path / 'large.bin', b'l' * 4096), 'large.bin')]
+        results = upload_files(s3_client, BUCKET, uploads)
+        assert all(r['ok'] for r in results)
+        assert calls == ['small.txt']
+        assert s3_client.get_object(Bucket=BUCKET, Key='large.bin')['Body'].read() == b'l' * 4096
+
+    def test_failed_put_is_not_verified(self, s3_client, tmp_path, monkeypatch):
+        def _put_object(**kwargs):
+            raise RuntimeError('connection reset')
+
+        monkeypatch.setattr(s3_client, 'put_object', _put_object)
+        src = _write(tmp_path / 'metrics.json', b'{"auc": 0.9}')
+        with pytest.raises(RuntimeError):
+            multipart_upload(s3_client, BUCKET, src, 'job/metrics.json', checksum='crc32')
+        upload = get_monitor().summary()['transfers'][-1]
+        assert upload['checksum_algorithm'] == 'crc32' and upload['checksum_verified'] is False
+
+    def test_small_upload_is_verified(self, s3_client, tmp_path):
+        src = _write(tmp_path / 'metrics.json', b'{"auc": 0.9}')
+        multipart_upload(s3_client, BUCKET, src, 'job/metrics.json', checksum='crc32')
+        assert get_monitor().summary()['transfers'][-1]['checksum_verified']
+
+
+class TestResumableDownload:
+
+    def _put(self, s3_client, key, data):
+        s3_client.put_object(Bucket=BUCKET, Key=key, Body=data)
+        return s3_client.head_object(Bucket=BUCKET, Key=key)
+
+    def test_fresh_download(self, s3_client, tmp_path):
+        data = os.urandom(3 * MB + 17)
+        self._put(s3_client, 'in/data.bin', data)
+        dest = str(tmp_path / 'data.bin')
+        multipart_download(s3_client, BUCKET, 'in/data.bin', dest, resume=True)
+        assert open(dest, 'rb').read() == data
+        assert not os.path.exists(dest + RESUME_MANIFEST_SUFFIX)
+
+    def test_fetches_only_missing_ranges(self, s3_client, tmp_path):
+        data = os.urandom(3 * MB + 17)
+        head = self._put(s3_client, 'in/data.bin', data)
+        dest = str(tmp_path / 'data.bin')
+        # simulate an interrupted transfer: part 0 and 2 done, part 1 holds garbage
+        manifest = {'bucket': BUCKET, 'key': 'in/data.bin', 'etag': head['ETag'],
+                    'size': len(data), 'chunk': MB, 'done': [0, 2]}
+        with open(dest + RESUME_MANIFEST_SUFFIX, 'w') as f:
+            json.dump(manifest, f)
+        partial = bytearray(data)
+        partial[MB:2 * MB] = b'\0' * MB
+        partial[3 * MB:] = b'\0' * 17
+        with open(dest, 'wb') as f:
+            f.write(partial)
+
+        ranges = []
+        get_object = s3_client.get_object
+
+        def _get_object(**kwargs):
+            ranges.append(kwargs['Range'])
+            return get_object(**kwargs)
+
+        s3_client.get_object = _get_object
+        multipart_download(s3_client, BUCKET, 'in/data.bin', dest, resume=True)
+        assert sorted(ranges) == [f'bytes={MB}-{2 * MB - 1}', f'bytes={3 * MB}-{3 * MB + 16}']
+        assert open(dest, 'rb').read() == data
+
+    def test_stale_manifest_restarts(self, s3_client, tmp_path):
+        data = os.urandom(MB)
+        self._put(s3_client, 'in/data.bin', data)
+        dest = str(tmp_path / 'data.bin')
+        manifest = {'bucket': BUCKET, 'key': 'in/data.bin', 'etag': '"other"',
+                    'size': len(data), 'chunk': MB, 'done': [0]}
+        with open(dest + RESUME_MANIFEST_SUFFIX, 'w') as f:
+            json.dump(manifest, f)
+        with open(dest, 'wb') as f:
+            f.write(b'\0' * len(data))
+        multipart_download(s3_client, BUCKET, 'in/data.bin', dest, resume=True)
+        assert open(dest, 'rb').read() == data
+
+
+class _SlowBody:
+
+    def __init__(self, body):
+        self._body = body
+        self._closed = False
+
+    def read(self, n=-1):
+        time.sleep(0.2)
+        return b'' if self._closed else self._body.read(64 * 1024)
+
+    def close(self):
+        self._closed = True
+
+
+class _BrokenBody:
+    """A response body whose connection drops after the first block."""
+
+    def __init__(self, body):
+        self._body = body
+        self._reads = 0
+
+    def read(self, n=-1):
+        self._reads += 1
+        if self._reads > 1:
+            raise IOError('connection reset')
+        return self._body.read(64 * 1024)
+
+    def close(self):
+        self._body.close()
+
+
+class TestRangedDownload:
+
+    @pytest.fixture(autouse=True)
+    def _small_parts(self, monkeypatch):
+        def _config(file_size, max_concurrency=None, max_pool_connections=None):
+            return TransferConfig(multipart_threshold=MB, multipart_chunksize=MB, max_concurrency=4), MB, 4
+        monkeypatch.setattr(s3_transfer, 'get_transfer_config', _config)
+
+    def test_writes_parts_in_place(self, s3_client, tmp_path):
+        data = os.urandom(5 * MB + 3)
+        s3_client.put_object(Bucket=BUCKET, Key='in/data.bin', Body=data)
+        dest = str(tmp_path / 'data.bin')
+        multipart_download(s3_client, BUCKET, 'in/data.bin', dest, engine='ranged')
+        assert open(dest, 'rb').read() == data
+        assert os.listdir(tmp_path) == ['data.bin']
+
+    def test_overwrites_a_larger_existing_file(self, s3_client, tmp_path):
+        s3_client.put_object(Bucket=BUCKET, Key='in/small.txt', Body=b'x' * 30)
+        dest = _write(tmp_path / 'small.txt', b'old' * 1000)
+        multipart_download(s3_client, BUCKET, 'in/small.txt', dest, engine='ranged')
+        assert open(dest, 'rb').read() == b'x' * 30
+
+    def test_straggler_part_is_requested_again(self, s3_client, tmp_path):
+        data = os.urandom(4 * MB)
+        s3_client.put_object(Bucket=BUCKET, Key='in/data.bin', Body=data)
+        ranges = []
+        get_object = s3_client.get_object
+
+        def _get_object(**kwargs):
+            ranges.append(kwargs['Range'])
+            response = get_object(**kwargs)
+            if ranges.count(f'bytes={MB}-{2 * MB - 1}') == 1 and kwargs['Range'].startswith(f'bytes={MB}-'):
+                response['Body'] = _SlowBody(response['Body'])
+            return response
+
+        s3_client.get_object = _get_object
+        dest = str(tmp_path / 'data.bin')
+        start = time.monotonic()
+        multipart_download(s3_client, BUCKET, 'in/data.bin', dest, engine='ranged', part_timeout=0.3)
+        assert time.monotonic() - start < 2
+        assert ranges.count(f'bytes={MB}-{2 * MB - 1}') == 2
+        assert open(dest, 'rb').read() == data
+        assert get_monitor().summary()['transfers'][-1]['retries'] == 1
+
+    def test_failed_part_is_retried(self, s3_client, tmp_path, monkeypatch):
+        monkeypatch.setattr(s3_transfer, 'PART_RETRY_BACKOFF', 0.01)
+        data = os.urandom(3 * MB)
+        s3_client.put_object(Bucket=BUCKET, Key='in/data.bin', Body=data)
+        get_object = s3_client.get_object
+        failures = []
+
+        def _get_object(**kwargs):
+            response = get_object(**kwargs)
+            if kwargs['Range'].startswith(f'bytes={MB}-') and len(failures) < 2:
+                failures.append(kwargs['Range'])
+                response['Body'] = _BrokenBody(response['Body'])
+            return response
+
+        s3_client.get_object = _get_object
+        dest = str(tmp_path / 'data.bin')
+        multipart_download(s3_client, BUCKET, 'in/data.bin', dest, engine='ranged', part_timeout=0)
+        assert open(dest, 'rb').read() == data
+        assert get_monitor().summary()['transfers'][-1]['retries'] == 2
+
+    def test_failed_download_removes_partial_file(self, s3_client, tmp_path, monkeypatch):
+        monkeypatch.setattr(s3_transfer, 'PART_RETRY_BACKOFF', 0.01)
+        s3_client.put_object(Bucket=BUCKET, Key='in/data.bin', Body=os.urandom(2 * MB))
+        calls = []
+
+        def _get_object(**kwargs):
+            calls.append(kwargs['Range'])
+            raise IOError('connection reset')
+
+        s3_client.get_object = _get_object
+        dest = str(tmp_path / 'data.bin')
+        with pytest.raises(IOError):
+            multipart_download(s3_client, BUCKET, 'in/data.bin', dest, engine='ranged', part_timeout=0)
+        assert not os.path.exists(dest)
+        assert calls.count(f'bytes=0-{MB - 1}') == 1 + s3_transfer.PART_RETRIES
+
+
+class TestChecksums:
+
+    @pytest.fixture(autouse=True)
+    def _small_parts(self, monkeypatch):
+        def _config(file_size, max_concurrency=None, max_pool_connections=None):
+            return TransferConfig(multipart_threshold=5 * MB, multipart_chunksize=5 * MB, max_concurrency=4), 5 * MB, 4
+        monkeypatch.setattr(s3_transfer, 'get_transfer_config', _config)
+
+    @pytest.mark.parametrize('algorithm', ['crc32', 'sha256'])
+    def test_upload_then_verified_download(self, s3_client, tmp_path, algorithm):
+        data = os.urandom(11 * MB + 7)
+        src = _write(tmp_path / 'data.bin', data)
+        multipart_upload(s3_client, BUCKET, src, 'job/data.bin', checksum=algorithm)
+        upload = get_monitor().summary()['transfers'][-1]
+        assert upload['checksum_algorithm'] == algorithm and upload['checksum_verified']
+
+        dest = str(tmp_path / 'copy.bin')
+        multipart_download(s3_client, BUCKET, 'job/data.bin', dest, verify=True)
+        assert open(dest, 'rb').read() == data
+        download = get_monitor().summary()['transfers'][-1]
+        assert download['checksum_verified'] and download['parts'] == 3
+
+    def test_single_part_upload_sends_checksum(self, s3_client, tmp_path):
+        src = _write(tmp_path / 'small.txt', b'hello')
+        multipart_upload(s3_client, BUCKET, src, 'small.txt', checksum='sha256')
+        head = s3_client.head_object(Bucket=BUCKET, Key='small.txt', ChecksumMode='ENABLED')
+        assert head['ChecksumSHA256'] == 'LPJNul+wow4m6DsqxbninhsWHlwfp0JecwQzYpOLmCQ='
+
+    def test_etag_is_used_without_s3_checksum(self):
+        etag = '"' + 'a' * 32 + '-3"'
+        assert expected_checksum({'ETag': etag}) == {'algorithm': 'md5', 'value': 'a' * 32 + '-3', 'composite': True}
+        assert expected_checksum({'ETag': etag, 'ServerSideEncryption': 'aws:kms'}) is None
+        head = {'ETag': etag, 'ChecksumCRC32': 'pxqP4A==', 'ChecksumType': 'FULL_OBJECT'}
+        assert expected_checksum(head) == {'algorithm': 'crc32', 'value': 'pxqP4A==', 'composite': False}
+
+    def test_checksum_upload_caps_parts_in_memory(self, s3_client, tmp_path, monkeypatch):
+        monkeypatch.setattr(s3_transfer, 'get_transfer_config', lambda *args, **kwargs: (None, 512 * MB, 32))
+        monkeypatch.setattr(s3_transfer, 'STREAM_MAX_PART_SIZE', 5 * MB)
+        src = _write(tmp_path / 'data.bin', os.urandom(11 * MB))
+        multipart_upload(s3_client, BUCKET, src, 'job/data.bin', checksum='crc32')
+        upload = get_monitor().summary()['transfers'][-1]
+        assert upload['checksum_verified'] and upload['parts'] == 3
+        assert upload['concurrency'] == s3_transfer.STREAM_MAX_PARTS_IN_FLIGHT
+        assert s3_transfer.stream_part_size(512 * MB, 10 ** 12) == 10 ** 8
+
+    def test_verified_download_retries_dropped_parts(self, s3_client, tmp_path, monkeypatch):
+        monkeypatch.setattr(s3_transfer, 'PART_RETRY_BACKOFF', 0.01)
+        data = os.urandom(6 * MB)
+        src = _write(tmp_path / 'data.bin', data)
+        multipart_upload(s3_client, BUCKET, src, 'job/data.bin', checksum='crc32')
+        get_object = s3_client.get_object
+        dropped = []
+
+        def _get_object(**kwargs):
+            response = get_object(**kwargs)
+            if not dropped:
+                dropped.append(kwargs['Range'])
+                response['Body'] = _BrokenBody(response['Body'])
+            return response
+
+        s3_client.get_object = _get_object
+        dest = str(tmp_path / 'copy.bin')
+        multipart_download(s3_client, BUCKET, 'job/data.bin', dest, verify=True)
+        assert open(dest, 'rb').read() == data
+        download = get_monitor().summary()['transfers'][-1]
+        assert download['checksum_verified'] and download['retries'] == 1
+
+    @pytest.mark.parametrize('resume', [False, True])
+    def test_empty_object_is_verified(self, s3_client, tmp_path, resume):
+        src = _write(tmp_path / 'empty.txt', b'')
+        multipart_upload(s3_client, BUCKET, src, 'job/empty.txt', checksum='crc32')
+        dest = str(tmp_path / 'copy.txt')
+        multipart_download(s3_client, BUCKET, 'job/empty.txt', dest, verify=True, resume=resume)
+        assert open(dest, 'rb').read() == b''
+        assert get_monitor().summary()['transfers'][-1]['checksum_verified']
+
+    def test_verified_download_over_a_larger_file(self, s3_client, tmp_path):
+        src = _write(tmp_path / 'small.txt', b'x' * 30)
+        multipart_upload(s3_client, BUCKET, src, 'job/small.txt', checksum='sha256')
+        dest = _write(tmp_path / 'copy.txt', b'old' * 1000)
+        multipart_download(s3_client, BUCKET, 'job/small.txt', dest, verify=True)
+        assert open(dest, 'rb').read() == b'x' * 30
+        assert get_monitor().summary()['transfers'][-1]['checksum_verified']
+
+    def test_wrong_size_on_disk_is_not_verified(self, s3_client, tmp_path, monkeypatch):
+        src = _write(tmp_path / 'small.txt', b'x' * 30)
+        multipart_upload(s3_client, BUCKET, src, 'job/small.txt', checksum='sha256')
+        dest = _write(tmp_path / 'copy.txt', b'old' * 1000)
+        monkeypatch.setattr(s3_transfer.os, 'ftruncate', lambda fd, size: None)
+        with pytest.raises(ChecksumMismatchError):
+            multipart_download(s3_client, BUCKET, 'job/small.txt', dest, verify=True)
+        monkeypatch.undo()
+        assert get_monitor().summary()['transfers'][-1]['checksum_verified'] is False
+
+    def test_corrupted_download_is_rejected(self, s3_client, tmp_path):
+        data = os.urandom(6 * MB)
+        src = _write(tmp_path / 'data.bin', data)
+        multipart_upload(s3_client, BUCKET, src, 'job/data.bin', checksum='crc32')
+        get_object = s3_client.get_object
+
+        def _get_object(**kwargs):
+            response = get_object(**kwargs)
+            if kwargs['Range'].startswith('bytes=0-'):
+                response['Body'] = io.BytesIO(b'\0' + response['Body'].read()[1:])
+            return response
+
+        s3_client.get_object = _get_object
+        dest = str(tmp_path / 'copy.bin')
+        with pytest.raises(ChecksumMismatchError):
+            multipart_download(s3_client, BUCKET, 'job/data.bin', dest, verify=True, resume=True)
+        assert not os.path.exists(dest)
+        assert not get_monitor().summary()['transfers'][-1]['checksum_verified']
+
+
+class TestSyncUpload:
+
+    def test_compute_etag_matches_s3(self, s3_client, tmp_path):
+        src = _write(tmp_path / 'big.bin', os.urandom(12 * MB + 5))
+        config = TransferConfig(multipart_threshold=5 * MB, multipart_chunksize=5 * MB)
+        s3_client.upload_file(src, BUCKET, 'big.bin', Config=config)
+        etag = s3_client.head_object(Bucket=BUCKET, Key='big.bin')['ETag']
+        assert compute_etag(src, 5 * MB) == etag
+        assert is_unchanged(s3_client, BUCKET, src, 'big.bin')
+
+    def test_skips_identical_files(self, s3_client, tmp_path):
+        same = _write(tmp_path / 'same.txt', b'unchanged')
+        changed = _write(tmp_path / 'changed.txt', b'new contents')
+        new = _write(tmp_path / 'new.txt', b'brand new')
+        s3_client.put_object(Bucket=BUCKET, Key='job/same.txt', Body=b'unchanged')
+        s3_client.put_object(Bucket=BUCKET, Key='job/changed.txt', Body=b'old contents')
+        uploads = [(same, 'job/same.txt'), (changed, 'job/changed.txt'), (new, 'job/new.txt')]
+        summary = summarize_uploads(sync_upload_files(s3_client, BUCKET, uploads))
+        assert summary['files_skipped'] == 1 and summary['bytes_skipped'] == len(b'unchanged')
+        assert summary['files_sent'] == 2
+        assert summary['bytes_sent'] == len(b'new contents') + len(b'brand new')
+        body = s3_client.get_object(Bucket=BUCKET, Key='job/changed.txt')['Body'].read()
+        assert body == b'new contents'
+
+
+class TestDownloadAndExtract:
+
+    @pytest.mark.parametrize('name', ['test_tar.tar.gz', 'test_tar.tar', 'test_zip.zip'])
+    def test_extracts_archives(self, s3_client, tmp_path, name):
+        with open(f'{INPUT_FILES_PATH}/{name}', 'rb') as f:
+            s3_client.put_object(Bucket=BUCKET, Key=f'inputs/{name}', Body=f.read())
+        dest = tmp_path / 'out'
+        download_and_extract(s3_client, BUCKET, f'inputs/{name}', str(dest))
+        extracted = [f for _, _, files in os.walk(dest) for f in files]
+        assert len(extracted) == 5
+        assert name not in os.listdir(dest)
+
+    def test_streams_gz(self, s3_client, tmp_path):
+        s3_client.put_object(Bucket=BUCKET, Key='inputs/table.csv.gz', Body=gzip.compress(b'a,b\n1,2\n'))
+        download_and_extract(s3_client, BUCKET, 'inputs/table.csv.gz', str(tmp_path))
+        assert (tmp_path / 'table.csv').read_bytes() == b'a,b\n1,2\n'
+
+    def test_streams_in_fixed_chunks(self, s3_client, tmp_path, monkeypatch):
+        import sbioapputils.app_runner.s3_transfer as s3_transfer
+        monkeypatch.setattr(s3_transfer, 'get_transfer_config', None)
+        monkeypatch.setattr(s3_transfer, 'STREAM_CHUNK', 64 * 1024)
+        data = os.urandom(300 * 1024)
+        s3_client.put_object(Bucket=BUCKET, Key='inputs/blob.bin.gz', Body=gzip.compress(data))
+        download_and_extract(s3_client, BUCKET, 'inputs/blob.bin.gz', str(tmp_path))
+        assert (tmp_path / 'blob.bin').read_bytes() == data
+
+    def test_rejects_path_traversal(self, s3_client, tmp_path):
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+            info = tarfile.TarInfo('../escaped.txt')
+            info.size = 4
+            tar.addfile(info, io.BytesIO(b'evil'))
+        s3_client.put_object(Bucket=BUCKET, Key='inputs/evil.tar.gz', Body=buffer.getvalue())
+        with pytest.raises(ValueError):
+            download_and_extract(s3_client, BUCKET, 'inputs/evil.tar.gz', str(tmp_path / 'out'))
+        assert not (tmp_path / 'escaped.txt').exists()
+
+
+class TestCompressedUpload:
+
+    def test_small_output_single_put(self, s3_client, tmp_path):
+        src = _write(tmp_path / 'table.csv', b'a,b,c\n' + b'1,2,3\n' * 100000)
+        multipart_upload(s3_client, BUCKET, src, 'job/table.csv', compress='gzip')
+        response = s3_client.get_object(Bucket=BUCKET, Key='job/table.csv')
+        assert response['ContentEncoding'] == 'gzip'
+        assert response['ContentType'] == 'text/csv'
+        assert response['Metadata']['sbio-uncompressed-size'] == str(os.path.getsize(src))
+        assert gzip.decompress(response['Body'].read()) == open(src, 'rb').read()
+
+    def test_multipart_output(self, s3_client, tmp_path, monkeypatch):
+        import sbioapputils.app_runner.s3_transfer as s3_transfer
+        monkeypatch.setattr(s3_transfer, 'get_transfer_config', lambda *args, **kwargs: (None, 5 * MB, 3))
+        data = os.urandom(8 * MB).hex().encode()
+        src = _write(tmp_path / 'figure.html', data)
+        multipart_upload(s3_client, BUCKET, src, 'job/figure.html', compress='gzip')
+        response = s3_client.get_object(Bucket=BUCKET, Key='job/figure.html')
+        assert response['ETag'].endswith('-2"')
+        assert gzip.decompress(response['Body'].read()) == data
+
+    def test_batch_compresses_text_only(self, s3_client, tmp_path):
+        table = _write(tmp_path / 'big.tsv', b'x\ty\n' * (COMPRESS_MIN_SIZE // 4 + 1))
+        image = _write(tmp_path / 'plot.png', b'\x89PNG' + os.urandom(COMPRESS_MIN_SIZE))
+        upload_files(s3_client, BUCKET, [(table, 'job/big.tsv'), (image, 'job/plot.png')], compress='gzip')
+        assert s3_client.head_object(Bucket=BUCKET, Key='job/big.tsv').get('ContentEncoding') == 'gzip'
+        assert 'ContentEncoding' not in s3_client.head_object(Bucket=BUCKET, Key='job/plot.png')
+
+    def test_batch_reports_missing_file_and_compressed_bytes(self, s3_client, tmp_path):
+        table = _write(tmp_path / 'big.csv', b'a,b\n' * (COMPRESS_MIN_SIZE // 4 + 1))
+        uploads = [(table, 'job/big.csv'), (str(tmp_path / 'missing.csv'), 'job/missing.csv')]
+        results = upload_files(s3_client, BUCKET, uploads, compress='gzip')
+        assert results[0]['ok'] and not results[1]['ok']
+        stored = s3_client.head_object(Bucket=BUCKET, Key='job/big.csv')['ContentLength']
+        assert results[0]['bytes'] == stored < os.path.getsize(table)
@@ -0,0 +1,113 @@
+import gzip
+import os
+
+import pytest
+
+from botocore.exceptions import ClientError
+
+from sbioapputils.app_runner.app_runner_utils import AppRunnerUtils
+from sbioapputils.app_runner.s3_reader import S3RangeReader
+from sbioapputils.app_runner.s3_transfer import multipart_download, multipart_upload, upload_files
+from sbioapputils.app_runner.storage import LocalStorageClient, StorageClient
+from tests.test_sbioapputils import BUCKET
+
+
+@pytest.fixture
+def client(tmp_path):
+    return LocalStorageClient(str(tmp_path / 'store'))
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+class TestLocalStorageClient:
+
+    def test_upload_download_round_trip(self, client, tmp_path):
+        data = os.urandom(3 * 1024 * 1024)
+        src = _write(tmp_path / 'out' / 'result.bin', data)
+        multipart_upload(client, BUCKET, src, 'jobs/1/result.bin', progress=False)
+        dest = str(tmp_path / 'in' / 'result.bin')
+        multipart_download(client, BUCKET, 'jobs/1/result.bin', dest, progress=False)
+        assert open(dest, 'rb').read() == data
+        assert os.stat(dest).st_ino != os.stat(src).st_ino
+
+    def test_resumable_download_uses_ranged_gets(self, client, tmp_path):
+        data = os.urandom(1024 * 1024 + 17)
+        client.put_object(Bucket=BUCKET, Key='big.bin', Body=data)
+        dest = str(tmp_path / 'big.bin')
+        multipart_download(client, BUCKET, 'big.bin', dest, progress=False, resume=True)
+        assert open(dest, 'rb').read() == data
+
+    def test_hardlink_download_shares_inode(self, tmp_path):
+        client = LocalStorageClient(str(tmp_path / 'store'), hardlink=True)
+        client.put_object(Bucket=BUCKET, Key='ref.fa', Body=b'ACGT')
+        dest = str(tmp_path / 'ref.fa')
+        client.download_file(Bucket=BUCKET, Key='ref.fa', Filename=dest)
+        assert os.path.samefile(dest, client._path(BUCKET, 'ref.fa'))
+
+    def test_compressed_upload_keeps_content_encoding(self, client, tmp_path):
+        data = b'gene,count\n' + b'BRCA1,10\n' * 200000
+        src = _write(tmp_path / 'counts.csv', data)
+        results = upload_files(client, BUCKET, [(src, 'job/counts.csv')], progress=False, compress='gzip')
+        assert results[0]['ok']
+        assert client.head_object(Bucket=BUCKET, Key='job/counts.csv')['ContentEncoding'] == 'gzip'
+        body = client.get_object(Bucket=BUCKET, Key='job/counts.csv')['Body'].read()
+        assert gzip.decompress(body) == data
+
+    def test_range_reader_and_if_match(self, client):
+        data = bytes(range(256)) * 1000
+        client.put_object(Bucket=BUCKET, Key='table.bin', Body=data)
+        with S3RangeReader(client, BUCKET, 'table.bin', block_size=4096) as reader:
+            reader.seek(10000)
+            assert reader.read(100) == data[10000:10100]
+        with pytest.raises(ClientError):
+            client.get_object(Bucket=BUCKET, Key='table.bin', IfMatch='"stale"')
+
+    def test_list_copy_and_missing_key(self, client):
+        client.put_object(Bucket=BUCKET, Key='a/1.txt', Body=b'one')
+        client.put_object(Bucket=BUCKET, Key='a/2.txt', Body=b'two', ContentType='text/plain')
+        client.copy_object(Bucket=BUCKET, Key='b/2.txt', CopySource={'Bucket': BUCKET, 'Key': 'a/2.txt'})
+        keys = [o['Key'] for o in client.list_objects_v2(Bucket=BUCKET, Prefix='a/')['Contents']]
+        assert keys == ['a/1.txt', 'a/2.txt']
+        copied = client.get_object(Bucket=BUCKET, Key='b/2.txt')
+        assert copied['Body'].read() == b'two'
+        assert copied['ContentType'] == 'text/plain'
+        with pytest.raises(ClientError) as e:
+            client.head_object(Bucket=BUCKET, Key='missing')
+        assert e.value.response['Error']['Code'] == '404'
+        with pytest.raises(ClientError):
+            client.put_object(Bucket=BUCKET, Key='../escape', Body=b'')
+
+    def test_selected_by_environment(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('SBIO_STORAGE_BACKEND', 'local')
+        monkeypatch.setenv('SBIO_LOCAL_STORAGE_ROOT', str(tmp_path / 'store'))
+        monkeypatch.setenv('AWS_DATASET_BUCKET', 'datasets')
+        client, bucket = AppRunnerUtils.get_s3_client()
+        assert isinstance(client, LocalStorageClient)
+        assert bucket == 'datasets'
+        assert AppRunnerUtils.get_s3_client('user-bucket')[1] == 'user-bucket'
+
+    def test_bucket_resource_uses_the_backend(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('SBIO_STORAGE_BACKEND', 'local')
+        monkeypatch.setenv('SBIO_LOCAL_STORAGE_ROOT', str(tmp_path / 'store'))
+        monkeypatch.setenv('AWS_DATASET_BUCKET', 'datasets')
+        bucket = AppRunnerUtils.get_s3_bucket()
+        assert bucket.name == 'datasets' and isinstance(bucket.client, LocalStorageClient)
+        bucket.Object('job/a.txt').put(Body=b'a')
+        bucket.upload_file(_write(tmp_path / 'b.txt', b'bb'), 'job/b.txt')
+        assert bucket.Object('job/a.txt').get()['Body'].read() == b'a'
+        assert [(o.key, o.size) for o in bucket.objects.filter(Prefix='job/')] == [('job/a.txt', 1), ('job/b.txt', 2)]
+        bucket.Object('job/b.txt').download_file(str(tmp_path / 'copy.txt'))
+        assert (tmp_path / 'copy.txt').read_bytes() == b'bb'
+        assert AppRunnerUtils.get_s3_bucket('user-bucket').name == 'user-bucket'
+
+    def test_backends_must_implement_every_call(self):
+        class PartialBackend(StorageClient):
+            def head_object(self, Bucket, Key, PartNumber=None, **kwargs):
+                return {}
+
+        with pytest.raises(TypeError):
+            PartialBackend()
@@ -0,0 +1,64 @@
+import io
+import tarfile
+
+import pytest
+
+from sbioapputils.app_runner.app_runner_utils import AppRunnerUtils
+from sbioapputils.app_runner.tar_pack import INDEX_SUFFIX, load_index, pack_upload, read_member
+from tests.test_sbioapputils import BUCKET
+
+
+@pytest.fixture
+def plots(tmp_path):
+    folder = tmp_path / 'plots'
+    (folder / 'cells').mkdir(parents=True)
+    for i in range(20):
+        (folder / 'cells' / f'cell_{i}.csv').write_text(f'cell,{i}\n' * i)
+    (folder / ('long_' * 30 + '.txt')).write_text('a long member name')
+    return folder
+
+
+class TestPackUpload:
+
+    @pytest.mark.parametrize('compress', [None, 'gzip'])
+    def test_archive_is_a_standard_tar(self, s3_client, plots, compress):
+        index = pack_upload(s3_client, BUCKET, [str(plots)], 'job/plots.tar', compress=compress, progress=False)
+        body = s3_client.get_object(Bucket=BUCKET, Key='job/plots.tar')['Body'].read()
+        with tarfile.open(fileobj=io.BytesIO(body), mode='r:*') as tar:
+            assert sorted(tar.getnames()) == sorted(m[0] for m in index['members'])
+            assert tar.extractfile('plots/cells/cell_7.csv').read() == (plots / 'cells' / 'cell_7.csv').read_bytes()
+
+    @pytest.mark.parametrize('compress', [None, 'gzip'])
+    def test_members_are_read_with_one_ranged_get(self, s3_client, plots, compress):
+        pack_upload(s3_client, BUCKET, [str(plots)], 'job/plots.tar', compress=compress, progress=False)
+        index = load_index(s3_client, BUCKET, 'job/plots.tar')
+        ranges = []
+        get_object = s3_client.get_object
+
+        def _get_object(**kwargs):
+            ranges.append(kwargs.get('Range'))
+            return get_object(**kwargs)
+
+        s3_client.get_object = _get_object
+        for name in ('plots/cells/cell_3.csv', 'plots/cells/cell_0.csv', 'plots/' + 'long_' * 30 + '.txt'):
+            assert read_member(s3_client, BUCKET, 'job/plots.tar', name, index) == (plots.parent / name).read_bytes()
+        assert len([r for r in ranges if r]) == 2
+        with pytest.raises(KeyError):
+            read_member(s3_client, BUCKET, 'job/plots.tar', 'plots/missing.csv', index)
+
+
+class TestUploadResults:
+
+    def test_directories_with_many_artifacts_are_packed(self, s3_client, plots, monkeypatch):
+        monkeypatch.setenv('SBIO_PACK_MIN_FILES', '10')
+        monkeypatch.setattr(AppRunnerUtils, '_job_contexts', {})
+        monkeypatch.setattr(AppRunnerUtils, 'get_job_folder', classmethod(lambda cls, job_id: 'jobs/1/'))
+        monkeypatch.setattr(AppRunnerUtils, 'get_s3_client', classmethod(lambda cls, bucket=None: (s3_client, BUCKET)))
+        monkeypatch.chdir(plots.parent)
+        cells = [f'plots/cells/cell_{i}.csv' for i in range(20)]
+        summary = AppRunnerUtils.upload_results('1', {}, additional_files=cells + ['plots/' + 'long_' * 30 + '.txt'])
+        assert summary['files_sent'] == 1
+        assert summary['archives'] == [{'key': 'jobs/1/plots/cells.tar', 'files': 20}]
+        keys = {o['Key'] for o in s3_client.list_objects_v2(Bucket=BUCKET)['Contents']}
+        assert 'jobs/1/plots/cells.tar' + INDEX_SUFFIX in keys
+        assert 'cells/cell_5.csv' in [m[0] for m in load_index(s3_client, BUCKET, 'jobs/1/plots/cells.tar')['members']]
@@ -0,0 +1,59 @@
+import json
+import threading
+
+from sbioapputils.app_runner.transfer_monitor import MB, TransferMonitor, percentile
+
+
+class TestTransferMonitor:
+
+    def test_concurrent_callbacks(self):
+        monitor = TransferMonitor()
+        progress = monitor.start('big.bin', 'download', 64 * MB, log_progress=False)
+
+        def _worker():
+            for _ in range(1000):
+                progress(1024)
+                progress.add_part()
+
+        threads = [threading.Thread(target=_worker) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        progress.finish()
+        record = monitor.summary()['transfers'][0]
+        assert record['bytes'] == 16 * 1000 * 1024
+        assert record['parts'] == 16 * 1000
+        assert record['status'] == 'ok'
+
+    def test_aggregates_active_transfers(self):
+        monitor = TransferMonitor()
+        first = monitor.start('a', 'upload', 10 * MB, log_progress=False)
+        second = monitor.start('b', 'upload', 30 * MB, log_progress=False)
+        first(5 * MB)
+        second(MB)
+        assert monitor.progress() == {'active': 2, 'bytes': 6 * MB, 'total_bytes': 40 * MB}
+        first.finish()
+        assert monitor.progress()['active'] == 1
+
+    def test_export_json(self, tmp_path):
+        monitor = TransferMonitor()
+        ok = monitor.start('a', 'upload', MB, log_progress=False, key='job/a')
+        ok(MB)
+        ok.finish()
+        failed = monitor.start('b', 'download', MB, initial_bytes=MB // 2, log_progress=False)
+        failed.add_retry()
+        failed.finish(RuntimeError('boom'))
+        path = tmp_path / 'metrics.json'
+        monitor.export_json(str(path), job_id='42')
+        summary = json.loads(path.read_text())
+        assert summary['job_id'] == '42'
+        assert summary['totals']['upload']['bytes'] == MB
+        assert summary['totals']['download']['failed'] == 1
+        assert summary['totals']['download']['retries'] == 1
+        assert summary['transfers'][0]['key'] == 'job/a'
+
+    def test_percentile(self):
+        assert percentile([], 50) is None
+        assert percentile([3, 1, 2, 4], 50) == 2
+        assert percentile(list(range(1, 101)), 99) == 99
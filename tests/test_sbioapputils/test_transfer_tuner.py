@@ -0,0 +1,38 @@
+import random
+
+from sbioapputils.app_runner.transfer_tuner import GB, MB, TransferTuner, static_tier
+
+
+class TestTransferTuner:
+
+    def test_starts_from_static_tiers(self):
+        tuner = TransferTuner(cpu_count=8)
+        assert tuner.choose(2 * GB) == static_tier(2 * GB)
+
+    def test_respects_connection_pool(self):
+        tuner = TransferTuner(cpu_count=64)
+        chunk, concurrency = tuner.choose(20 * GB, max_pool_connections=8)
+        assert concurrency == 8
+        assert chunk == 256 * MB
+
+    def test_prefers_fastest_configuration(self):
+        tuner = TransferTuner(cpu_count=8, explore_rate=0)
+        tuner.record(2 * GB, 64 * MB, 15, elapsed=20)
+        tuner.record(2 * GB, 128 * MB, 20, elapsed=10)
+        assert tuner.choose(2 * GB) == (128 * MB, 20)
+
+    def test_explores_untried_neighbour(self):
+        tuner = TransferTuner(cpu_count=8, explore_rate=1, rng=random.Random(0))
+        tuner.record(2 * GB, 64 * MB, 16, elapsed=10)
+        assert tuner.choose(2 * GB) in [(32 * MB, 16), (128 * MB, 16), (64 * MB, 12), (64 * MB, 20)]
+
+    def test_ignores_small_transfers(self):
+        tuner = TransferTuner(cpu_count=8, explore_rate=0)
+        tuner.record(MB, 8 * MB, 2, elapsed=0.01)
+        assert tuner.choose(MB) == static_tier(MB)
+
+    def test_persists_statistics(self, tmp_path):
+        path = str(tmp_path / 'stats.json')
+        TransferTuner(path, cpu_count=8).record(2 * GB, 128 * MB, 20, elapsed=10)
+        tuner = TransferTuner(path, cpu_count=8, explore_rate=0)
+        assert tuner.choose(2 * GB) == (128 * MB, 20)